@@ -44,21 +44,21 @@ BODY_FAT = 33
 BODY_FAT_TARGET = 34
 
 # Gender options
-GENDER_OPTIONS = ["זכר", "נקבה", "אחר"]
+GENDER_OPTIONS = ("זכר", "נקבה", "אחר")
 
 # Goal options
-GOAL_OPTIONS = [
+GOAL_OPTIONS = (
     "ירידה במשקל",
     "ירידה באחוזי שומן",
     "שמירה על משקל",
     "עלייה במשקל",
     "בניית שריר",
-]
+)
 
 # Activity options
-ACTIVITY_YES_NO_OPTIONS = ["כן", "לא"]
+ACTIVITY_YES_NO_OPTIONS = ("כן", "לא")
 
-ACTIVITY_TYPE_OPTIONS = [
+ACTIVITY_TYPE_OPTIONS = (
     "אין פעילות",
     "הליכה קלה",
     "הליכה מהירה / ריצה קלה",
@@ -66,44 +66,44 @@ ACTIVITY_TYPE_OPTIONS = [
     "אימוני HIIT / קרוספיט",
     "יוגה / פילאטיס",
     "שילוב של כמה סוגים",
-]
+)
 
-ACTIVITY_FREQUENCY_OPTIONS = [
+ACTIVITY_FREQUENCY_OPTIONS = (
     "1-2 פעמים בשבוע",
     "3-4 פעמים בשבוע",
     "5-6 פעמים בשבוע",
     "כל יום",
-]
+)
 
-ACTIVITY_DURATION_OPTIONS = [
+ACTIVITY_DURATION_OPTIONS = (
     "פחות מ-30 דקות",
     "30-45 דקות",
     "45-60 דקות",
     "יותר מ-60 דקות",
-]
+)
 
-TRAINING_TIME_OPTIONS = [
+TRAINING_TIME_OPTIONS = (
     "בוקר (6:00-9:00)",
     "צהריים (12:00-14:00)",
     "אחר הצהריים (15:00-18:00)",
     "ערב (19:00-22:00)",
-]
+)
 
-CARDIO_GOAL_OPTIONS = [
+CARDIO_GOAL_OPTIONS = (
     "שיפור סיבולת לב-ריאה",
     "שריפת שומן",
     "שיפור ביצועים",
     "בריאות כללית",
-]
+)
 
-STRENGTH_GOAL_OPTIONS = [
+STRENGTH_GOAL_OPTIONS = (
     "בניית שריר",
     "חיזוק כללי",
     "שיפור כוח",
     "שיפור יציבה",
-]
+)
 
-SUPPLEMENT_OPTIONS = [
+SUPPLEMENT_OPTIONS = (
     "חלבון",
     "קריאטין",
     "ויטמין D",
@@ -112,10 +112,10 @@ SUPPLEMENT_OPTIONS = [
     "BCAA",
     "גלוטמין",
     "אחר",
-]
+)
 
 # Diet options
-DIET_OPTIONS = [
+DIET_OPTIONS = (
     "אין העדפות מיוחדות",
     "צמחוני",
     "טבעוני",
@@ -129,10 +129,10 @@ DIET_OPTIONS = [
     "פליאו",
     "מדיטראני",
     "אחר",
-]
+)
 
 # Mixed activities options
-MIXED_ACTIVITY_OPTIONS = [
+MIXED_ACTIVITY_OPTIONS = (
     "הליכה",
     "ריצה",
     "אימוני כוח",
@@ -143,24 +143,24 @@ MIXED_ACTIVITY_OPTIONS = [
     "אימוני HIIT",
     "קרוספיט",
     "אין",
-]
+)
 
-MIXED_FREQUENCY_OPTIONS = [
+MIXED_FREQUENCY_OPTIONS = (
     "1-2 פעמים בשבוע",
     "3-4 פעמים בשבוע",
     "5-6 פעמים בשבוע",
     "כל יום",
-]
+)
 
-MIXED_DURATION_OPTIONS = [
+MIXED_DURATION_OPTIONS = (
     "פחות מ-30 דקות",
     "30-45 דקות",
     "45-60 דקות",
     "יותר מ-60 דקות",
-]
+)
 
 # Allergy options
-ALLERGY_OPTIONS = [
+ALLERGY_OPTIONS = (
     "אין",
     "בוטנים",
     "אגוזים",
@@ -174,16 +174,16 @@ ALLERGY_OPTIONS = [
     "חרדל",
     "סולפיטים",
     "שאר (פרט/י)",
-]
+)
 
 # System buttons
-SYSTEM_BUTTONS = [
+SYSTEM_BUTTONS = (
     "לקבלת תפריט יומי מותאם אישית",
     "מה אכלתי היום",
     "בניית ארוחה לפי מה שיש לי בבית",
     "קבלת דוח",
     "תזכורות על שתיית מים",
-]
+)
 
 # Gendered action text
 GENDERED_ACTION = {
@@ -210,13 +210,13 @@ GENDERED_ACTION = {
 }
 
 # Water reminder options
-WATER_REMINDER_OPTIONS = ["כן", "לא"]
+WATER_REMINDER_OPTIONS = ("כן", "לא")
 
 USERS_FILE = "users.json"
 DB_NAME = "nutrition.db"
 
 # Activity types for multi-selection
-ACTIVITY_TYPES_MULTI = [
+ACTIVITY_TYPES_MULTI = (
     "ריצה 🏃",
     "הליכה 🚶", 
     "אופניים 🚴",
@@ -225,4 +225,4 @@ ACTIVITY_TYPES_MULTI = [
     "יוגה 🧘",
     "פילאטיס 🤸",
     "אחר ❓"
-]
+)
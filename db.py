@@ -14,9 +14,33 @@ from typing import Dict, List, Optional, Any, Tuple
 
 from config import USERS_FILE, DB_NAME
 
+# orjson (if available) serializes JSON in C, several times faster than json
+try:
+    import orjson
+except ImportError:
+    # orjson not available, fall back to the standard json module
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
 
+def _json_dumps(obj: Any, indent: bool = False) -> str:
+    """ממיר אובייקט למחרוזת JSON (UTF-8, ללא escape לעברית)."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=option).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None)
+
+
+def _json_loads(text: str) -> Any:
+    """ממיר מחרוזת JSON לאובייקט."""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
 def init_db() -> None:
     """יוצר את טבלת nutrition_logs אם אינה קיימת."""
     try:
@@ -62,8 +86,7 @@ def save_daily_entry(user_id: int, calories: int, protein: float, fat: float,
             cursor = conn.cursor()
 
             # המרת רשימת ארוחות ל-JSON
-            meals_json = json.dumps(meals_list,
-                                    ensure_ascii=False) if meals_list else "[]"
+            meals_json = _json_dumps(meals_list) if meals_list else "[]"
             today = date.today().isoformat()
 
             # בדיקה אם כבר יש רשומה ליום זה
@@ -127,12 +150,12 @@ def save_user(user_id: int, user_data: Dict[str, Any]) -> bool:
             data = {}
         else:
             with open(USERS_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
+                data = _json_loads(f.read())
 
         data[str(user_id)] = user_data
 
         with open(USERS_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.write(_json_dumps(data, indent=True))
 
         logger.info(f"Saved user data for user {user_id}")
         return True
@@ -148,7 +171,7 @@ def load_user(user_id: int) -> Optional[Dict[str, Any]]:
             return None
 
         with open(USERS_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
+            data = _json_loads(f.read())
 
         user_data = data.get(str(user_id))
         if user_data:
@@ -162,6 +185,11 @@ def load_user(user_id: int) -> Optional[Dict[str, Any]]:
 class NutritionDB:
     """מחלקה לניהול מסד נתונים של משתמשים, יומן אכילה, תפריטים ואלרגיות."""
 
+    # שדות user_data שנשמרים בטבלת users - save_user קורא רק אותם
+    USER_FIELDS = (
+        "name", "age", "gender", "height", "weight", "goal", "activity", "diet", "allergies",
+    )
+
     def __init__(self, db_path: str = "nutrition.db"):
         """מאתחל את מחלקת מסד הנתונים."""
         self.db_path = db_path
@@ -256,11 +284,8 @@ class NutritionDB:
                 logger.info(f"Connected to database: {self.db_path}")
 
                 # המרת רשימות ל-JSON
-                diet_json = json.dumps(user_data.get(
-                    "diet", []), ensure_ascii=False)
-                allergies_json = json.dumps(
-                    user_data.get("allergies", []), ensure_ascii=False
-                )
+                diet_json = _json_dumps(user_data.get("diet", []))
+                allergies_json = _json_dumps(user_data.get("allergies", []))
                 logger.info(f"Converted diet: {diet_json}, allergies: {allergies_json}")
 
                 # הכנת הנתונים ל-INSERT
@@ -298,6 +323,17 @@ class NutritionDB:
             logger.error(f"Traceback: {traceback.format_exc()}")
             return False
 
+    def delete_user(self, user_id: int) -> bool:
+        """מוחק את רשומת המשתמש ממסד הנתונים (איפוס)."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error(f"Error deleting user from database: {e}")
+            return False
+
     def load_user(self, user_id: int) -> Optional[Dict[str, Any]]:
         """טוען משתמש ממסד הנתונים."""
         try:
@@ -319,8 +355,8 @@ class NutritionDB:
                         "weight": row[5],
                         "goal": row[6],
                         "activity": row[7],
-                        "diet": json.loads(row[8]) if row[8] else [],
-                        "allergies": json.loads(row[9]) if row[9] else [],
+                        "diet": _json_loads(row[8]) if row[8] else [],
+                        "allergies": _json_loads(row[9]) if row[9] else [],
                         "created_at": row[10],
                         "updated_at": row[11],
                     }
@@ -603,8 +639,8 @@ class NutritionDB:
                         "weight": row[5],
                         "goal": row[6],
                         "activity": row[7],
-                        "diet": json.loads(row[8]) if row[8] else [],
-                        "allergies": json.loads(row[9]) if row[9] else [],
+                        "diet": _json_loads(row[8]) if row[8] else [],
+                        "allergies": _json_loads(row[9]) if row[9] else [],
                         "created_at": row[10],
                         "updated_at": row[11]
                     }
@@ -5,9 +5,14 @@ for the Calorico nutritional bot, including questionnaire flow, menu generation,
 and user interactions."""
 
 import asyncio
+from collections import OrderedDict
 import logging
 from datetime import date, datetime
+from functools import lru_cache
+from operator import itemgetter
+import html
 import re
+import sys
 
 from telegram import (
     InlineKeyboardButton,
@@ -21,7 +26,7 @@ from telegram import (
 from telegram.ext import ContextTypes, ConversationHandler
 import telegram
 
-from db import NutritionDB, save_user_data
+from db import NutritionDB
 
 from config import (
     NAME,
@@ -64,6 +69,7 @@ from config import (
     MIXED_FREQUENCY_OPTIONS,
     MIXED_DURATION_OPTIONS,
     ALLERGY_OPTIONS,
+    SYSTEM_BUTTONS,
     ACTIVITY_TYPES_MULTI,
     ACTIVITY_TYPES_SELECTION,
     MENU,
@@ -74,21 +80,15 @@ from utils import (
     build_main_keyboard,
     build_user_prompt_for_gpt,
     call_gpt,
+    call_gpt_stream,
+    GPTStreamError,
+    strip_html_tags,
+    today_iso,
     analyze_meal_with_gpt,
     build_free_text_prompt,
     build_meal_from_ingredients_prompt,
     fallback_via_gpt,
 )
-from report_generator import (
-    get_weekly_report,
-    build_weekly_summary_text,
-    plot_calories,
-    get_nutrition_by_date,
-    get_last_occurrence_of_meal,
-    format_date_query_response,
-    get_monthly_report,
-    build_monthly_summary_text,
-)
 
 # Initialize logger first
 logger = logging.getLogger(__name__)
@@ -96,6 +96,71 @@ logger = logging.getLogger(__name__)
 # Initialize database
 nutrition_db = NutritionDB()
 
+# שמירת משתמשים ב-write-back: handlers מסמנים משתמש כ"מלוכלך" ומשימת רקע
+# אחת כותבת למסד אחרי השהיה קצרה, כך שכמה עדכונים לאותו משתמש בתוך
+# _SAVE_FLUSH_DELAY שניות מתאחדים לכתיבה אחת.
+_SAVE_FLUSH_DELAY = 1.0
+_dirty_users = {}
+_flush_task = None
+
+
+def _mark_dirty(user_id, user_data) -> None:
+    """מסמן את נתוני המשתמש לשמירה ומתזמן flush אם אין אחד ממתין."""
+    global _flush_task
+    _dirty_users[user_id] = user_data
+    if _flush_task is None or _flush_task.done():
+        _flush_task = asyncio.get_running_loop().create_task(_flush_dirty_users())
+
+
+def _log_save(user_id, user_data) -> None:
+    """לוג DEBUG לפני שמירה - רשימת המפתחות נבנית רק כשה-DEBUG פעיל."""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "About to save user data - user_id: %s, context.user_data keys: %s",
+            user_id, list(user_data.keys()) if user_data else 'None')
+
+
+def _snapshot_user_data(user_data: dict) -> dict:
+    """עותק של השדות שנשמרים במסד (NutritionDB.USER_FIELDS) לכתיבה ב-thread.
+
+    רק השדות האלה מועתקים, כך שיומן האכילה ושאר המצב שנצבר ב-user_data לא
+    מועתקים בכל שמירה. handlers ממשיכים לשנות את user_data על לולאת האירועים
+    בזמן שה-thread כותב, ולכן גם רשימות כמו diet מועתקות.
+    """
+    snapshot = {}
+    for key in NutritionDB.USER_FIELDS:
+        if key in user_data:
+            value = user_data[key]
+            snapshot[key] = value.copy() if isinstance(value, (dict, list)) else value
+    return snapshot
+
+
+async def _save_dirty_users() -> None:
+    # הכתיבה ל-SQLite חוסמת, ולכן רצה ב-thread ולא על לולאת האירועים
+    while _dirty_users:
+        user_id, user_data = _dirty_users.popitem()
+        snapshot = _snapshot_user_data(user_data)
+        await asyncio.to_thread(nutrition_db.save_user, user_id, snapshot)
+
+
+async def _save_user_now(user_id, user_data) -> None:
+    """כותב את נתוני המשתמש מיד, ב-thread כדי לא לחסום את לולאת האירועים."""
+    # שמירה מיידית מחליפה כל שמירה ממתינה לאותו משתמש
+    _dirty_users.pop(user_id, None)
+    await asyncio.to_thread(nutrition_db.save_user, user_id, _snapshot_user_data(user_data))
+
+
+async def _flush_dirty_users() -> None:
+    await asyncio.sleep(_SAVE_FLUSH_DELAY)
+    await _save_dirty_users()
+
+
+async def flush_pending_saves(application=None) -> None:
+    """כותב מיד את כל השמירות הממתינות (לשימוש בכיבוי הבוט)."""
+    if _flush_task is not None and not _flush_task.done():
+        _flush_task.cancel()
+    await _save_dirty_users()
+
 # Import OpenAI client
 try:
     from openai import OpenAI
@@ -108,119 +173,451 @@ except ImportError:
 def get_openai_client():
     """Get OpenAI client instance."""
     global _openai_client
-    if _openai_client is None:
-        try:
-            from openai import OpenAI as OpenAIClient
-            _openai_client = OpenAIClient()
-        except ImportError:
-            logger.error("OpenAI not available")
-            return None
-    return _openai_client
-
-
-ALLERGY_OPTIONS = [
-    "אין",
-    "בוטנים",
-    "אגוזים",
-    "חלב",
-    "גלוטן",
-    "ביצים",
-    "סויה",
-    "דגים",
-    "שומשום",
-    "סלרי",
-    "חרדל",
-    "סולפיטים",
-    "שאר (פרט/י)",
-]
+    client = _openai_client
+    if client is not None:
+        return client
+    try:
+        from openai import OpenAI as OpenAIClient
+        client = _openai_client = OpenAIClient()
+    except ImportError:
+        logger.error("OpenAI not available")
+        return None
+    return client
+
+
+# כפתורי האלרגיות נבנים פעם אחת: (אלרגיה, כפתור רגיל, כפתור מסומן).
+# "אין" לא מוצג - הוא מטופל בשלב הקודם
+_ALLERGY_BUTTONS = tuple(
+    (
+        opt,
+        InlineKeyboardButton(opt, callback_data=f"allergy_toggle_{opt}"),
+        InlineKeyboardButton(f"{opt} ❌", callback_data=f"allergy_toggle_{opt}"),
+    )
+    for opt in ALLERGY_OPTIONS
+    if opt != "אין"
+)
+_ALLERGY_DONE_BTN = InlineKeyboardButton("סיימתי", callback_data="allergy_done")
 
 
 def build_allergy_keyboard(selected):
     """בונה inline keyboard לבחירת אלרגיות מרובות עם טוגל וכפתור סיום."""
-    keyboard = []
-    for opt in ALLERGY_OPTIONS:
-        if opt == "אין":
-            # דלג על כפתור "אין" - הוא יטופל בשלב הקודם
-            continue
-        else:
-            # כפתור טוגל לכל אלרגיה
-            text = opt + (" ❌" if opt in selected else "")
-            callback_data = f"allergy_toggle_{opt}"
-            keyboard.append([InlineKeyboardButton(text, callback_data=callback_data)])
+    # המרה חד-פעמית ל-set כדי שבדיקת השייכות בלולאה תהיה O(1)
+    selected_set = selected if isinstance(selected, (set, frozenset)) else frozenset(selected)
+    # כפתור טוגל לכל אלרגיה
+    keyboard = [
+        [selected_btn if opt in selected_set else plain_btn]
+        for opt, plain_btn, selected_btn in _ALLERGY_BUTTONS
+    ]
     # כפתור "סיימתי" בסוף
-    keyboard.append([InlineKeyboardButton("סיימתי", callback_data="allergy_done")])
+    keyboard.append([_ALLERGY_DONE_BTN])
     return InlineKeyboardMarkup(keyboard)
 
 
+# כפתורי התזונה נבנים פעם אחת - גרסה רגילה וגרסה מסומנת באיקס לכל אפשרות
+_DIET_BTN_PLAIN = tuple(KeyboardButton(option) for option in DIET_OPTIONS)
+_DIET_BTN_SELECTED = tuple(KeyboardButton(f"❌ {option}") for option in DIET_OPTIONS)
+_DIET_DONE_ROW = [KeyboardButton("סיימתי בחירת העדפות")]
+
+
 def build_diet_keyboard(selected_options):
     """בונה מקלדת תזונה עם אימוג'י איקס על בחירות נבחרות."""
-    keyboard = []
-    for option in DIET_OPTIONS:
-        if option in selected_options:
-            # אם נבחר - הוסף איקס
-            button_text = f"❌ {option}"
-        else:
-            # אם לא נבחר - הצג רגיל
-            button_text = option
-        keyboard.append([KeyboardButton(button_text)])
-
+    selected_set = set(selected_options)
+    keyboard = [
+        [_DIET_BTN_SELECTED[i] if option in selected_set else _DIET_BTN_PLAIN[i]]
+        for i, option in enumerate(DIET_OPTIONS)
+    ]
     # כפתור לסיום
-    keyboard.append([KeyboardButton("סיימתי בחירת העדפות")])
+    keyboard.append(_DIET_DONE_ROW)
     return keyboard
 
 
-def validate_age(age_text: str) -> tuple[bool, int, str]:
-    """בודק תקינות גיל ומחזיר (תקין, גיל, הודעת שגיאה)."""
+# טקסטים מגדריים לפי (מגדר, מזהה שאלה) - נבנה פעם אחת בטעינת המודול.
+# המפתח None הוא הנוסח הניטרלי, למשתמשים שלא בחרו זכר או נקבה.
+_PROMPTS = {
+    ("נקבה", "diet_pref"): "מה העדפות התזונה שלך? (בחרי כל מה שמתאים)",
+    ("זכר", "diet_pref"): "מה העדפות התזונה שלך? (בחר כל מה שמתאים)",
+    (None, "diet_pref"): "מה העדפות התזונה שלך? (בחר/י כל מה שמתאים)",
+    ("נקבה", "diet_toggle"): "מה העדפות התזונה שלך? (לחצי על אפשרות כדי לבחור או לבטל בחירה)",
+    ("זכר", "diet_toggle"): "מה העדפות התזונה שלך? (לחץ על אפשרות כדי לבחור או לבטל בחירה)",
+    (None, "diet_toggle"): "מה העדפות התזונה שלך? (לחץ/י על אפשרות כדי לבחור או לבטל בחירה)",
+    ("נקבה", "age_q"): "בת כמה את?",
+    (None, "age_q"): "בן כמה אתה?",
+    ("זכר", "activity_type_invalid"): "בחר סוג פעילות מהתפריט למטה:",
+    (None, "activity_type_invalid"): "בחרי סוג פעילות מהתפריט למטה:",
+    ("נקבה", "allergy_q"): "האם יש לך אלרגיות למזון? (אם לא, בחרי 'לא')",
+    (None, "allergy_q"): "האם יש לך אלרגיות למזון? (אם לא, בחר 'לא')",
+    ("נקבה", "allergy_yes_no_invalid"): "בחרי 'כן' או 'לא' מהתפריט למטה:",
+    (None, "allergy_yes_no_invalid"): "בחר 'כן' או 'לא' מהתפריט למטה:",
+    ("נקבה", "activity_frequency"): "כמה פעמים בשבוע את מבצעת את הפעילות?",
+    ("זכר", "activity_frequency"): "כמה פעמים בשבוע אתה מבצע את הפעילות?",
+    (None, "activity_frequency"): "כמה פעמים בשבוע את/ה מבצע/ת את הפעילות?",
+    ("נקבה", "training_frequency"): "כמה פעמים בשבוע את מתאמנת?",
+    ("זכר", "training_frequency"): "כמה פעמים בשבוע אתה מתאמן?",
+    (None, "training_frequency"): "כמה פעמים בשבוע את/ה מתאמן/ת?",
+    ("נקבה", "mixed_activities"): "אילו סוגי אימונים את מבצעת במהלך השבוע? (בחרי כל מה שמתאים)",
+    ("זכר", "mixed_activities"): "אילו סוגי אימונים אתה מבצע במהלך השבוע? (בחר כל מה שמתאים)",
+    (None, "mixed_activities"): "אילו סוגי אימונים את/ה מבצע/ת במהלך השבוע? (בחר/י כל מה שמתאים)",
+    ("נקבה", "pick_frequency"): "בחרי תדירות מהתפריט למטה:",
+    ("זכר", "pick_frequency"): "בחר תדירות מהתפריט למטה:",
+    (None, "pick_frequency"): "בחר/י תדירות מהתפריט למטה:",
+    ("נקבה", "pick_duration"): "בחרי משך מהתפריט למטה:",
+    ("זכר", "pick_duration"): "בחר משך מהתפריט למטה:",
+    (None, "pick_duration"): "בחר/י משך מהתפריט למטה:",
+    ("נקבה", "training_time"): "באיזה שעה בדרך כלל את מתאמנת?",
+    ("זכר", "training_time"): "באיזה שעה בדרך כלל אתה מתאמן?",
+    (None, "training_time"): "באיזה שעה בדרך כלל את/ה מתאמן/ת?",
+    ("נקבה", "pick_time"): "בחרי שעה מהתפריט למטה:",
+    ("זכר", "pick_time"): "בחר שעה מהתפריט למטה:",
+    (None, "pick_time"): "בחר/י שעה מהתפריט למטה:",
+    ("נקבה", "pick_goal"): "בחרי מטרה מהתפריט למטה:",
+    ("זכר", "pick_goal"): "בחר מטרה מהתפריט למטה:",
+    (None, "pick_goal"): "בחר/י מטרה מהתפריט למטה:",
+    ("נקבה", "pick_yes_no"): "בחרי כן או לא:",
+    ("זכר", "pick_yes_no"): "בחר כן או לא:",
+    (None, "pick_yes_no"): "בחר/י כן או לא:",
+    ("נקבה", "mixed_min_one"): "אנא בחרי לפחות סוג פעילות אחד לפני ההמשך.",
+    ("זכר", "mixed_min_one"): "אנא בחר לפחות סוג פעילות אחד לפני ההמשך.",
+    (None, "mixed_min_one"): "אנא בחר/י לפחות סוג פעילות אחד לפני ההמשך.",
+    ("נקבה", "mixed_toggle"): "בחרי את סוגי הפעילות הגופנית שלך (לחיצה נוספת מבטלת בחירה):",
+    ("זכר", "mixed_toggle"): "בחר את סוגי הפעילות הגופנית שלך (לחיצה נוספת מבטלת בחירה):",
+    (None, "mixed_toggle"): "בחר/י את סוגי הפעילות הגופנית שלך (לחיצה נוספת מבטלת בחירה):",
+    ("נקבה", "diet_invalid"): "אנא בחרי אפשרות מהתפריט למטה או לחצי על 'סיימתי בחירת העדפות'",
+    ("זכר", "diet_invalid"): "אנא בחר אפשרות מהתפריט למטה או לחץ על 'סיימתי בחירת העדפות'",
+    (None, "diet_invalid"): "אנא בחר/י אפשרות מהתפריט למטה או לחץ/י על 'סיימתי בחירת העדפות'",
+    (None, "cardio_goal"): "מה מטרת הפעילות?",
+    (None, "only_activity"): "האם זו הפעילות היחידה שלך?",
+    ("נקבה", "next_action"): "מה תרצי לעשות כעת?",
+    (None, "next_action"): "מה תרצה לעשות כעת?",
+    ("נקבה", "water_reminder_q"): "האם תרצי לקבל תזכורת לשתות מים כל שעה וחצי?",
+    (None, "water_reminder_q"): "האם תרצה לקבל תזכורת לשתות מים כל שעה וחצי?",
+    ("נקבה", "does_activity"): "האם את עושה פעילות גופנית? (בחרי כן או לא)",
+    ("זכר", "does_activity"): "האם אתה עושה פעילות גופנית? (בחר כן או לא)",
+    (None, "does_activity"): "האם את/ה עושה/ת פעילות גופנית? (בחר/י כן או לא)",
+    ("נקבה", "does_activity_invalid"): "האם את עושה פעילות גופנית? (בחרי כן או לא מהתפריט למטה)",
+    ("זכר", "does_activity_invalid"): "האם אתה עושה פעילות גופנית? (בחר כן או לא מהתפריט למטה)",
+    (None, "does_activity_invalid"): "האם את/ה עושה/ת פעילות גופנית? (בחר/י כן או לא מהתפריט למטה)",
+    ("נקבה", "activity_types"): "איזה סוגי פעילות את עושה? (בחרי כל מה שמתאים)",
+    ("זכר", "activity_types"): "איזה סוגי פעילות אתה עושה? (בחר כל מה שמתאים)",
+    (None, "activity_types"): "איזה סוגי פעילות את/ה עושה/ת? (בחר/י כל מה שמתאים)",
+    # שאלות תדירות לפי סוג פעילות; {activity} מוחלף בשם הפעילות
+    ("נקבה", "freq_running"): "כמה פעמים בשבוע את רצה?",
+    ("זכר", "freq_running"): "כמה פעמים בשבוע אתה רץ?",
+    (None, "freq_running"): "כמה פעמים בשבוע את/ה רץ/ה?",
+    ("נקבה", "freq_strength"): "כמה פעמים בשבוע את מתאמנת?",
+    ("זכר", "freq_strength"): "כמה פעמים בשבוע אתה מתאמן?",
+    (None, "freq_strength"): "כמה פעמים בשבוע את/ה מתאמן/ת?",
+    ("נקבה", "freq_perform"): "כמה פעמים בשבוע את מבצעת {activity}?",
+    ("זכר", "freq_perform"): "כמה פעמים בשבוע אתה מבצע {activity}?",
+    (None, "freq_perform"): "כמה פעמים בשבוע את/ה מבצע/ת {activity}?",
+    ("נקבה", "freq_practice"): "כמה פעמים בשבוע את מתאמנת {activity}?",
+    ("זכר", "freq_practice"): "כמה פעמים בשבוע אתה מתאמן {activity}?",
+    (None, "freq_practice"): "כמה פעמים בשבוע את/ה מתאמן/ת {activity}?",
+    ("נקבה", "freq_other"): "כמה פעמים בשבוע את מבצעת פעילות אחרת?",
+    ("זכר", "freq_other"): "כמה פעמים בשבוע אתה מבצע פעילות אחרת?",
+    (None, "freq_other"): "כמה פעמים בשבוע את/ה מבצע/ת פעילות אחרת?",
+    ("נקבה", "eaten_prompt"): "אשמח שתפרטי מה אכלת היום, בצורה הבאה: ביצת עין, 2 פרוסות לחם לבן עם גבינה לבנה 5%, סלט ירקות ממלפפון ועגבנייה",
+    ("זכר", "eaten_prompt"): "אשמח שתפרט מה אכלת היום, בצורה הבאה: ביצת עין, 2 פרוסות לחם לבן עם גבינה לבנה 5%, סלט ירקות ממלפפון ועגבנייה",
+    (None, "eaten_prompt"): "אשמח שתפרט/י מה אכלת היום, בצורה הבאה: ביצת עין, 2 פרוסות לחם לבן עם גבינה לבנה 5%, סלט ירקות ממלפפון ועגבנייה",
+}
+
+
+def _prompt(gender, prompt_id):
+    """מחזירה טקסט מגדרי מ-_PROMPTS, ונופלת לנוסח הניטרלי אם אין נוסח למגדר."""
+    return _PROMPTS.get((gender, prompt_id)) or _PROMPTS[(None, prompt_id)]
+
+
+def _fast_strip(text: str) -> str:
+    """מחזיר את הטקסט ללא רווחים בקצוות, כמחרוזת interned.
+
+    טקסט של כפתורי מקלדת אינו נחתך מחדש, וה-intern מאפשר להשוואה מול
+    תוויות הכפתורים בסטים למטה להצליח כבר בבדיקת הזהות.
+    """
+    if text and (text[0].isspace() or text[-1].isspace()):
+        text = text.strip()
+    return sys.intern(text)
+
+
+# אימוג'י של סוגי הפעילות (כולל VS16 שאחרי 🏋) - נמחקים במעבר translate אחד
+_ACTIVITY_EMOJI = "🏃🚶🚴🏊🏋🧘🤸❓\ufe0f"
+_EMOJI_STRIP_TABLE = str.maketrans("", "", _ACTIVITY_EMOJI)
+# clean_text: גם רווחים וסימון LRM
+_CLEAN_TEXT_TABLE = str.maketrans("", "", _ACTIVITY_EMOJI + " \u200e")
+# מזהה callback: רווח הופך לקו תחתון והאימוג'י נמחקים
+_ACTIVITY_KEY_TABLE = str.maketrans(" ", "_", _ACTIVITY_EMOJI)
+
+
+def _label_set(options):
+    """בונה frozenset של תוויות כפתורים אחרי sys.intern."""
+    return frozenset(map(sys.intern, options))
+
+
+async def _safe(awaitable, what: str = "reply_text"):
+    """ממתין לקריאה ל-Telegram API ורושם שגיאה בלוג במקום להפיל את ה-handler.
+
+    RetryAfter מגיע לכאן רק אחרי שה-rate limiter של האפליקציה מיצה את הניסיונות
+    החוזרים, ו-BadRequest הוא בדרך כלל עריכה שלא שינתה דבר - שניהם נרשמים
+    כאזהרה ולא כשגיאה.
+    """
+    try:
+        return await awaitable
+    except telegram.error.RetryAfter as e:
+        logger.warning("Telegram flood limit in %s, retry after %s s", what, e.retry_after)
+    except telegram.error.BadRequest as e:
+        logger.warning("Telegram rejected %s: %s", what, e)
+    except Exception as e:
+        logger.error("Telegram API error in %s: %s", what, e)
+    return None
+
+
+def _effective_user_id(update: Update):
+    """מחזיר את מזהה המשתמש של העדכון, או None אם אין משתמש."""
+    user = update.effective_user
+    return user.id if user else None
+
+
+def _options_keyboard(options, one_time_keyboard=True):
+    """בונה ReplyKeyboardMarkup עם כפתור אחד בכל שורה לכל אפשרות ברשימה."""
+    return ReplyKeyboardMarkup(
+        [[KeyboardButton(opt)] for opt in options],
+        one_time_keyboard=one_time_keyboard,
+        resize_keyboard=True,
+    )
+
+
+# מקלדות קבועות לשאלון - נבנות פעם אחת ומשותפות לכל הבקשות
+_ACTIVITY_FREQUENCY_KB = _options_keyboard(ACTIVITY_FREQUENCY_OPTIONS)
+_ACTIVITY_DURATION_KB = _options_keyboard(ACTIVITY_DURATION_OPTIONS)
+_TRAINING_TIME_KB = _options_keyboard(TRAINING_TIME_OPTIONS)
+_CARDIO_GOAL_KB = _options_keyboard(CARDIO_GOAL_OPTIONS)
+_STRENGTH_GOAL_KB = _options_keyboard(STRENGTH_GOAL_OPTIONS)
+_SUPPLEMENT_KB = _options_keyboard(SUPPLEMENT_OPTIONS)
+_MIXED_ACTIVITY_KB = _options_keyboard(MIXED_ACTIVITY_OPTIONS)
+_MIXED_FREQUENCY_KB = _options_keyboard(MIXED_FREQUENCY_OPTIONS, one_time_keyboard=False)
+_MIXED_DURATION_KB = _options_keyboard(MIXED_DURATION_OPTIONS, one_time_keyboard=False)
+_DIET_KB = _options_keyboard(DIET_OPTIONS)
+_ACTIVITY_YES_NO_KB = _options_keyboard(ACTIVITY_YES_NO_OPTIONS)
+_GENDER_KB = _options_keyboard(GENDER_OPTIONS)
+_GOAL_KB = _options_keyboard(GOAL_OPTIONS)
+_ACTIVITY_TYPE_KB = _options_keyboard(ACTIVITY_TYPE_OPTIONS)
+# הסרת מקלדת - אובייקט immutable אחד משותף לכל ההודעות
+_REMOVE_KB = ReplyKeyboardRemove()
+_YES_NO_KB = ReplyKeyboardMarkup(
+    [[KeyboardButton("כן"), KeyboardButton("לא")]],
+    one_time_keyboard=True,
+    resize_keyboard=True,
+)
+# התפריט הראשי בסיום השאלון
+_MAIN_MENU_KB = _options_keyboard(SYSTEM_BUTTONS, one_time_keyboard=False)
+# שאלת "לעדכן את כל הפרטים?" - כן/לא בשורות נפרדות
+_UPDATE_DETAILS_KB = ReplyKeyboardMarkup(
+    [[KeyboardButton("כן")], [KeyboardButton("לא")]],
+    resize_keyboard=True,
+)
+# שעת שליחת התפריט היומי למחר
+_MENU_HOUR_KB = ReplyKeyboardMarkup(
+    [
+        [KeyboardButton("06:00"), KeyboardButton("07:00")],
+        [KeyboardButton("08:00"), KeyboardButton("09:00")],
+        [KeyboardButton("מעדיפה לבקש לבד")],
+    ],
+    resize_keyboard=True,
+)
+_WATER_OPT_IN_KB = ReplyKeyboardMarkup(
+    [[KeyboardButton("כן, אשמח!"), KeyboardButton("לא, תודה")]],
+    one_time_keyboard=True,
+    resize_keyboard=True,
+)
+_WATER_AMOUNT_KB = ReplyKeyboardMarkup(
+    [
+        [KeyboardButton('כוס אחת (240 מ"ל)'), KeyboardButton('שתי כוסות (480 מ"ל)')],
+        [KeyboardButton('בקבוק קטן (500 מ"ל)'), KeyboardButton("בקבוק גדול (1 ליטר)")],
+        [KeyboardButton("אחר")],
+    ],
+    one_time_keyboard=True,
+    resize_keyboard=True,
+)
+# כמות המים (מ"ל) לכל כפתור במקלדת הכמויות, וכמות חופשית בספרות ASCII בלבד
+_WATER_AMOUNTS = {
+    'כוס אחת (240 מ"ל)': 240,
+    'שתי כוסות (480 מ"ל)': 480,
+    'בקבוק קטן (500 מ"ל)': 500,
+    "בקבוק גדול (1 ליטר)": 1000,
+}
+_WATER_ML_RE = re.compile(r"[0-9]{1,5}")
+_REPORT_TYPES_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📊 סיכום יומי", callback_data="report_daily")],
+    [InlineKeyboardButton("📅 סיכום שבועי", callback_data="report_weekly")],
+    [InlineKeyboardButton("🗓 סיכום חודשי", callback_data="report_monthly")],
+    [InlineKeyboardButton("🧠 פידבק חכם", callback_data="report_smart_feedback")],
+])
+
+_RESET_CONFIRM_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("כן, אפס הכול", callback_data="reset_confirm")],
+    [InlineKeyboardButton("לא, ביטול", callback_data="reset_cancel")],
+])
+
+# בחירה מרובה בהודעה אחת מופרדת בפסיקים או בשורות חדשות
+_SELECTION_SPLIT_RE = re.compile(r"\s*[,\n]\s*")
+_SUPPLEMENT_SET = _label_set(SUPPLEMENT_OPTIONS)
+# זיהוי אפשרויות תזונה בטקסט במעבר אחד; הארוכות קודם כדי להעדיף התאמה מלאה
+_DIET_RE = re.compile(
+    "|".join(sorted(map(re.escape, DIET_OPTIONS), key=len, reverse=True))
+)
+
+# סטים לבדיקת תקינות בחירה מהמקלדת - O(1) במקום סריקה של רשימה
+_GENDER_SET = _label_set(GENDER_OPTIONS)
+_ACTIVITY_YES_NO_SET = _label_set(ACTIVITY_YES_NO_OPTIONS)
+_ACTIVITY_TYPE_SET = _label_set(ACTIVITY_TYPE_OPTIONS)
+_ACTIVITY_FREQUENCY_SET = _label_set(ACTIVITY_FREQUENCY_OPTIONS)
+_ACTIVITY_DURATION_SET = _label_set(ACTIVITY_DURATION_OPTIONS)
+_TRAINING_TIME_SET = _label_set(TRAINING_TIME_OPTIONS)
+_CARDIO_GOAL_SET = _label_set(CARDIO_GOAL_OPTIONS)
+_STRENGTH_GOAL_SET = _label_set(STRENGTH_GOAL_OPTIONS)
+_MIXED_FREQUENCY_SET = _label_set(MIXED_FREQUENCY_OPTIONS)
+_MIXED_DURATION_SET = _label_set(MIXED_DURATION_OPTIONS)
+_YES_NO_SET = _label_set(("כן", "לא"))
+
+
+# טבלת ולידציה לשדות מספריים: (פונקציית המרה, מינימום, מקסימום, כישלון טווח, כישלון פורמט).
+# תוצאות הכישלון הן tuples קבועים, כך שקלט שגוי לא מקצה תוצאה חדשה.
+_VALIDATION_TABLE = {
+    "age": (int, 12, 120,
+            (False, 0, "הגיל חייב להיות בין 12 ל-120 שנים."),
+            (False, 0, "אנא הזן מספר תקין לגיל.")),
+    "height": (float, 100, 250,
+               (False, 0, "הגובה חייב להיות בין 100 ל-250 ס\"מ."),
+               (False, 0, "אנא הזן מספר תקין לגובה.")),
+    "weight": (float, 30, 300,
+               (False, 0, "המשקל חייב להיות בין 30 ל-300 ק\"ג."),
+               (False, 0, "אנא הזן מספר תקין למשקל.")),
+    "body_fat": (float, 5, 50,
+                 (False, 0, "אחוז השומן חייב להיות בין 5% ל-50%."),
+                 (False, 0, "אנא הזן מספר תקין לאחוז שומן.")),
+}
+
+
+def _validate_numeric(kind: str, text: str):
+    """בודק ערך מספרי לפי _VALIDATION_TABLE ומחזיר (תקין, ערך, הודעת שגיאה)."""
+    parse, low, high, range_failure, format_failure = _VALIDATION_TABLE[kind]
     try:
-        age = int(age_text.strip())
-        if 12 <= age <= 120:
-            return True, age, ""
-        return False, 0, "הגיל חייב להיות בין 12 ל-120 שנים."
+        value = parse(text.strip())
     except ValueError:
-        return False, 0, "אנא הזן מספר תקין לגיל."
+        return format_failure
+    if low <= value <= high:
+        return True, value, ""
+    return range_failure
+
+
+def validate_age(age_text: str) -> tuple[bool, int, str]:
+    """בודק תקינות גיל ומחזיר (תקין, גיל, הודעת שגיאה)."""
+    return _validate_numeric("age", age_text)
 
 
 def validate_height(height_text: str) -> tuple[bool, float, str]:
     """בודק תקינות גובה ומחזיר (תקין, גובה, הודעת שגיאה)."""
-    try:
-        height = float(height_text.strip())
-        if 100 <= height <= 250:
-            return True, height, ""
-        return False, 0, "הגובה חייב להיות בין 100 ל-250 ס\"מ."
-    except ValueError:
-        return False, 0, "אנא הזן מספר תקין לגובה."
+    return _validate_numeric("height", height_text)
 
 
 def validate_weight(weight_text: str) -> tuple[bool, float, str]:
     """בודק תקינות משקל ומחזיר (תקין, משקל, הודעת שגיאה)."""
-    try:
-        weight = float(weight_text.strip())
-        if 30 <= weight <= 300:
-            return True, weight, ""
-        return False, 0, "המשקל חייב להיות בין 30 ל-300 ק\"ג."
-    except ValueError:
-        return False, 0, "אנא הזן מספר תקין למשקל."
+    return _validate_numeric("weight", weight_text)
 
 
 def validate_body_fat(body_fat_text: str) -> tuple[bool, float, str]:
     """בודק תקינות אחוז שומן ומחזיר (תקין, אחוז, הודעת שגיאה)."""
-    try:
-        body_fat = float(body_fat_text.strip())
-        if 5 <= body_fat <= 50:
-            return True, body_fat, ""
-        return False, 0, "אחוז השומן חייב להיות בין 5% ל-50%."
-    except ValueError:
-        return False, 0, "אנא הזן מספר תקין לאחוז שומן."
+    return _validate_numeric("body_fat", body_fat_text)
+
+
+async def reset_user(user_id):
+    # איפוס נתוני המשתמש: DELETE אחד דרך nutrition_db הקיים, במקום מופע NutritionDB
+    # חדש (עם יצירת הטבלאות) וכתיבה של רשומה ריקה. שמירה ממתינה לא תחזיר את הנתונים.
+    _dirty_users.pop(user_id, None)
+    # הכתיבה ל-SQLite חוסמת, ולכן רצה ב-thread ולא על לולאת האירועים
+    await asyncio.to_thread(nutrition_db.delete_user, user_id)
+
+
+# הודעות הפתיחה של /start - טקסט קבוע, נבנה פעם אחת בטעינת המודול
+# הודעה 1: הצגה עצמית ופיצ'רים קיימים
+_WELCOME_FEATURES_MSG = (
+    "היי! אני קלוריקו – הבוט שיעזור לך לשמור על תזונה ואיזון יומי 💪🥗\n\n"
+    "הנה מה שאני יודע לעשות כבר עכשיו:\n\n"
+    "🍽 תפריט יומי מותאם אישית – לפי הגובה, המשקל, הגיל, רמת הפעילות והמטרה שלך  \n"
+    "🧮 מעקב קלוריות חכם – כולל חישוב תקציב יומי, סיכום קלורי לארוחות ועדכון שוטף  \n"
+    "📝 רישום חופשי של מה שאכלת – פשוט כתוב/י: 'אכלתי...' ואני אחשב הכל  \n"
+    "🤔 שאלות חופשיות על אוכל – כמו 'אפשר המבורגר?' או 'כמה קלוריות יש בתפוח?'  \n"
+    "📌 הודעות נעוצות עם תקציב יומי מעודכן – מתעדכן אוטומטית אחרי כל ארוחה  \n"
+    "📅 תפריט חדש כל בוקר בשעה שתבחר/י  \n"
+    "🆕 שינוי קל בכל עת – משקל, יעד, תפריט, אלרגיות, ספורט ועוד"
+)
 
+# הודעה 2: דברים שיגיעו בקרוב
+_WELCOME_ROADMAP_MSG = (
+    "🚧 מה עוד בדרך?\n\n"
+    "📊 דוחות שבועיים וחודשיים – כולל מגמות אישיות  \n"
+    "🍳 ניתוח תזונתי לפי חלבון, שומן ופחמימות  \n"
+    "💧 תזכורות שתייה חכמות  \n"
+    "✅ סיכום יומי עם המלצות לשיפור  \n"
+    "📲 תמיכה באפליקציות כושר"
+)
 
-def reset_user(user_id):
-    # איפוס נתוני משתמש ב-users.json
-    save_user_data(user_id, {})
-    # אפשר להוסיף כאן איפוס נוסף ב-nutrition.db אם צריך
+# הודעה 3: איך להשתמש
+_WELCOME_USAGE_MSG = (
+    "איך מדברים איתי? פשוט מאוד:\n\n"
+    "- 'אכלתי 2 פרוסות לחם עם קוטג' וסלט'  \n"
+    "- 'בא לי שוקולד. כדאי לי?'  \n"
+    "- 'כמה קלוריות יש ב-100 גרם אורז?'  \n"
+    "- 'רוצה תפריט יומי'"
+)
+
+# הודעה 4: הודעה קריטית על כפתור "סיימתי"
+_WELCOME_FINISH_DAY_MSG = (
+    "**כדי לסיים את היום – יש ללחוץ על הכפתור \"סיימתי\"**\n\n"
+    "זה מאפס את התקציב, שולח לך סיכום יומי, ושואל מתי לשלוח את התפריט למחר!"
+)
+
+
+# גוף הודעת אישור האיפוס של /reset - רק שורת הפתיחה תלויה בשם המשתמש
+_RESET_CONFIRM_MSG = (
+    "את/ה מבקש/ת לאפס את כל הנתונים שלך.\n"
+    "זה ימחק את:\n"
+    "• כל הנתונים האישיים שלך\n"
+    "• היסטוריית התזונה\n"
+    "• העדפות התפריט\n"
+    "• כל ההגדרות\n\n"
+    "את/ה בטוח/ה שברצונך לאפס הכול?"
+)
+
+# טקסט /help
+_HELP_TEXT = """
+🤖 <b>עזרה - בוט התזונה קלוריקו</b>
+
+<b>פקודות זמינות:</b>
+/start - התחלת הבוט
+/help - הצגת עזרה זו
+
+<b>פונקציות עיקריות:</b>
+• שאלון התאמה אישית
+• תפריטים יומיים מותאמים
+• מעקב אחרי ארוחות
+• תזכורות שתיית מים
+• דוחות תזונתיים
+
+<b>תמיכה:</b>
+אם יש לך שאלות, פשוט כתוב לי!
+"""
+
+_WELCOME_MESSAGES = (
+    _WELCOME_FEATURES_MSG,
+    _WELCOME_ROADMAP_MSG,
+    _WELCOME_USAGE_MSG,
+    _WELCOME_FINISH_DAY_MSG,
+)
+# השהייה קצרה בין הודעות הפתיחה - ה-handler מחזיק את התור של הצ'אט בזמן הזה
+_WELCOME_DELAY = 1
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """מתחיל את הבוט ומציג הודעת פתיחה בשלוש הודעות נפרדות, עם השהייה של 3 שניות בין כל הודעה."""
+    """מתחיל את הבוט ומציג הודעת פתיחה בארבע הודעות נפרדות, עם השהייה קצרה בין כל הודעה."""
     logger.info(f"[START] Received /start command from user {update.effective_user.id if update.effective_user else 'Unknown'}")
     
     if not update.message:
@@ -236,15 +633,18 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.info(f"[START] Processing start for user {user_id}")
 
     # אם למשתמש יש gender או flow.setup_complete, קפוץ ישר לתפריט הראשי
-    if context.user_data and (context.user_data.get("gender") or context.user_data.get("flow", {}).get("setup_complete")):
-        await update.message.reply_text(
-            "ברוך/ה הבא/ה! התפריט הראשי:",
-            reply_markup=build_main_keyboard(user_data=context.user_data),
-        )
-        return
+    user_data = context.user_data
+    if user_data:
+        flow = user_data.get("flow")
+        if user_data.get("gender") or (flow is not None and flow.get("setup_complete")):
+            await update.message.reply_text(
+                "ברוך/ה הבא/ה! התפריט הראשי:",
+                reply_markup=build_main_keyboard(user_data=user_data),
+            )
+            return
 
     # איפוס נתוני משתמש במסד נתונים
-    reset_user(user_id)
+    await reset_user(user_id)
     # איפוס context
     if context.user_data is not None:
         context.user_data.clear()
@@ -260,50 +660,11 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     logger.info(f"[START] Bot started by user {user.id} ({user_name})")
 
-    # הודעה 1: הצגה עצמית ופיצ'רים קיימים
-    msg1 = (
-        "היי! אני קלוריקו – הבוט שיעזור לך לשמור על תזונה ואיזון יומי 💪🥗\n\n"
-        "הנה מה שאני יודע לעשות כבר עכשיו:\n\n"
-        "🍽 תפריט יומי מותאם אישית – לפי הגובה, המשקל, הגיל, רמת הפעילות והמטרה שלך  \n"
-        "🧮 מעקב קלוריות חכם – כולל חישוב תקציב יומי, סיכום קלורי לארוחות ועדכון שוטף  \n"
-        "📝 רישום חופשי של מה שאכלת – פשוט כתוב/י: 'אכלתי...' ואני אחשב הכל  \n"
-        "🤔 שאלות חופשיות על אוכל – כמו 'אפשר המבורגר?' או 'כמה קלוריות יש בתפוח?'  \n"
-        "📌 הודעות נעוצות עם תקציב יומי מעודכן – מתעדכן אוטומטית אחרי כל ארוחה  \n"
-        "📅 תפריט חדש כל בוקר בשעה שתבחר/י  \n"
-        "🆕 שינוי קל בכל עת – משקל, יעד, תפריט, אלרגיות, ספורט ועוד"
-    )
-    await update.message.reply_text(msg1, parse_mode="HTML", reply_markup=ReplyKeyboardRemove())
-    await asyncio.sleep(3)
-
-    # הודעה 2: דברים שיגיעו בקרוב
-    msg2 = (
-        "🚧 מה עוד בדרך?\n\n"
-        "📊 דוחות שבועיים וחודשיים – כולל מגמות אישיות  \n"
-        "🍳 ניתוח תזונתי לפי חלבון, שומן ופחמימות  \n"
-        "💧 תזכורות שתייה חכמות  \n"
-        "✅ סיכום יומי עם המלצות לשיפור  \n"
-        "📲 תמיכה באפליקציות כושר"
-    )
-    await update.message.reply_text(msg2, parse_mode="HTML")
-    await asyncio.sleep(3)
-
-    # הודעה 3: איך להשתמש
-    msg3 = (
-        "איך מדברים איתי? פשוט מאוד:\n\n"
-        "- 'אכלתי 2 פרוסות לחם עם קוטג' וסלט'  \n"
-        "- 'בא לי שוקולד. כדאי לי?'  \n"
-        "- 'כמה קלוריות יש ב-100 גרם אורז?'  \n"
-        "- 'רוצה תפריט יומי'"
-    )
-    await update.message.reply_text(msg3, parse_mode="HTML")
-    await asyncio.sleep(3)
-
-    # הודעה 4: הודעה קריטית על כפתור "סיימתי"
-    critical_msg = (
-        "**כדי לסיים את היום – יש ללחוץ על הכפתור \"סיימתי\"**\n\n"
-        "זה מאפס את התקציב, שולח לך סיכום יומי, ושואל מתי לשלוח את התפריט למחר!"
-    )
-    await update.message.reply_text(critical_msg, parse_mode="HTML")
+    for i, text in enumerate(_WELCOME_MESSAGES):
+        if i:
+            await asyncio.sleep(_WELCOME_DELAY)
+        await _safe(update.message.reply_text(
+            text, reply_markup=_REMOVE_KB if i == 0 else None))
 
     # המשך flow: אם אין שם בטלגרם - שאל שם, אחרת המשך לשאלת מגדר
     if not user.first_name:
@@ -324,22 +685,9 @@ async def reset_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_name = update.effective_user.first_name or "חבר/ה"
     
     # בדוק אם המשתמש בטוח
-    keyboard = [
-        [InlineKeyboardButton("כן, אפס הכול", callback_data="reset_confirm")],
-        [InlineKeyboardButton("לא, ביטול", callback_data="reset_cancel")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
     await update.message.reply_text(
-        f"שלום {user_name}! 🔄\n\n"
-        "את/ה מבקש/ת לאפס את כל הנתונים שלך.\n"
-        "זה ימחק את:\n"
-        "• כל הנתונים האישיים שלך\n"
-        "• היסטוריית התזונה\n"
-        "• העדפות התפריט\n"
-        "• כל ההגדרות\n\n"
-        "את/ה בטוח/ה שברצונך לאפס הכול?",
-        reply_markup=reply_markup
+        f"שלום {user_name}! 🔄\n\n{_RESET_CONFIRM_MSG}",
+        reply_markup=_RESET_CONFIRM_KB
     )
 
 
@@ -358,7 +706,7 @@ async def handle_reset_confirmation(update: Update, context: ContextTypes.DEFAUL
         
         # אפס גם את הנתונים במסד הנתונים
         user_id = update.effective_user.id
-        reset_user(user_id)
+        await reset_user(user_id)
         
         await query.edit_message_text(
             "✅ אופס! כל הנתונים שלך נמחקו.\n\n"
@@ -381,51 +729,33 @@ async def get_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     if update.message and update.message.text:
         name = update.message.text.strip()
         if not name:
-            try:
-                await update.message.reply_text(
-                    "אנא הזן שם תקין.",
-                    reply_markup=ReplyKeyboardRemove(),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
+            await _safe(update.message.reply_text(
+                "אנא הזן שם תקין.",
+                reply_markup=_REMOVE_KB,
+            ))
             return NAME
 
-        if context.user_data is None:
-            context.user_data = {}
-        logger.info("Name provided: '%s'", name)
+        logger.debug("Name provided: '%s'", name)
         context.user_data["name"] = name
 
         # שמירה למסד נתונים
-        user_id = update.effective_user.id if update.effective_user else None
-        logger.info("About to save user data - user_id: %s, context.user_data keys: %s", user_id, list(context.user_data.keys()) if context.user_data else 'None')
+        user_id = _effective_user_id(update)
+        _log_save(user_id, context.user_data)
         if user_id and context.user_data:
-            nutrition_db.save_user(user_id, context.user_data)
-
-        keyboard = [[KeyboardButton(opt)] for opt in GENDER_OPTIONS]
-        try:
-            await update.message.reply_text(
-                "מה המגדר שלך?",
-                reply_markup=ReplyKeyboardMarkup(
-                    keyboard, one_time_keyboard=True, resize_keyboard=True
-                ),
-                parse_mode="HTML",
-            )
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+            _mark_dirty(user_id, context.user_data)
+        await _safe(update.message.reply_text(
+            "מה המגדר שלך?",
+            reply_markup=_GENDER_KB,
+        ))
         return GENDER
 
     # This is when called from start function - ask for name
     logger.info("get_name called from start - asking for name")
     if update.message:
-        try:
-            await update.message.reply_text(
-                "איך לקרוא לך?",
-                reply_markup=ReplyKeyboardRemove(),
-                parse_mode="HTML",
-            )
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+        await _safe(update.message.reply_text(
+            "איך לקרוא לך?",
+            reply_markup=_REMOVE_KB,
+        ))
     return NAME
 
 
@@ -433,49 +763,36 @@ async def get_gender(
         update: Update,
         context: ContextTypes.DEFAULT_TYPE) -> int:
     """שואל את המשתמש למגדר וממשיך לשאלת גיל."""
-    logger.info(
-        "get_gender called with text: %s",
-        update.message.text if update.message and update.message.text else 'None'
-    )
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "get_gender called with text: %s",
+            update.message.text if update.message and update.message.text else 'None'
+        )
     if update.message and update.message.text:
         gender = update.message.text.strip()
-        logger.info(
+        logger.debug(
             "Gender selected: '%s', valid options: %s", gender, GENDER_OPTIONS)
-        if gender not in GENDER_OPTIONS:
+        if gender not in _GENDER_SET:
             logger.warning("Invalid gender selected: '%s'", gender)
-            keyboard = [[KeyboardButton(opt)] for opt in GENDER_OPTIONS]
-            try:
-                await update.message.reply_text(
-                    "בחר מגדר מהתפריט למטה:",
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
+            await _safe(update.message.reply_text(
+                "בחר מגדר מהתפריט למטה:",
+                reply_markup=_GENDER_KB,
+            ))
             return GENDER
 
-        if context.user_data is None:
-            context.user_data = {}
         context.user_data["gender"] = gender
-        logger.info("Gender saved: %s", gender)
+        logger.debug("Gender saved: %s", gender)
 
         # שמירה למסד נתונים
-        user_id = update.effective_user.id if update.effective_user else None
-        logger.info("About to save user data - user_id: %s, context.user_data keys: %s", user_id, list(context.user_data.keys()) if context.user_data else 'None')
+        user_id = _effective_user_id(update)
+        _log_save(user_id, context.user_data)
         if user_id and context.user_data:
-            nutrition_db.save_user(user_id, context.user_data)
+            _mark_dirty(user_id, context.user_data)
 
-        gender_text = "בת כמה את?" if gender == "נקבה" else "בן כמה אתה?"
-        try:
-            await update.message.reply_text(
-                gender_text,
-                reply_markup=ReplyKeyboardRemove(),
-                parse_mode="HTML",
-            )
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+        await _safe(update.message.reply_text(
+            _prompt(gender, "age_q"),
+            reply_markup=_REMOVE_KB,
+        ))
         return AGE
 
     logger.error("get_gender called without text")
@@ -489,51 +806,32 @@ async def get_age(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         is_valid, age, error_msg = validate_age(age_text)
 
         if not is_valid:
-            try:
-                await update.message.reply_text(
-                    error_msg,
-                    reply_markup=ReplyKeyboardRemove(),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
+            await _safe(update.message.reply_text(
+                error_msg,
+                reply_markup=_REMOVE_KB,
+            ))
             return AGE
 
-        if context.user_data is None:
-            context.user_data = {}
         context.user_data["age"] = age
 
         # שמירה למסד נתונים
-        user_id = update.effective_user.id if update.effective_user else None
-        logger.info("About to save user data - user_id: %s, context.user_data keys: %s", user_id, list(context.user_data.keys()) if context.user_data else 'None')
+        user_id = _effective_user_id(update)
+        _log_save(user_id, context.user_data)
         if user_id and context.user_data:
-            nutrition_db.save_user(user_id, context.user_data)
+            _mark_dirty(user_id, context.user_data)
 
-        gender = context.user_data.get("gender", "זכר")
-        height_text = "מה הגובה שלך בס\"מ?" if gender == "זכר" else "מה הגובה שלך בס\"מ?"
-        try:
-            await update.message.reply_text(
-                height_text,
-                reply_markup=ReplyKeyboardRemove(),
-                parse_mode="HTML",
-            )
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+        height_text = "מה הגובה שלך בס\"מ?"
+        await _safe(update.message.reply_text(
+            height_text,
+            reply_markup=_REMOVE_KB,
+        ))
         return HEIGHT
 
-    if context.user_data is None:
-        context.user_data = {}
-    gender = context.user_data.get("gender", "זכר")
-    age_text = "בת כמה את?" if gender == "נקבה" else "בן כמה אתה?"
     if update.message:
-        try:
-            await update.message.reply_text(
-                age_text,
-                reply_markup=ReplyKeyboardRemove(),
-                parse_mode="HTML",
-            )
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+        await _safe(update.message.reply_text(
+            _prompt(context.user_data.get("gender"), "age_q"),
+            reply_markup=_REMOVE_KB,
+        ))
     return AGE
 
 
@@ -546,51 +844,33 @@ async def get_height(
         is_valid, height, error_msg = validate_height(height_text)
 
         if not is_valid:
-            try:
-                await update.message.reply_text(
-                    error_msg,
-                    reply_markup=ReplyKeyboardRemove(),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
+            await _safe(update.message.reply_text(
+                error_msg,
+                reply_markup=_REMOVE_KB,
+            ))
             return HEIGHT
 
-        if context.user_data is None:
-            context.user_data = {}
         context.user_data["height"] = height
 
         # שמירה למסד נתונים
-        user_id = update.effective_user.id if update.effective_user else None
-        logger.info("About to save user data - user_id: %s, context.user_data keys: %s", user_id, list(context.user_data.keys()) if context.user_data else 'None')
+        user_id = _effective_user_id(update)
+        _log_save(user_id, context.user_data)
         if user_id and context.user_data:
-            nutrition_db.save_user(user_id, context.user_data)
+            _mark_dirty(user_id, context.user_data)
 
-        gender = context.user_data.get("gender", "זכר")
-        weight_text = "מה המשקל שלך בק\"ג?" if gender == "זכר" else "מה המשקל שלך בק\"ג?"
-        try:
-            await update.message.reply_text(
-                weight_text,
-                reply_markup=ReplyKeyboardRemove(),
-                parse_mode="HTML",
-            )
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+        weight_text = "מה המשקל שלך בק\"ג?"
+        await _safe(update.message.reply_text(
+            weight_text,
+            reply_markup=_REMOVE_KB,
+        ))
         return WEIGHT
 
-    if context.user_data is None:
-        context.user_data = {}
-    gender = context.user_data.get("gender", "זכר")
-    height_text = "מה הגובה שלך בס\"מ?" if gender == "זכר" else "מה הגובה שלך בס\"מ?"
+    height_text = "מה הגובה שלך בס\"מ?"
     if update.message:
-        try:
-            await update.message.reply_text(
-                height_text,
-                reply_markup=ReplyKeyboardRemove(),
-                parse_mode="HTML",
-            )
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+        await _safe(update.message.reply_text(
+            height_text,
+            reply_markup=_REMOVE_KB,
+        ))
     return HEIGHT
 
 
@@ -603,60 +883,36 @@ async def get_weight(
         is_valid, weight, error_msg = validate_weight(weight_text)
 
         if not is_valid:
-            try:
-                await update.message.reply_text(
-                    error_msg,
-                    reply_markup=ReplyKeyboardRemove(),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
+            await _safe(update.message.reply_text(
+                error_msg,
+                reply_markup=_REMOVE_KB,
+            ))
             return WEIGHT
 
-        if context.user_data is None:
-            context.user_data = {}
         context.user_data["weight"] = weight
 
         # שמירה למסד נתונים
-        user_id = update.effective_user.id if update.effective_user else None
-        logger.info("About to save user data - user_id: %s, context.user_data keys: %s", user_id, list(context.user_data.keys()) if context.user_data else 'None')
+        user_id = _effective_user_id(update)
+        _log_save(user_id, context.user_data)
         if user_id and context.user_data:
-            nutrition_db.save_user(user_id, context.user_data)
-
-        keyboard = [[KeyboardButton(opt)] for opt in GOAL_OPTIONS]
-        gender = context.user_data.get("gender", "זכר")
-        goal_text = "מה המטרה שלך?" if gender == "זכר" else "מה המטרה שלך?"
-        try:
-            await update.message.reply_text(
-                goal_text,
-                reply_markup=ReplyKeyboardMarkup(
-                    keyboard, one_time_keyboard=True, resize_keyboard=True
-                ),
-                parse_mode="HTML",
-            )
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+            _mark_dirty(user_id, context.user_data)
+        goal_text = "מה המטרה שלך?"
+        await _safe(update.message.reply_text(
+            goal_text,
+            reply_markup=_GOAL_KB,
+        ))
         return GOAL
 
-    if context.user_data is None:
-        context.user_data = {}
-    gender = context.user_data.get("gender", "זכר")
-    weight_text = "מה המשקל שלך בק\"ג?" if gender == "זכר" else "מה המשקל שלך בק\"ג?"
+    weight_text = "מה המשקל שלך בק\"ג?"
     if update.message:
-        try:
-            await update.message.reply_text(
-                weight_text,
-                reply_markup=ReplyKeyboardRemove(),
-                parse_mode="HTML",
-            )
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+        await _safe(update.message.reply_text(
+            weight_text,
+            reply_markup=_REMOVE_KB,
+        ))
     return WEIGHT
 
 
 async def get_goal(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    if context.user_data is None:
-        context.user_data = {}
     if not update.message or not update.message.text:
         return GOAL
     goal = update.message.text.strip()
@@ -676,51 +932,33 @@ async def get_body_fat_current(
         is_valid, body_fat, error_msg = validate_body_fat(body_fat_text)
 
         if not is_valid:
-            try:
-                await update.message.reply_text(
-                    error_msg,
-                    reply_markup=ReplyKeyboardRemove(),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
+            await _safe(update.message.reply_text(
+                error_msg,
+                reply_markup=_REMOVE_KB,
+            ))
             return BODY_FAT_CURRENT
 
-        if context.user_data is None:
-            context.user_data = {}
         context.user_data["body_fat_current"] = body_fat
 
         # שמירה למסד נתונים
-        user_id = update.effective_user.id if update.effective_user else None
-        logger.info("About to save user data - user_id: %s, context.user_data keys: %s", user_id, list(context.user_data.keys()) if context.user_data else 'None')
+        user_id = _effective_user_id(update)
+        _log_save(user_id, context.user_data)
         if user_id:
-            nutrition_db.save_user(user_id, context.user_data)
+            _mark_dirty(user_id, context.user_data)
 
-        gender = context.user_data.get(
-            "gender", "זכר") if context.user_data else "זכר"
-        target_text = "מה אחוז השומן היעד שלך?" if gender == "זכר" else "מה אחוז השומן היעד שלך?"
-        try:
-            await update.message.reply_text(
-                target_text,
-                reply_markup=ReplyKeyboardRemove(),
-                parse_mode="HTML",
-            )
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+        target_text = "מה אחוז השומן היעד שלך?"
+        await _safe(update.message.reply_text(
+            target_text,
+            reply_markup=_REMOVE_KB,
+        ))
         return BODY_FAT_TARGET_GOAL
     else:
-        gender = context.user_data.get(
-            "gender", "זכר") if context.user_data else "זכר"
-        body_fat_text = "מה אחוז השומן הנוכחי שלך?" if gender == "זכר" else "מה אחוז השומן הנוכחי שלך?"
+        body_fat_text = "מה אחוז השומן הנוכחי שלך?"
         if update.message:
-            try:
-                await update.message.reply_text(
-                    body_fat_text,
-                    reply_markup=ReplyKeyboardRemove(),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
+            await _safe(update.message.reply_text(
+                body_fat_text,
+                reply_markup=_REMOVE_KB,
+            ))
         return BODY_FAT_CURRENT
 
 
@@ -733,54 +971,37 @@ async def get_body_fat_target_goal(
         is_valid, target_fat, error_msg = validate_body_fat(target_text)
 
         if not is_valid:
-            try:
-                await update.message.reply_text(
-                    error_msg,
-                    reply_markup=ReplyKeyboardRemove(),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
+            await _safe(update.message.reply_text(
+                error_msg,
+                reply_markup=_REMOVE_KB,
+            ))
             return BODY_FAT_TARGET_GOAL
 
         current_fat = context.user_data.get("body_fat_current", 0) if context.user_data else 0
         if target_fat >= current_fat:
-            try:
-                await update.message.reply_text(
-                    "אחוז השומן היעד חייב להיות נמוך מהנוכחי כדי לרדת באחוזי שומן.",
-                    reply_markup=ReplyKeyboardRemove(),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
+            await _safe(update.message.reply_text(
+                "אחוז השומן היעד חייב להיות נמוך מהנוכחי כדי לרדת באחוזי שומן.",
+                reply_markup=_REMOVE_KB,
+            ))
             return BODY_FAT_TARGET_GOAL
 
-        if context.user_data is None:
-            context.user_data = {}
         context.user_data["body_fat_target"] = target_fat
 
         # שמירה למסד נתונים
-        user_id = update.effective_user.id if update.effective_user else None
-        logger.info("About to save user data - user_id: %s, context.user_data keys: %s", user_id, list(context.user_data.keys()) if context.user_data else 'None')
+        user_id = _effective_user_id(update)
+        _log_save(user_id, context.user_data)
         if user_id and context.user_data:
-            nutrition_db.save_user(user_id, context.user_data)
+            _mark_dirty(user_id, context.user_data)
 
         # המשך לשאלת פעילות
         return await get_activity(update, context)
     else:
-        if context.user_data is None:
-            context.user_data = {}
-        gender = context.user_data.get("gender", "זכר")
-        target_text = "מה אחוז השומן היעד שלך?" if gender == "זכר" else "מה אחוז השומן היעד שלך?"
+        target_text = "מה אחוז השומן היעד שלך?"
         if update.message:
-            try:
-                await update.message.reply_text(
-                    target_text,
-                    reply_markup=ReplyKeyboardRemove(),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
+            await _safe(update.message.reply_text(
+                target_text,
+                reply_markup=_REMOVE_KB,
+            ))
         return BODY_FAT_TARGET_GOAL
 
 
@@ -790,299 +1011,88 @@ async def get_activity(
     """שואל את המשתמש על פעילות גופנית וממשיך לשאלות המתאימות."""
     if update.message and update.message.text:
         activity_answer = update.message.text.strip()
-        if activity_answer not in ACTIVITY_YES_NO_OPTIONS:
-            keyboard = [[KeyboardButton(opt)]
-                        for opt in ACTIVITY_YES_NO_OPTIONS]
-            if context.user_data is None:
-                context.user_data = {}
-            gender = context.user_data.get("gender", "זכר")
-            if gender == "נקבה":
-                error_text = gendered_text(
-                    "האם אתה עושה פעילות גופנית? (בחר כן או לא מהתפריט למטה)",
-                    "האם את עושה פעילות גופנית? (בחרי כן או לא מהתפריט למטה)",
-                    context)
-            elif gender == "זכר":
-                error_text = gendered_text(
-                    "האם אתה עושה פעילות גופנית? (בחר כן או לא מהתפריט למטה)",
-                    "האם את עושה פעילות גופנית? (בחרי כן או לא מהתפריט למטה)",
-                    context)
-            else:
-                error_text = gendered_text(
-                    "האם אתה עושה פעילות גופנית? (בחר כן או לא מהתפריט למטה)",
-                    "האם את עושה פעילות גופנית? (בחרי כן או לא מהתפריט למטה)",
-                    context)
-            try:
-                await update.message.reply_text(
-                    error_text,
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
+        if activity_answer not in _ACTIVITY_YES_NO_SET:
+            error_text = _prompt(context.user_data.get("gender"), "does_activity_invalid")
+            await _safe(update.message.reply_text(
+                error_text,
+                reply_markup=_ACTIVITY_YES_NO_KB,
+            ))
             return ACTIVITY
         
-        if context.user_data is None:
-            context.user_data = {}
         context.user_data["does_activity"] = activity_answer
 
         # שמירה למסד נתונים
-        user_id = update.effective_user.id if update.effective_user else None
-        logger.info("About to save user data - user_id: %s, context.user_data keys: %s", user_id, list(context.user_data.keys()) if context.user_data else 'None')
+        user_id = _effective_user_id(update)
+        _log_save(user_id, context.user_data)
         if user_id and context.user_data:
-            nutrition_db.save_user(user_id, context.user_data)
+            _mark_dirty(user_id, context.user_data)
 
         if activity_answer == "לא":
             # Skip to diet questions
-            keyboard = [[KeyboardButton(opt)] for opt in DIET_OPTIONS]
-            gender = context.user_data.get("gender", "זכר")
-            if gender == "נקבה":
-                diet_text = gendered_text(
-                    "מה העדפות התזונה שלך? (בחרי כל מה שמתאים)",
-                    "מה העדפות התזונה שלך? (בחרי כל מה שמתאים)",
-                    context)
-            elif gender == "זכר":
-                diet_text = gendered_text(
-                    "מה העדפות התזונה שלך? (בחרי כל מה שמתאים)",
-                    "מה העדפות התזונה שלך? (בחרי כל מה שמתאים)",
-                    context)
-            else:
-                diet_text = gendered_text(
-                    "מה העדפות התזונה שלך? (בחרי כל מה שמתאים)",
-                    "מה העדפות התזונה שלך? (בחרי כל מה שמתאים)",
-                    context)
-            try:
-                await update.message.reply_text(
-                    diet_text,
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
-            return DIET
+            return await _ask_diet(update, context)
         # אם כן - הצג תפריט בחירת סוגי פעילות
         keyboard = build_activity_types_keyboard()
-        gender = context.user_data.get("gender", "זכר")
-        if gender == "נקבה":
-            activity_text = gendered_text(
-                "איזה סוגי פעילות אתה עושה? (בחרי כל מה שמתאים)",
-                "איזה סוגי פעילות את עושה? (בחרי כל מה שמתאים)",
-                context)
-        elif gender == "זכר":
-            activity_text = gendered_text(
-                "איזה סוגי פעילות אתה עושה? (בחרי כל מה שמתאים)",
-                "איזה סוגי פעילות את עושה? (בחרי כל מה שמתאים)",
-                context)
-        else:
-            activity_text = gendered_text(
-                "איזה סוגי פעילות אתה עושה? (בחרי כל מה שמתאים)",
-                "איזה סוגי פעילות את עושה? (בחרי כל מה שמתאים)",
-                context)
-        
-        try:
-            await update.message.reply_text(
-                activity_text,
-                reply_markup=keyboard,
-                parse_mode="HTML",
-            )
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+        activity_text = _prompt(context.user_data.get("gender"), "activity_types")
+        await _safe(update.message.reply_text(
+            activity_text,
+            reply_markup=keyboard,
+        ))
         return ACTIVITY_TYPES_SELECTION
     # אם אין הודעה, הצג את השאלה
     if update.message:
-        keyboard = [[KeyboardButton(opt)] for opt in ACTIVITY_YES_NO_OPTIONS]
-        if context.user_data is None:
-            context.user_data = {}
-        gender = context.user_data.get("gender", "זכר")
-        if gender == "נקבה":
-            activity_text = gendered_text(
-                "האם את עושה פעילות גופנית? (בחרי כן או לא)",
-                "האם את עושה פעילות גופנית? (בחרי כן או לא)",
-                context)
-        elif gender == "זכר":
-            activity_text = gendered_text(
-                "האם אתה עושה פעילות גופנית? (בחרי כן או לא)",
-                "האם את עושה פעילות גופנית? (בחרי כן או לא)",
-                context)
-        else:
-            activity_text = gendered_text(
-                "האם אתה עושה פעילות גופנית? (בחרי כן או לא)",
-                "האם את עושה פעילות גופנית? (בחרי כן או לא)",
-                context)
-        try:
-            await update.message.reply_text(
-                activity_text,
-                reply_markup=ReplyKeyboardMarkup(
-                    keyboard, one_time_keyboard=True, resize_keyboard=True
-                ),
-                parse_mode="HTML",
-            )
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+        activity_text = _prompt(context.user_data.get("gender"), "does_activity")
+        await _safe(update.message.reply_text(
+            activity_text,
+            reply_markup=_ACTIVITY_YES_NO_KB,
+        ))
     return ACTIVITY
 
 
+# סוגי פעילות שאין עליהם שאלות המשך - ממשיכים ישר לשאלת התזונה
+_ACTIVITY_TYPES_TO_DIET = frozenset(("אין פעילות", "הליכה קלה"))
+# ניתוב לפי סוג פעילות: (מקלדת, מזהה טקסט ב-_PROMPTS, המצב הבא בשיחה)
+_ACTIVITY_TYPE_ROUTES = {
+    "הליכה מהירה / ריצה קלה": (_ACTIVITY_FREQUENCY_KB, "activity_frequency", ACTIVITY_FREQUENCY),
+    "אימוני כוח": (_ACTIVITY_FREQUENCY_KB, "training_frequency", ACTIVITY_FREQUENCY),
+    "אימוני HIIT / קרוספיט": (_ACTIVITY_FREQUENCY_KB, "training_frequency", ACTIVITY_FREQUENCY),
+    "יוגה / פילאטיס": (_ACTIVITY_FREQUENCY_KB, "training_frequency", ACTIVITY_FREQUENCY),
+    "שילוב של כמה סוגים": (_MIXED_ACTIVITY_KB, "mixed_activities", MIXED_ACTIVITIES),
+}
+
+
 async def get_activity_type(update: Update,
                             context: ContextTypes.DEFAULT_TYPE) -> int:
     """שואל את המשתמש לסוג הפעילות וממשיך לשאלות המתאימות."""
     if update.message and update.message.text:
-        activity_type = update.message.text.strip()
-        if activity_type not in ACTIVITY_TYPE_OPTIONS:
-            keyboard = [[KeyboardButton(opt)] for opt in ACTIVITY_TYPE_OPTIONS]
-            if context.user_data is None:
-                context.user_data = {}
-            gender = context.user_data.get("gender", "זכר")
-            error_text = "בחר סוג פעילות מהתפריט למטה:" if gender == "זכר" else "בחרי סוג פעילות מהתפריט למטה:"
-            try:
-                await update.message.reply_text(
-                    error_text,
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
+        gender = context.user_data.get("gender", "זכר")
+        activity_type = _fast_strip(update.message.text)
+        if activity_type not in _ACTIVITY_TYPE_SET:
+            error_text = _prompt(gender, "activity_type_invalid")
+            await _safe(update.message.reply_text(
+                error_text,
+                reply_markup=_ACTIVITY_TYPE_KB,
+                parse_mode="HTML",
+            ))
             return ACTIVITY_TYPE
 
-        if context.user_data is None:
-            context.user_data = {}
         context.user_data["activity_type"] = activity_type
+        context.user_data.pop("_mixed_rendered", None)
 
         # Route to appropriate next question based on activity type
-        if activity_type in ["אין פעילות", "הליכה קלה"]:
+        if activity_type in _ACTIVITY_TYPES_TO_DIET:
             # Skip to diet questions
-            keyboard = [[KeyboardButton(opt)] for opt in DIET_OPTIONS]
-            gender = context.user_data.get("gender", "זכר")
-            if gender == "נקבה":
-                diet_text = gendered_text(
-                    "מה העדפות התזונה שלך? (בחרי כל מה שמתאים)",
-                    "מה העדפות התזונה שלך? (בחרי כל מה שמתאים)",
-                    context)
-            elif gender == "זכר":
-                diet_text = gendered_text(
-                    "מה העדפות התזונה שלך? (בחרי כל מה שמתאים)",
-                    "מה העדפות התזונה שלך? (בחרי כל מה שמתאים)",
-                    context)
-            else:
-                diet_text = gendered_text(
-                    "מה העדפות התזונה שלך? (בחר כל מה שמתאים)",
-                    "מה העדפות התזונה שלך? (בחרי כל מה שמתאים)",
-                    context)
-            try:
-                await update.message.reply_text(
-                    diet_text,
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
-            return DIET
-
-        elif activity_type == "הליכה מהירה / ריצה קלה":
-            # Ask frequency with gender-appropriate text
-            keyboard = [[KeyboardButton(opt)]
-                        for opt in ACTIVITY_FREQUENCY_OPTIONS]
-            gender = context.user_data.get("gender", "זכר")
-            if gender == "נקבה":
-                frequency_text = "כמה פעמים בשבוע את מבצעת את הפעילות?"
-            elif gender == "זכר":
-                frequency_text = "כמה פעמים בשבוע אתה מבצע את הפעילות?"
-            else:
-                frequency_text = gendered_text("כמה פעמים בשבוע אתה מבצע את הפעילות?", "כמה פעמים בשבוע את מבצעת את הפעילות?", context)
-            try:
-                await update.message.reply_text(
-                    frequency_text,
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
-            return ACTIVITY_FREQUENCY
-
-        elif activity_type in ["אימוני כוח", "אימוני HIIT / קרוספיט"]:
-            # Ask frequency with gender-appropriate text
-            keyboard = [[KeyboardButton(opt)]
-                        for opt in ACTIVITY_FREQUENCY_OPTIONS]
-            gender = context.user_data.get("gender", "זכר")
-            if gender == "נקבה":
-                frequency_text = "כמה פעמים בשבוע את מתאמנת?"
-            elif gender == "זכר":
-                frequency_text = "כמה פעמים בשבוע אתה מתאמן?"
-            else:
-                frequency_text = gendered_text("כמה פעמים בשבוע אתה מתאמן?", "כמה פעמים בשבוע את מתאמנת?", context)
-            try:
-                await update.message.reply_text(
-                    frequency_text,
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
-            return ACTIVITY_FREQUENCY
-
-        elif activity_type == "יוגה / פילאטיס":
-            # Ask frequency with gender-appropriate text
-            keyboard = [[KeyboardButton(opt)]
-                        for opt in ACTIVITY_FREQUENCY_OPTIONS]
-            gender = context.user_data.get("gender", "זכר")
-            if gender == "נקבה":
-                frequency_text = "כמה פעמים בשבוע את מתאמנת?"
-            elif gender == "זכר":
-                frequency_text = "כמה פעמים בשבוע אתה מתאמן?"
-            else:
-                frequency_text = gendered_text("כמה פעמים בשבוע אתה מתאמן?", "כמה פעמים בשבוע את מתאמנת?", context)
-            try:
-                await update.message.reply_text(
-                    frequency_text,
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
-            return ACTIVITY_FREQUENCY
-
-        elif activity_type == "שילוב של כמה סוגים":
-            # Ask for mixed activities
-            keyboard = [[KeyboardButton(opt)]
-                        for opt in MIXED_ACTIVITY_OPTIONS]
-            gender = context.user_data.get("gender", "זכר")
-            if gender == "נקבה":
-                mixed_text = (
-                    "אילו סוגי אימונים את מבצעת במהלך השבוע? (בחרי כל מה שמתאים)"
-                )
-            elif gender == "זכר":
-                mixed_text = (
-                    "אילו סוגי אימונים אתה מבצע במהלך השבוע? (בחר כל מה שמתאים)"
-                )
-            else:
-                mixed_text = gendered_text(
-                    "אילו סוגי אימונים אתה מבצע במהלך השבוע? (בחר כל מה שמתאים)",
-                    "אילו סוגי אימונים את מבצעת במהלך השבוע? (בחרי כל מה שמתאים)",
-                    context
-                )
-            try:
-                await update.message.reply_text(
-                    mixed_text,
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
-            return MIXED_ACTIVITIES
+            return await _ask_diet(update, context)
+
+        route = _ACTIVITY_TYPE_ROUTES.get(activity_type)
+        if route is not None:
+            # שאלת ההמשך לפי טבלת הניתוב: מקלדת, טקסט מגדרי ומצב הבא
+            reply_markup, prompt_id, next_state = route
+            await _safe(update.message.reply_text(
+                _prompt(gender, prompt_id),
+                reply_markup=reply_markup,
+                parse_mode="HTML",
+            ))
+            return next_state
 
         return DIET
     return ACTIVITY_TYPE
@@ -1093,37 +1103,28 @@ async def get_activity_frequency(
 ) -> int:
     """שואל את המשתמש לתדירות הפעילות וממשיך לשאלה הבאה."""
     if update.message and update.message.text:
-        frequency = update.message.text.strip()
-        if frequency not in ACTIVITY_FREQUENCY_OPTIONS:
-            keyboard = [[KeyboardButton(opt)]
-                        for opt in ACTIVITY_FREQUENCY_OPTIONS]
-            try:
-                await update.message.reply_text(
-                    gendered_text("בחר תדירות מהתפריט למטה:", "בחרי תדירות מהתפריט למטה:", context),
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
+        frequency = _fast_strip(update.message.text)
+        if frequency not in _ACTIVITY_FREQUENCY_SET:
+            await _safe(update.message.reply_text(
+                _prompt(context.user_data.get("gender"), "pick_frequency"),
+                reply_markup=_ACTIVITY_FREQUENCY_KB,
+                parse_mode="HTML",
+            ))
             return ACTIVITY_FREQUENCY
 
         # שמור את המידע הספציפי לסוג הפעילות הנוכחי
-        if context.user_data is None:
-            context.user_data = {}
         
-        current_activity = context.user_data.get("current_activity", "")
+        ud = context.user_data
+        current_activity = ud.get("current_activity", "")
         if current_activity:
             # אתחל את activity_details אם לא קיים
-            if "activity_details" not in context.user_data:
-                context.user_data["activity_details"] = {}
+            activity_details = ud.setdefault("activity_details", {})
             
             # הסר אימוג'ים מהטקסט לצורך שמירה
-            activity_clean = current_activity.replace("🏃", "").replace("🚶", "").replace("🚴", "").replace("🏊", "").replace("🏋️", "").replace("🧘", "").replace("🤸", "").replace("❓", "").strip()
+            activity_clean = current_activity.translate(_EMOJI_STRIP_TABLE).strip()
             
             # שמור את התדירות לסוג הפעילות הנוכחי
-            context.user_data["activity_details"][activity_clean] = {
+            activity_details[activity_clean] = {
                 "frequency": frequency
             }
 
@@ -1132,75 +1133,43 @@ async def get_activity_frequency(
     return ACTIVITY_FREQUENCY
 
 
+# השאלה שאחרי משך הפעילות לפי סוג הפעילות: (מקלדת, מזהה טקסט, המצב הבא)
+_ACTIVITY_DURATION_ROUTES = {
+    "הליכה מהירה / ריצה קלה": (_CARDIO_GOAL_KB, "cardio_goal", CARDIO_GOAL),
+    "אימוני כוח": (_TRAINING_TIME_KB, "training_time", TRAINING_TIME),
+    "אימוני HIIT / קרוספיט": (_TRAINING_TIME_KB, "training_time", TRAINING_TIME),
+    # יוגה / פילאטיס - שאלת "פעילות יחידה" וממשיכים לשאלות התזונה
+    "יוגה / פילאטיס": (_YES_NO_KB, "only_activity", DIET),
+}
+
+
 async def get_activity_duration(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> int:
     """שואל את המשתמש למשך הפעילות וממשיך לשאלה הבאה."""
     if update.message and update.message.text:
-        duration = update.message.text.strip()
-        if duration not in ACTIVITY_DURATION_OPTIONS:
-            keyboard = [[KeyboardButton(opt)]
-                        for opt in ACTIVITY_DURATION_OPTIONS]
-            try:
-                await update.message.reply_text(
-                    gendered_text("בחר משך מהתפריט למטה:", "בחרי משך מהתפריט למטה:", context),
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
+        duration = _fast_strip(update.message.text)
+        if duration not in _ACTIVITY_DURATION_SET:
+            await _safe(update.message.reply_text(
+                _prompt(context.user_data.get("gender"), "pick_duration"),
+                reply_markup=_ACTIVITY_DURATION_KB,
+                parse_mode="HTML",
+            ))
             return ACTIVITY_DURATION
 
         context.user_data["activity_duration"] = duration
-        activity_type = context.user_data.get("activity_type", "") if context.user_data else ""
+        activity_type = context.user_data.get("activity_type", "")
 
         # Route based on activity type
-        if activity_type == "הליכה מהירה / ריצה קלה":
-            # Ask cardio goal
-            keyboard = [[KeyboardButton(opt)] for opt in CARDIO_GOAL_OPTIONS]
-            try:
-                await update.message.reply_text(
-                    "מה מטרת הפעילות?",
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
-            return CARDIO_GOAL
-
-        elif activity_type in ["אימוני כוח", "אימוני HIIT / קרוספיט"]:
-            # Ask training time
-            keyboard = [[KeyboardButton(opt)] for opt in TRAINING_TIME_OPTIONS]
-            try:
-                await update.message.reply_text(
-                    gendered_text("באיזה שעה בדרך כלל את/ה מתאמן/ת?", "באיזה שעה בדרך כלל את מתאמנת?", context),
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
-            return TRAINING_TIME
-
-        elif activity_type == "יוגה / פילאטיס":
-            # Ask if this is the only activity
-            keyboard = [[KeyboardButton("כן"), KeyboardButton("לא")]]
-            try:
-                await update.message.reply_text(
-                    "האם זו הפעילות היחידה שלך?",
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
-            return DIET  # Continue to diet questions
+        route = _ACTIVITY_DURATION_ROUTES.get(activity_type)
+        if route:
+            reply_markup, prompt_id, next_state = route
+            await _safe(update.message.reply_text(
+                _prompt(context.user_data.get("gender"), prompt_id),
+                reply_markup=reply_markup,
+                parse_mode="HTML",
+            ))
+            return next_state
 
         return DIET
     return DIET
@@ -1210,37 +1179,23 @@ async def get_training_time(update: Update,
                             context: ContextTypes.DEFAULT_TYPE) -> int:
     """שואל את המשתמש לשעת האימון וממשיך לשאלה הבאה."""
     if update.message and update.message.text:
-        training_time = update.message.text.strip()
-        if training_time not in TRAINING_TIME_OPTIONS:
-            keyboard = [[KeyboardButton(opt)] for opt in TRAINING_TIME_OPTIONS]
-            try:
-                await update.message.reply_text(
-                    gendered_text("בחר שעה מהתפריט למטה:", "בחרי שעה מהתפריט למטה:", context),
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
+        training_time = _fast_strip(update.message.text)
+        if training_time not in _TRAINING_TIME_SET:
+            await _safe(update.message.reply_text(
+                _prompt(context.user_data.get("gender"), "pick_time"),
+                reply_markup=_TRAINING_TIME_KB,
+                parse_mode="HTML",
+            ))
             return TRAINING_TIME
 
-        if context.user_data is None:
-            context.user_data = {}
         context.user_data["training_time"] = training_time
 
         # Ask strength goal
-        keyboard = [[KeyboardButton(opt)] for opt in STRENGTH_GOAL_OPTIONS]
-        try:
-            await update.message.reply_text(
-                "מה המטרה?",
-                reply_markup=ReplyKeyboardMarkup(
-                    keyboard, one_time_keyboard=True, resize_keyboard=True
-                ),
-                parse_mode="HTML",
-            )
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+        await _safe(update.message.reply_text(
+            "מה המטרה?",
+            reply_markup=_STRENGTH_GOAL_KB,
+            parse_mode="HTML",
+        ))
         return STRENGTH_GOAL
     return TRAINING_TIME
 
@@ -1250,23 +1205,15 @@ async def get_cardio_goal(
         context: ContextTypes.DEFAULT_TYPE) -> int:
     """שואל את המשתמש למטרת הפעילות האירובית וממשיך לתזונה."""
     if update.message and update.message.text:
-        goal = update.message.text.strip()
-        if goal not in CARDIO_GOAL_OPTIONS:
-            keyboard = [[KeyboardButton(opt)] for opt in CARDIO_GOAL_OPTIONS]
-            try:
-                await update.message.reply_text(
-                    gendered_text("בחר מטרה מהתפריט למטה:", "בחרי מטרה מהתפריט למטה:", context),
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
+        goal = _fast_strip(update.message.text)
+        if goal not in _CARDIO_GOAL_SET:
+            await _safe(update.message.reply_text(
+                _prompt(context.user_data.get("gender"), "pick_goal"),
+                reply_markup=_CARDIO_GOAL_KB,
+                parse_mode="HTML",
+            ))
             return CARDIO_GOAL
 
-        if context.user_data is None:
-            context.user_data = {}
         context.user_data["cardio_goal"] = goal
 
         # Continue to next activity or diet
@@ -1278,23 +1225,15 @@ async def get_strength_goal(update: Update,
                             context: ContextTypes.DEFAULT_TYPE) -> int:
     """שואל את המשתמש למטרת האימון וממשיך לשאלת תוספים."""
     if update.message and update.message.text:
-        goal = update.message.text.strip()
-        if goal not in STRENGTH_GOAL_OPTIONS:
-            keyboard = [[KeyboardButton(opt)] for opt in STRENGTH_GOAL_OPTIONS]
-            try:
-                await update.message.reply_text(
-                    gendered_text("בחר מטרה מהתפריט למטה:", "בחרי מטרה מהתפריט למטה:", context),
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
+        goal = _fast_strip(update.message.text)
+        if goal not in _STRENGTH_GOAL_SET:
+            await _safe(update.message.reply_text(
+                _prompt(context.user_data.get("gender"), "pick_goal"),
+                reply_markup=_STRENGTH_GOAL_KB,
+                parse_mode="HTML",
+            ))
             return STRENGTH_GOAL
 
-        if context.user_data is None:
-            context.user_data = {}
         context.user_data["strength_goal"] = goal
 
         # Continue to next activity or diet
@@ -1307,38 +1246,24 @@ async def get_supplements(
         context: ContextTypes.DEFAULT_TYPE) -> int:
     """שואל את המשתמש על תוספי תזונה וממשיך לשאלה הבאה."""
     if update.message and update.message.text:
-        choice = update.message.text.strip()
-        if choice not in ["כן", "לא"]:
-            keyboard = [[KeyboardButton("כן"), KeyboardButton("לא")]]
-            try:
-                await update.message.reply_text(
-                    gendered_text("בחר כן או לא:", "בחרי כן או לא:", context),
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
+        choice = _fast_strip(update.message.text)
+        if choice not in _YES_NO_SET:
+            await _safe(update.message.reply_text(
+                _prompt(context.user_data.get("gender"), "pick_yes_no"),
+                reply_markup=_YES_NO_KB,
+                parse_mode="HTML",
+            ))
             return SUPPLEMENTS
 
-        if context.user_data is None:
-            context.user_data = {}
         context.user_data["takes_supplements"] = choice == "כן"
 
         if choice == "כן":
             # Ask for supplement types
-            keyboard = [[KeyboardButton(opt)] for opt in SUPPLEMENT_OPTIONS]
-            try:
-                await update.message.reply_text(
-                    "איזה תוספים את/ה לוקח/ת? (בחר/י כל מה שמתאים)",
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
+            await _safe(update.message.reply_text(
+                "איזה תוספים את/ה לוקח/ת? (בחר/י כל מה שמתאים)",
+                reply_markup=_SUPPLEMENT_KB,
+                parse_mode="HTML",
+            ))
             return SUPPLEMENT_TYPES
         else:
             # Continue to next activity or diet
@@ -1351,16 +1276,12 @@ async def get_supplement_types(
 ) -> int:
     """שואל את המשתמש לסוגי התוספים וממשיך לשאלת מגבלות."""
     if update.message and update.message.text:
-        supplements_text = update.message.text.strip()
+        supplements_text = _fast_strip(update.message.text)
 
-        # Parse selected supplements
-        selected_supplements = []
-        for option in SUPPLEMENT_OPTIONS:
-            if option in supplements_text:
-                selected_supplements.append(option)
+        # פירוק ההודעה פעם אחת לטוקנים והצלבה מול סט התוספים
+        tokens = _SUPPLEMENT_SET.intersection(_SELECTION_SPLIT_RE.split(supplements_text))
+        selected_supplements = [opt for opt in SUPPLEMENT_OPTIONS if opt in tokens]
 
-        if context.user_data is None:
-            context.user_data = {}
         context.user_data["supplements"] = selected_supplements
 
         # Continue to next activity or diet
@@ -1373,9 +1294,7 @@ async def get_limitations(
         context: ContextTypes.DEFAULT_TYPE) -> int:
     """שואל את המשתמש על מגבלות וממשיך לתזונה."""
     if update.message and update.message.text:
-        limitations = update.message.text.strip()
-        if context.user_data is None:
-            context.user_data = {}
+        limitations = _fast_strip(update.message.text)
         if limitations.lower() in ["אין", "לא", "ללא"]:
             context.user_data["limitations"] = "אין"
         else:
@@ -1387,466 +1306,307 @@ async def get_limitations(
 
 
 def clean_text(val):
-    return val.replace("🏊", "").replace("🏃", "").replace("🚶", "").replace("🚴", "").replace("🏋️", "").replace("🧘", "").replace("🤸", "").replace("❓", "").replace(" ", "").replace("\u200e", "").strip()
+    return val.translate(_CLEAN_TEXT_TABLE).strip()
+
+
+# מיפוי טקסט מנוקה -> אפשרות מקורית, ומפתחות מנוקים של כפתורי המשך/אין
+_MIXED_OPTIONS_BY_CLEAN = {clean_text(opt): opt for opt in MIXED_ACTIVITY_OPTIONS}
+_MIXED_CONTINUE_CLEAN = clean_text("המשך")
+_MIXED_NONE_CLEAN = clean_text("אין")
 
 
 async def get_mixed_activities(
         update: Update,
         context: ContextTypes.DEFAULT_TYPE) -> int:
-    if context.user_data is None:
-        context.user_data = {}
-    if "mixed_activities_selected" not in context.user_data:
-        context.user_data["mixed_activities_selected"] = set()
-    selected = context.user_data["mixed_activities_selected"]
+    ud = context.user_data
+    selected = ud.setdefault("mixed_activities_selected", set())
     if update.message and update.message.text:
-        text = update.message.text.strip().replace(" ❌", "")
+        text = _fast_strip(update.message.text)
+        if " ❌" in text:
+            text = text.replace(" ❌", "")
         cleaned_text = clean_text(text)
-        cleaned_options = {clean_text(opt): opt for opt in MIXED_ACTIVITY_OPTIONS}
-        if cleaned_text == clean_text("המשך"):
+        if cleaned_text == _MIXED_CONTINUE_CLEAN:
             if not selected:
                 if update.message:
-                    try:
-                        await update.message.reply_text(
-                            gendered_text("אנא בחר לפחות סוג פעילות אחד לפני ההמשך.", "אנא בחרי לפחות סוג פעילות אחד לפני ההמשך.", context),
-                            reply_markup=ReplyKeyboardMarkup(build_mixed_activities_keyboard(selected), resize_keyboard=True),
-                        )
-                    except Exception as e:
-                        logger.error("Telegram API error in reply_text: %s", e)
+                    await _safe(update.message.reply_text(
+                        _prompt(context.user_data.get("gender"), "mixed_min_one"),
+                        reply_markup=build_mixed_activities_keyboard(selected),
+                    ))
                 return MIXED_ACTIVITIES
-            context.user_data["mixed_activities"] = list(selected)
-            del context.user_data["mixed_activities_selected"]
+            ud["mixed_activities"] = list(selected)
+            del ud["mixed_activities_selected"]
+            ud.pop("_mixed_rendered", None)
             return await get_mixed_frequency(update, context)
-        elif cleaned_text in cleaned_options:
-            real_option = cleaned_options[cleaned_text]
+        elif cleaned_text in _MIXED_OPTIONS_BY_CLEAN:
+            real_option = _MIXED_OPTIONS_BY_CLEAN[cleaned_text]
             if real_option in selected:
                 selected.remove(real_option)
             else:
                 selected.add(real_option)
-        elif cleaned_text == clean_text("אין"):
+        elif cleaned_text == _MIXED_NONE_CLEAN:
             selected.clear()
             selected.add("אין")
     if update.message:
-        try:
-            await update.message.reply_text(
-                gendered_text("בחר את סוגי הפעילות הגופנית שלך (לחיצה נוספת מבטלת בחירה):", "בחרי את סוגי הפעילות הגופנית שלך (לחיצה נוספת מבטלת בחירה):", context),
-                reply_markup=ReplyKeyboardMarkup(build_mixed_activities_keyboard(selected), resize_keyboard=True),
-            )
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+        # אם המקלדת שמוצגת כבר משקפת את הבחירה הנוכחית (למשל קלט לא מזוהה),
+        # שולחים רק את ההנחיה בלי לבנות ולשלוח שוב את המקלדת
+        signature = frozenset(selected)
+        if ud.get("_mixed_rendered") == signature:
+            reply_markup = None
+        else:
+            reply_markup = build_mixed_activities_keyboard(selected)
+            ud["_mixed_rendered"] = signature
+        await _safe(update.message.reply_text(
+            _prompt(context.user_data.get("gender"), "mixed_toggle"),
+            reply_markup=reply_markup,
+        ))
     return MIXED_ACTIVITIES
 
 
 async def get_mixed_frequency(
         update: Update,
         context: ContextTypes.DEFAULT_TYPE) -> int:
-    if context.user_data is None:
-        context.user_data = {}
     if update.message and update.message.text:
-        text = update.message.text.strip()
-        if text in MIXED_FREQUENCY_OPTIONS:
+        text = _fast_strip(update.message.text)
+        if text in _MIXED_FREQUENCY_SET:
             context.user_data["mixed_frequency"] = text
-            keyboard = [[KeyboardButton(opt)] for opt in MIXED_DURATION_OPTIONS]
             if update.message:
-                try:
-                    await update.message.reply_text(
-                        "כמה זמן נמשך כל אימון בממוצע?",
-                        reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True),
-                    )
-                except Exception as e:
-                    logger.error("Telegram API error in reply_text: %s", e)
+                await _safe(update.message.reply_text(
+                    "כמה זמן נמשך כל אימון בממוצע?",
+                    reply_markup=_MIXED_DURATION_KB,
+                ))
             return MIXED_DURATION
-    keyboard = [[KeyboardButton(opt)] for opt in MIXED_FREQUENCY_OPTIONS]
     if update.message:
-        try:
-            await update.message.reply_text(
-                "כמה פעמים בשבוע את/ה מתאמן/ת?",
-                reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True),
-            )
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+        await _safe(update.message.reply_text(
+            "כמה פעמים בשבוע את/ה מתאמן/ת?",
+            reply_markup=_MIXED_FREQUENCY_KB,
+        ))
     return MIXED_FREQUENCY
 
 
 async def get_mixed_duration(
         update: Update,
         context: ContextTypes.DEFAULT_TYPE) -> int:
-    if context.user_data is None:
-        context.user_data = {}
+    ud = context.user_data
     if update.message and update.message.text:
-        text = update.message.text.strip()
-        if text in MIXED_DURATION_OPTIONS:
-            context.user_data["mixed_duration"] = text
-            frequency = context.user_data.get("mixed_frequency", "")
-            duration = context.user_data.get("mixed_duration", "")
-            activities = context.user_data.get("mixed_activities", [])
-            activity_summary = f"שילוב: {', '.join(activities)}, {frequency}, {duration}"
-            context.user_data["activity"] = activity_summary
+        text = _fast_strip(update.message.text)
+        if text in _MIXED_DURATION_SET:
+            ud["mixed_duration"] = text
+            activities = ud.get("mixed_activities", [])
+            activity_summary = f"שילוב: {', '.join(activities)}, {ud.get('mixed_frequency', '')}, {text}"
+            ud["activity"] = activity_summary
             return await get_mixed_menu_adaptation(update, context)
-    keyboard = [[KeyboardButton(opt)] for opt in MIXED_DURATION_OPTIONS]
     if update.message:
-        try:
-            await update.message.reply_text(
-                "כמה זמן נמשך כל אימון בממוצע?",
-                reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True),
-            )
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+        await _safe(update.message.reply_text(
+            "כמה זמן נמשך כל אימון בממוצע?",
+            reply_markup=_MIXED_DURATION_KB,
+        ))
     return MIXED_DURATION
 
 
+# כפתורי בחירת פעילויות מרובות - שתי הגרסאות (רגיל/נבחר) נבנות פעם אחת
+_MIX_BTN_PLAIN = {opt: KeyboardButton(opt) for opt in MIXED_ACTIVITY_OPTIONS}
+_MIX_BTN_SELECTED = {opt: KeyboardButton(f"{opt} ❌") for opt in MIXED_ACTIVITY_OPTIONS}
+_MIX_BTN_CONTINUE = KeyboardButton("המשך")
+
+
+@lru_cache(maxsize=128)
+def _mixed_activities_markup(selected_activities: frozenset) -> ReplyKeyboardMarkup:
+    keyboard = [
+        [_MIX_BTN_SELECTED[opt] if opt in selected_activities else _MIX_BTN_PLAIN[opt]]
+        for opt in MIXED_ACTIVITY_OPTIONS
+    ]
+    keyboard.append([_MIX_BTN_CONTINUE])
+    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+
+
 def build_mixed_activities_keyboard(selected_activities):
-    """בונה מקלדת לבחירת פעילויות מרובות."""
-    keyboard = []
-    for activity in MIXED_ACTIVITY_OPTIONS:
-        if activity in selected_activities:
-            keyboard.append([KeyboardButton(f"{activity} ❌")])
-        else:
-            keyboard.append([KeyboardButton(activity)])
-    keyboard.append([KeyboardButton("המשך")])
-    return keyboard
+    """בונה מקלדת לבחירת פעילויות מרובות (נשמרת במטמון לפי סט הבחירות)."""
+    return _mixed_activities_markup(frozenset(selected_activities))
 
 
 async def get_mixed_menu_adaptation(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> int:
-    if context.user_data is None:
-        context.user_data = {}
+    gender = context.user_data.get("gender", "זכר")
     if update.message and update.message.text:
-        choice = update.message.text.strip()
-        if choice not in ["כן", "לא"]:
-            keyboard = [[KeyboardButton("כן"), KeyboardButton("לא")]]
-            try:
-                await update.message.reply_text(
-                    gendered_text("בחר כן או לא:", "בחרי כן או לא:", context),
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
+        choice = _fast_strip(update.message.text)
+        if choice not in _YES_NO_SET:
+            await _safe(update.message.reply_text(
+                _prompt(gender, "pick_yes_no"),
+                reply_markup=_YES_NO_KB,
+                parse_mode="HTML",
+            ))
             return MIXED_MENU_ADAPTATION
         context.user_data["menu_adaptation"] = choice == "כן"
-        keyboard = [[KeyboardButton(opt)] for opt in DIET_OPTIONS]
-        gender = context.user_data.get(
-            "gender", "זכר") if context.user_data else "זכר"
-        diet_text = (
-            "מה העדפות התזונה שלך? (בחרי כל מה שמתאים)"
-            if gender == "נקבה"
-            else "מה העדפות התזונה שלך? (בחר/י כל מה שמתאים)"
-        )
-        try:
-            await update.message.reply_text(
-                diet_text,
-                reply_markup=ReplyKeyboardMarkup(
-                    keyboard, one_time_keyboard=True, resize_keyboard=True
-                ),
-                parse_mode="HTML",
-            )
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
-        return DIET
+        return await _ask_diet(update, context)
+    return ConversationHandler.END
+
+
+async def _ask_diet(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """שולח את שאלת העדפות התזונה עם מקלדת התזונה ומחזיר את מצב DIET."""
+    message = update.callback_query.message if update.callback_query else update.message
+    if message:
+        await _safe(message.reply_text(
+            _prompt(context.user_data.get("gender"), "diet_pref"),
+            reply_markup=_DIET_KB,
+            parse_mode="HTML",
+        ))
+    return DIET
+
+
+async def _finish_diet(update: Update, ud: dict, selected_options: list) -> int:
+    """שומר את העדפות התזונה, מחשב תקציב קלורי ועובר לתפריט הראשי בהודעה אחת."""
+    gender = ud.get("gender", "זכר")
+    ud["diet"] = selected_options
+    ud["calorie_budget"] = calculate_bmr(
+        gender,
+        ud.get("age", 30),
+        ud.get("height", 170),
+        ud.get("weight", 70),
+        ud.get("activity", "בינונית"),
+        ud.get("goal", "שמירה על משקל"),
+    )
+    diet_summary = ", ".join(selected_options)
+    # המשך ישר לתפריט הראשי - המקלדת החדשה מחליפה את מקלדת התזונה,
+    # כך שאין צורך בהודעה נפרדת עם ReplyKeyboardRemove
+    action_text = _prompt(gender, "next_action")
+    await _safe(update.message.reply_text(
+        f"העדפות התזונה שלך: {diet_summary}\n\n{action_text}",
+        reply_markup=_MAIN_MENU_KB,
+        parse_mode="HTML",
+    ))
     return ConversationHandler.END
 
 
 async def get_diet(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    if context.user_data is None:
-        context.user_data = {}
+    ud = context.user_data
+    gender = ud.get("gender", "זכר")
     if update.message and update.message.text:
-        diet_text = update.message.text.strip()
-        if "selected_diet_options" not in context.user_data:
-            context.user_data["selected_diet_options"] = []
-        selected_options = context.user_data["selected_diet_options"]
+        diet_text = _fast_strip(update.message.text)
+        selected_options = ud.setdefault("selected_diet_options", [])
 
         # Treat 'אין העדפות מיוחדות' as immediate finish
         if "אין העדפות מיוחדות" in diet_text:
             selected_options.clear()
             selected_options.append("אין העדפות מיוחדות")
-            context.user_data["diet"] = selected_options
-            user = context.user_data
-            calorie_budget = calculate_bmr(
-                user.get("gender", "זכר"),
-                user.get("age", 30),
-                user.get("height", 170),
-                user.get("weight", 70),
-                user.get("activity", "בינונית"),
-                user.get("goal", "שמירה על משקל"),
-            )
-            context.user_data["calorie_budget"] = calorie_budget
-            diet_summary = ", ".join(selected_options)
-            try:
-                await update.message.reply_text(
-                    f"העדפות התזונה שלך: {diet_summary}\n\n",
-                    reply_markup=ReplyKeyboardRemove(),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
-            # המשך ישר לתפריט הראשי
-            keyboard = [
-                [KeyboardButton("לקבלת תפריט יומי מותאם אישית")],
-                [KeyboardButton("מה אכלתי היום")],
-                [KeyboardButton("בניית ארוחה לפי מה שיש לי בבית")],
-                [KeyboardButton("קבלת דוח")],
-                [KeyboardButton("תזכורות על שתיית מים")],
-            ]
-            gender = context.user_data.get("gender", "זכר")
-            action_text = "מה תרצי לעשות כעת?" if gender == "נקבה" else "מה תרצה לעשות כעת?"
-            try:
-                await update.message.reply_text(
-                    f"{action_text}",
-                    reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
-            return ConversationHandler.END
+            return await _finish_diet(update, ud, selected_options)
 
         # Check if user clicked "סיימתי בחירת העדפות"
         if "סיימתי בחירת העדפות" in diet_text:
-            if not selected_options:
-                selected_options = ["אין העדפות מיוחדות"]
-            context.user_data["diet"] = selected_options
-            user = context.user_data
-            calorie_budget = calculate_bmr(
-                user.get("gender", "זכר"),
-                user.get("age", 30),
-                user.get("height", 170),
-                user.get("weight", 70),
-                user.get("activity", "בינונית"),
-                user.get("goal", "שמירה על משקל"),
+            return await _finish_diet(
+                update, ud, selected_options or ["אין העדפות מיוחדות"]
             )
-            context.user_data["calorie_budget"] = calorie_budget
-            diet_summary = ", ".join(selected_options)
-            try:
-                await update.message.reply_text(
-                    f"העדפות התזונה שלך: {diet_summary}\n\n",
-                    reply_markup=ReplyKeyboardRemove(),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
-            # המשך ישר לתפריט הראשי
-            keyboard = [
-                [KeyboardButton("לקבלת תפריט יומי מותאם אישית")],
-                [KeyboardButton("מה אכלתי היום")],
-                [KeyboardButton("בניית ארוחה לפי מה שיש לי בבית")],
-                [KeyboardButton("קבלת דוח")],
-                [KeyboardButton("תזכורות על שתיית מים")],
-            ]
-            gender = context.user_data.get("gender", "זכר")
-            action_text = "מה תרצי לעשות כעת?" if gender == "נקבה" else "מה תרצה לעשות כעת?"
-            try:
-                await update.message.reply_text(
-                    f"{action_text}",
-                    reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
-            return ConversationHandler.END
         # ... existing code ...
 
-    # Handle individual diet options
-    for option in DIET_OPTIONS:
-        if option in diet_text:
+    if not update.message or not update.message.text:
+        return DIET
+
+    # Handle individual diet options - מעבר יחיד על הטקסט מול כל האפשרויות
+    matched_options = dict.fromkeys(_DIET_RE.findall(diet_text))
+    if matched_options:
+        for option in matched_options:
             if option in selected_options:
                 selected_options.remove(option)
             else:
                 selected_options.append(option)
-            context.user_data["selected_diet_options"] = selected_options
-            keyboard = build_diet_keyboard(selected_options)
-            gender = context.user_data.get("gender", "זכר")
-            
-            # Use gender-specific text
-            if gender == "נקבה":
-                diet_text_msg = gendered_text(
-                    "מה העדפות התזונה שלך? (לחצי על אפשרות כדי לבחור או לבטל בחירה)",
-                    "מה העדפות התזונה שלך? (לחצי על אפשרות כדי לבחור או לבטל בחירה)",
-                    context)
-            elif gender == "זכר":
-                diet_text_msg = gendered_text(
-                    "מה העדפות התזונה שלך? (לחץ על אפשרות כדי לבחור או לבטל בחירה)",
-                    "מה העדפות התזונה שלך? (לחץ על אפשרות כדי לבחור או לבטל בחירה)",
-                    context)
-            else:
-                diet_text_msg = gendered_text(
-                    "מה העדפות התזונה שלך? (לחץ/י על אפשרות כדי לבחור או לבטל בחירה)",
-                    "מה העדפות התזונה שלך? (לחץ/י על אפשרות כדי לבחור או לבטל בחירה)",
-                    context)
-                
-            try:
-                await update.message.reply_text(
-                    diet_text_msg,
-                    reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
-            return DIET
+        ud["selected_diet_options"] = selected_options
+        keyboard = build_diet_keyboard(selected_options)
+        diet_text_msg = _prompt(gender, "diet_toggle")
+
+        await _safe(update.message.reply_text(
+            diet_text_msg,
+            reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True),
+            parse_mode="HTML",
+        ))
+        return DIET
             
     # If no valid option was selected, show error
     keyboard = build_diet_keyboard(selected_options)
-    try:
-        await update.message.reply_text(
-            gendered_text("אנא בחר אפשרות מהתפריט למטה או לחץ על 'סיימתי בחירת העדפות'", "אנא בחרי אפשרות מהתפריט למטה או לחצי על 'סיימתי בחירת העדפות'", context),
-            reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True),
-            parse_mode="HTML",
-        )
-    except Exception as e:
-        logger.error("Telegram API error in reply_text: %s", e)
+    await _safe(update.message.reply_text(
+        _prompt(gender, "diet_invalid"),
+        reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True),
+        parse_mode="HTML",
+    ))
     return DIET
 
 
 async def get_allergies(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if context.user_data is None:
-        context.user_data = {}
     # בדוק אם זה השלב הראשון (yes/no) או השני (multi-select)
-    if context.user_data is None:
-        context.user_data = {}
-    if "allergy_step" not in context.user_data:
-        context.user_data["allergy_step"] = "yes_no"
-    if context.user_data["allergy_step"] == "yes_no":
+    if context.user_data.setdefault("allergy_step", "yes_no") == "yes_no":
         return await get_allergies_yes_no(update, context)
     else:
         return await get_allergies_multi_select(update, context)
 
 
 async def get_allergies_yes_no(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if context.user_data is None:
-        context.user_data = {}
+    gender = context.user_data.get("gender", "זכר")
     if update.message and update.message.text:
         answer = update.message.text.strip()
-        if answer not in ["כן", "לא"]:
-            keyboard = [[KeyboardButton("כן"), KeyboardButton("לא")]]
-            gender = context.user_data.get("gender", "זכר") if context.user_data else "זכר"
-            if gender == "נקבה":
-                error_text = "בחרי 'כן' או 'לא' מהתפריט למטה:"
-            else:
-                error_text = "בחר 'כן' או 'לא' מהתפריט למטה:"
-            try:
-                await update.message.reply_text(
-                    error_text,
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
+        if answer not in _YES_NO_SET:
+            await _safe(update.message.reply_text(
+                _prompt(gender, "allergy_yes_no_invalid"),
+                reply_markup=_YES_NO_KB,
+                parse_mode="HTML",
+            ))
             return ALLERGIES
         if answer == "לא":
             context.user_data["allergies"] = []
             context.user_data["allergy_step"] = "yes_no"
-            try:
-                await update.message.reply_text(
-                    "מעולה! נמשיך לשאלה הבאה...",
-                    reply_markup=ReplyKeyboardRemove(),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
-            # המשך ישר לתפריט הראשי
-            keyboard = [
-                [KeyboardButton("לקבלת תפריט יומי מותאם אישית")],
-                [KeyboardButton("מה אכלתי היום")],
-                [KeyboardButton("בניית ארוחה לפי מה שיש לי בבית")],
-                [KeyboardButton("קבלת דוח")],
-                [KeyboardButton("תזכורות על שתיית מים")],
-            ]
-            gender = context.user_data.get("gender", "זכר") if context.user_data else "זכר"
-            action_text = "מה תרצי לעשות כעת?" if gender == "נקבה" else "מה תרצה לעשות כעת?"
-            try:
-                await update.message.reply_text(
-                    f"{action_text}",
-                    reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
+            # המשך ישר לתפריט הראשי בהודעה אחת - המקלדת החדשה מחליפה את
+            # מקלדת כן/לא, כך שאין צורך בהודעה נפרדת עם ReplyKeyboardRemove
+            action_text = _prompt(gender, "next_action")
+            await _safe(update.message.reply_text(
+                f"מעולה! נמשיך לשאלה הבאה...\n\n{action_text}",
+                reply_markup=_MAIN_MENU_KB,
+                parse_mode="HTML",
+            ))
             return ConversationHandler.END
         else:  # answer == "כן"
             context.user_data["allergy_step"] = "multi_select"
-            if "allergies" not in context.user_data:
-                context.user_data["allergies"] = []
-            keyboard = build_allergy_keyboard(context.user_data["allergies"])
-            try:
-                await update.message.reply_text(
-                    "בחר/י את כל האלרגיות הרלוונטיות:",
-                    reply_markup=keyboard,
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
+            keyboard = build_allergy_keyboard(context.user_data.setdefault("allergies", []))
+            await _safe(update.message.reply_text(
+                "בחר/י את כל האלרגיות הרלוונטיות:",
+                reply_markup=keyboard,
+                parse_mode="HTML",
+            ))
             return ALLERGIES
     # אם אין הודעה - הצג את השאלה הראשונה
-    keyboard = [[KeyboardButton("כן"), KeyboardButton("לא")]]
-    gender = context.user_data.get("gender", "זכר") if context.user_data else "זכר"
-    if gender == "נקבה":
-        allergy_text = "האם יש לך אלרגיות למזון? (אם לא, בחרי 'לא')"
-    else:
-        allergy_text = "האם יש לך אלרגיות למזון? (אם לא, בחר 'לא')"
-    try:
-        await update.message.reply_text(
-            allergy_text,
-            reply_markup=ReplyKeyboardRemove(),
-            parse_mode="HTML",
-        )
-    except Exception as e:
-        logger.error("Telegram API error in reply_text: %s", e)
+    await _safe(update.message.reply_text(
+        _prompt(gender, "allergy_q"),
+        reply_markup=_YES_NO_KB,
+        parse_mode="HTML",
+    ))
     return ALLERGIES
 
 
 async def get_allergies_multi_select(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if context.user_data is None:
-        context.user_data = {}
-    if "allergies" not in context.user_data:
-        context.user_data["allergies"] = []
-    selected = context.user_data["allergies"]
+    selected = context.user_data.setdefault("allergies", [])
     query = update.callback_query
     if not query:
         # שלב ראשון - שלח מקלדת
         keyboard = build_allergy_keyboard(selected)
-        try:
-            await update.message.reply_text(
-                "בחר/י את כל האלרגיות הרלוונטיות:",
-                reply_markup=keyboard,
-                parse_mode="HTML",
-            )
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+        await _safe(update.message.reply_text(
+            "בחר/י את כל האלרגיות הרלוונטיות:",
+            reply_markup=keyboard,
+            parse_mode="HTML",
+        ))
         return ALLERGIES
     # טיפול בלחיצות על כפתורים
     await query.answer()
     if query.data == "allergy_done":
         # המשתמש לחץ על "סיימתי" - המשך לשלב הבא
-        try:
-            await query.edit_message_text(
-                "מעולה! עכשיו בואו נמשיך לשאלה הבאה...",
-                reply_markup=InlineKeyboardMarkup([])
-            )
-        except Exception as e:
-            logger.error("Telegram API error in edit_message_text: %s", e)
+        await _safe(query.edit_message_text(
+            "מעולה! עכשיו בואו נמשיך לשאלה הבאה...",
+            reply_markup=InlineKeyboardMarkup([])
+        ), "edit_message_text")
         # איפוס השלב לפעם הבאה
         context.user_data["allergy_step"] = "yes_no"
-        # המשך ישר לתפריט הראשי
-        keyboard = [
-            [KeyboardButton("לקבלת תפריט יומי מותאם אישית")],
-            [KeyboardButton("מה אכלתי היום")],
-            [KeyboardButton("בניית ארוחה לפי מה שיש לי בבית")],
-            [KeyboardButton("קבלת דוח")],
-            [KeyboardButton("תזכורות על שתיית מים")],
-        ]
-        gender = context.user_data.get("gender", "זכר") if context.user_data else "זכר"
-        action_text = "מה תרצי לעשות כעת?" if gender == "נקבה" else "מה תרצה לעשות כעת?"
-        try:
-            await query.message.reply_text(
-                f"{action_text}",
-                reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True),
-                parse_mode="HTML",
-            )
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+        action_text = _prompt(context.user_data.get("gender"), "next_action")
+        await _safe(query.message.reply_text(
+            f"{action_text}",
+            reply_markup=_MAIN_MENU_KB,
+            parse_mode="HTML",
+        ))
         return ConversationHandler.END
     elif query.data.startswith("allergy_toggle_"):
         # טוגל אלרגיה
@@ -1858,81 +1618,58 @@ async def get_allergies_multi_select(update: Update, context: ContextTypes.DEFAU
         context.user_data["allergies"] = selected
         # עדכן את המקלדת
         keyboard = build_allergy_keyboard(selected)
-        try:
-            await query.edit_message_reply_markup(reply_markup=keyboard)
-        except Exception as e:
-            logger.error("Telegram API error in edit_message_reply_markup: %s", e)
+        await _safe(query.edit_message_reply_markup(reply_markup=keyboard), "edit_message_reply_markup")
     return ALLERGIES
 
 
 async def ask_water_reminder_opt_in(
         update: Update,
         context: ContextTypes.DEFAULT_TYPE):
-    if context.user_data is None:
-        context.user_data = {}
-    keyboard = [[KeyboardButton("כן, אשמח!"), KeyboardButton("לא, תודה")]]
-    gender = context.user_data.get("gender", "זכר")
-    reminder_text = (
-        "האם תרצי לקבל תזכורת לשתות מים כל שעה וחצי?"
-        if gender == "נקבה"
-        else "האם תרצה לקבל תזכורת לשתות מים כל שעה וחצי?"
-    )
+    reminder_text = _prompt(context.user_data.get("gender"), "water_reminder_q")
     if update.message:
-        try:
-            await update.message.reply_text(
-                reminder_text,
-                reply_markup=ReplyKeyboardMarkup(
-                    keyboard, one_time_keyboard=True, resize_keyboard=True
-                ),
-                parse_mode="HTML",
-            )
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+        await _safe(update.message.reply_text(
+            reminder_text,
+            reply_markup=_WATER_OPT_IN_KB,
+            parse_mode="HTML",
+        ))
     return WATER_REMINDER_OPT_IN
 
 
 async def set_water_reminder_opt_in(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    if context.user_data is None:
-        context.user_data = {}
     if not update.message or not update.message.text:
         return ConversationHandler.END
     choice = update.message.text.strip()
-    user_id = update.effective_user.id if update.effective_user else None
+    user_id = _effective_user_id(update)
     if choice == "כן, אשמח!":
         context.user_data["water_reminder_opt_in"] = True
         context.user_data["water_reminder_active"] = True
         if update.message:
-            try:
-                await update.message.reply_text(
-                    gendered_text(
-                        context,
-                        "מעולה! אזכיר לך לשתות מים כל שעה וחצי עד שתסיים את היום.",
-                        "מעולה! אזכיר לך לשתות מים כל שעה וחצי עד שתסיימי את היום.",
-                    ),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
+            await _safe(update.message.reply_text(
+                gendered_text(
+                    "מעולה! אזכיר לך לשתות מים כל שעה וחצי עד שתסיים את היום.",
+                    "מעולה! אזכיר לך לשתות מים כל שעה וחצי עד שתסיימי את היום.",
+                    context,
+                ),
+                parse_mode="HTML",
+            ))
         if user_id:
-            nutrition_db.save_user(user_id, context.user_data)
-        asyncio.create_task(start_water_reminder_loop_with_buttons(update, context))
+            _mark_dirty(user_id, context.user_data)
+            schedule_water_reminders(context, update.effective_chat.id, user_id)
     else:
         context.user_data["water_reminder_opt_in"] = False
         context.user_data["water_reminder_active"] = False
         if update.message:
-            try:
-                await update.message.reply_text(
-                    gendered_text(
-                        context,
-                        "אין בעיה! אפשר להפעיל תזכורות מים בכל שלב.",
-                        "אין בעיה! אפשר להפעיל תזכורות מים בכל שלב.",
-                    ),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
+            await _safe(update.message.reply_text(
+                gendered_text(
+                    "אין בעיה! אפשר להפעיל תזכורות מים בכל שלב.",
+                    "אין בעיה! אפשר להפעיל תזכורות מים בכל שלב.",
+                    context,
+                ),
+                parse_mode="HTML",
+            ))
         if user_id:
-            nutrition_db.save_user(user_id, context.user_data)
+            _remove_water_jobs(context, user_id)
+            _mark_dirty(user_id, context.user_data)
 
     # Set flow state to tracking and setup_complete with day count
     context.user_data["flow"] = {
@@ -1943,7 +1680,7 @@ async def set_water_reminder_opt_in(update: Update, context: ContextTypes.DEFAUL
     
     # שמור למסד נתונים
     if user_id:
-        nutrition_db.save_user(user_id, context.user_data)
+        _mark_dirty(user_id, context.user_data)
     
     # שלח הודעת סיום השאלון
     completion_msg = gendered_text(
@@ -1959,187 +1696,147 @@ async def set_water_reminder_opt_in(update: Update, context: ContextTypes.DEFAUL
     )
     
     if update.message:
-        try:
-            await update.message.reply_text(
-                completion_msg,
-                reply_markup=build_main_keyboard(),
-                parse_mode="HTML",
-            )
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+        await _safe(update.message.reply_text(
+            completion_msg,
+            reply_markup=build_main_keyboard(),
+            parse_mode="HTML",
+        ))
     
     return ConversationHandler.END
 
 
-async def start_water_reminder_loop_with_buttons(
-    update: Update, context: ContextTypes.DEFAULT_TYPE
-):
-    user_id = update.effective_user.id if update.effective_user else None
-    if context.user_data is None:
-        context.user_data = {}
-    while context.user_data.get("water_reminder_opt_in") and context.user_data.get(
-            "water_reminder_active"):
-        await asyncio.sleep(90 * 60)  # 1.5 hours
-        if not context.user_data.get(
-            "water_reminder_opt_in"
-        ) or not context.user_data.get("water_reminder_active"):
-            break
-        try:
-            if update.message:
-                await send_water_reminder(update, context)
-        except Exception as e:
-            logger.error("Water reminder error: %s", e)
-        if user_id:
-            nutrition_db.save_user(user_id, context.user_data)
+# תזכורת מים כל שעה וחצי - job חוזר אחד לכל משתמש ב-JobQueue של האפליקציה
+_WATER_REMINDER_INTERVAL = 90 * 60
+# user_id -> Job, לביטול ב-O(1) בלי לסרוק את כל ה-jobs בתור לפי שם
+_water_jobs = {}
 
 
-async def send_water_reminder(
-        update: Update,
-        context: ContextTypes.DEFAULT_TYPE):
-    if context.user_data is None:
-        context.user_data = {}
-    user_id = update.effective_user.id if update.effective_user else None
-    if user_id:
-        nutrition_db.save_user(user_id, context.user_data)
-    if update.message:
-        try:
-            await update.message.reply_text(
-                gendered_text(
-                    context,
-                    "בסדר! הפסקתי להזכיר לך לשתות מים. אפשר להפעיל שוב בכל שלב.",
-                    "בסדר! הפסקתי להזכיר לך לשתות מים. אפשר להפעיל שוב בכל שלב.",
-                ),
-                reply_markup=ReplyKeyboardRemove(),
-                parse_mode="HTML",
-            )
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+def _water_job_name(user_id) -> str:
+    return f"water_{user_id}"
+
+
+def _remove_water_jobs(context: ContextTypes.DEFAULT_TYPE, user_id) -> None:
+    """מסיר את ה-job של תזכורות המים של המשתמש, אם קיים."""
+    job = _water_jobs.pop(user_id, None)
+    if job is not None and not job.removed:
+        job.schedule_removal()
+
+
+def schedule_water_reminders(context: ContextTypes.DEFAULT_TYPE, chat_id, user_id) -> None:
+    """מתזמן תזכורת מים חוזרת למשתמש (ומחליף תזמון קודם אם היה)."""
+    if not context.job_queue:
+        logger.error("JobQueue not available - water reminders disabled")
+        return
+    _remove_water_jobs(context, user_id)
+    _water_jobs[user_id] = context.job_queue.run_repeating(
+        send_water_reminder,
+        interval=_WATER_REMINDER_INTERVAL,
+        first=_WATER_REMINDER_INTERVAL,
+        name=_water_job_name(user_id),
+        chat_id=chat_id,
+        user_id=user_id,
+    )
+
+
+async def send_water_reminder(context: ContextTypes.DEFAULT_TYPE):
+    """callback של ה-job: שולח תזכורת לשתות מים כל עוד התזכורות פעילות."""
+    job = context.job
+    user_data = context.user_data or {}
+    if not user_data.get("water_reminder_opt_in") or not user_data.get("water_reminder_active"):
+        if _water_jobs.get(job.user_id) is job:
+            del _water_jobs[job.user_id]
+        job.schedule_removal()
+        return
+    await _safe(context.bot.send_message(
+        chat_id=job.chat_id,
+        text=gendered_text("זכור לשתות מים! 💧", "זכרי לשתות מים! 💧", context),
+        parse_mode="HTML",
+    ), "send_message")
 
 
 async def remind_in_10_minutes(
         update: Update,
         context: ContextTypes.DEFAULT_TYPE):
-    if context.user_data is None:
-        context.user_data = {}
     await asyncio.sleep(10 * 60)  # 10 minutes
-    user_id = update.effective_user.id if update.effective_user else None
+    user_id = _effective_user_id(update)
     if user_id:
-        nutrition_db.save_user(user_id, context.user_data)
+        _mark_dirty(user_id, context.user_data)
     if update.message:
-        try:
-            await update.message.reply_text(
-                gendered_text(
-                    context,
-                    "זכור לשתות מים! 💧",
-                    "זכרי לשתות מים! 💧",
-                ),
-                parse_mode="HTML",
-            )
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+        await _safe(update.message.reply_text(
+            gendered_text(
+                "זכור לשתות מים! 💧",
+                "זכרי לשתות מים! 💧",
+                context,
+            ),
+            parse_mode="HTML",
+        ))
 
 
 async def cancel_water_reminders(
         update: Update,
         context: ContextTypes.DEFAULT_TYPE):
-    if context.user_data is None:
-        context.user_data = {}
     context.user_data["water_reminder_active"] = False
-    user_id = update.effective_user.id if update.effective_user else None
+    user_id = _effective_user_id(update)
     if user_id:
-        nutrition_db.save_user(user_id, context.user_data)
+        _remove_water_jobs(context, user_id)
+        _mark_dirty(user_id, context.user_data)
     if update.message:
-        try:
-            await update.message.reply_text(
-                gendered_text(
-                    context,
-                    "בסדר! הפסקתי להזכיר לך לשתות מים. אפשר להפעיל שוב בכל שלב.",
-                    "בסדר! הפסקתי להזכיר לך לשתות מים. אפשר להפעיל שוב בכל שלב.",
-                ),
-                reply_markup=ReplyKeyboardRemove(),
-                parse_mode="HTML",
-            )
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+        await _safe(update.message.reply_text(
+            gendered_text(
+                "בסדר! הפסקתי להזכיר לך לשתות מים. אפשר להפעיל שוב בכל שלב.",
+                "בסדר! הפסקתי להזכיר לך לשתות מים. אפשר להפעיל שוב בכל שלב.",
+                context,
+            ),
+            reply_markup=_REMOVE_KB,
+            parse_mode="HTML",
+        ))
 
 
 async def water_intake_start(update: Update,
                              context: ContextTypes.DEFAULT_TYPE) -> int:
-    if context.user_data is None:
-        context.user_data = {}
-    keyboard = [
-        [KeyboardButton('כוס אחת (240 מ"ל)'), KeyboardButton('שתי כוסות (480 מ"ל)')],
-        [KeyboardButton('בקבוק קטן (500 מ"ל)'), KeyboardButton("בקבוק גדול (1 ליטר)")],
-        [KeyboardButton("אחר")],
-    ]
     if update.message:
-        try:
-            await update.message.reply_text(
-                "כמה מים שתית?",
-                reply_markup=ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True),
-                parse_mode="HTML",
-            )
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+        await _safe(update.message.reply_text(
+            "כמה מים שתית?",
+            reply_markup=_WATER_AMOUNT_KB,
+            parse_mode="HTML",
+        ))
     return WATER_REMINDER_OPT_IN
 
 
 async def water_intake_amount(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> int:
-    if context.user_data is None:
-        context.user_data = {}
-    amount_map = {
-        'כוס אחת (240 מ"ל)': 240,
-        'שתי כוסות (480 מ"ל)': 480,
-        'בקבוק קטן (500 מ"ל)': 500,
-        "בקבוק גדול (1 ליטר)": 1000,
-    }
-    if "water_today" not in context.user_data:
-        context.user_data["water_today"] = 0
+    context.user_data.setdefault("water_today", 0)
     if not update.message or not update.message.text:
         return ConversationHandler.END
     amount_text = update.message.text.strip()
-    if amount_text in amount_map:
-        amount = amount_map[amount_text]
-    elif amount_text.isdigit():
-        amount = int(amount_text)
-    else:
-        if update.message:
-            try:
-                await update.message.reply_text(
-                    'הזן כמות במ"ל (למשל: 300):',
-                    reply_markup=ReplyKeyboardRemove(),
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
-        return WATER_REMINDER_OPT_IN
-    context.user_data["water_today"] += amount
-    if update.message:
-        try:
-            await update.message.reply_text(
-                f'כל הכבוד! שתית {amount} מ"ל מים. סה"כ היום: {context.user_data["water_today"]} מ"ל',
-                reply_markup=ReplyKeyboardRemove(),
-                parse_mode="HTML",
-            )
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+    amount = _WATER_AMOUNTS.get(amount_text)
+    if amount is None and _WATER_ML_RE.fullmatch(amount_text):
+        amount = int(amount_text)
+    if amount is None:
+        await _safe(update.message.reply_text(
+            'הזן כמות במ"ל (למשל: 300):',
+            reply_markup=_REMOVE_KB,
+            parse_mode="HTML",
+        ))
+        return WATER_REMINDER_OPT_IN
+    context.user_data["water_today"] += amount
+    if update.message:
+        await _safe(update.message.reply_text(
+            f'כל הכבוד! שתית {amount} מ"ל מים. סה"כ היום: {context.user_data["water_today"]} מ"ל',
+            reply_markup=_REMOVE_KB,
+            parse_mode="HTML",
+        ))
     return ConversationHandler.END
 
 
 async def show_daily_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if context.user_data is None:
-        context.user_data = {}
     user_data = context.user_data
-    user_id = update.effective_user.id if update.effective_user else None
+    user_id = _effective_user_id(update)
     chat_id = update.effective_chat.id if update.effective_chat else None
     # סגור את המקלדת מיד אחרי הלחיצה
     if update.message:
-        try:
-            await update.message.reply_text("מעבד את התפריט עבורך... ⏳", reply_markup=ReplyKeyboardRemove())
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+        await _safe(update.message.reply_text("מעבד את התפריט עבורך... ⏳", reply_markup=_REMOVE_KB))
     # 1. שלח תקציב קלוריות כהודעה נפרדת והצמד אותה
     remaining_calories = user_data.get("remaining_calories", user_data.get("calorie_budget", 0))
     calorie_msg = f"נותרו לי להיום: {remaining_calories} קלוריות 🔄"
@@ -2155,7 +1852,7 @@ async def show_daily_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         from utils import build_user_prompt_for_gpt
         prompt = build_user_prompt_for_gpt(user_data)
-        menu_response = await call_gpt(prompt)
+        menu_response = await call_gpt(prompt, cache=True)
         if menu_response:
             await update.message.reply_text(menu_response, parse_mode="HTML")
     except Exception as e:
@@ -2171,13 +1868,6 @@ async def show_daily_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def daily_menu(
         update: Update,
         context: ContextTypes.DEFAULT_TYPE) -> int:
-    if context.user_data is None:
-        context.user_data = {}
-    if update.message:
-        try:
-            await update.message.reply_text("רגע, בונה עבורך תפריט...")
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
     if update.message and update.message.text:
         choice = update.message.text.strip()
         if choice == "סיימתי":
@@ -2188,46 +1878,234 @@ async def daily_menu(
     return DAILY
 
 
+# שליפת שדה הקלוריות מרשומת אכילה - לסכימה ב-sum(map(...)) ברמת C
+_get_calories = itemgetter("calories")
+
+# מספר קלוריות שהמשתמש כתב בעצמו בדיווח ("80 קלוריות", "80 קל")
+_USER_CALORIES_RE = re.compile(r"([0-9]+)\s*(?:קלוריות|קלוריה|קל)(?!\w)")
+# סימנים לדיווח על כמה פריטים: פסיק, או "ו" כמילה נפרדת או כתחילית ("ובננה")
+_MULTI_ITEM_RE = re.compile(r",|(?:^|\s)ו")
+# שורת הקלוריות של הפריט שנוסף בתשובת GPT ("CALORIES: 120"). רק המספר הזה
+# נרשם ונשמר במטמון - לא מספרים אחרים בטקסט כמו התקציב או הסה"כ היומי
+_ITEM_CALORIES_RE = re.compile(r"^\s*CALORIES:\s*([0-9]+)\s*$", re.MULTILINE)
+
+
+def _user_stated_calories(food_text: str):
+    """מחזיר את הקלוריות שהמשתמש ציין, רק לדיווח על פריט בודד עם מספר אחד.
+
+    בדיווח על כמה פריטים ("תפוח 80 קלוריות ופיצה") המספר לא מכסה את כולם,
+    ולכן מחזירים None וההערכה עוברת ל-GPT.
+    """
+    matches = _USER_CALORIES_RE.findall(food_text)
+    if len(matches) != 1 or _MULTI_ITEM_RE.search(food_text):
+        return None
+    return int(matches[0])
+
+
+# מטמון LRU של הערכות קלוריות לפי טקסט הדיווח (מנורמל), כדי לא לפנות ל-GPT
+# שוב על דיווחים חוזרים כמו "כוס קפה". נשמר רק מספר הקלוריות - הסיכום
+# (סה"כ היום, כמה נשאר) תלוי במשתמש ומחושב מחדש בכל דיווח.
+_FOOD_CALORIES_CACHE_SIZE = 5000
+_food_calories_cache = OrderedDict()
+
+
+def _food_cache_key(food_text: str) -> str:
+    return " ".join(food_text.lower().split())
+
+
+def _get_cached_food_calories(key: str):
+    calories = _food_calories_cache.get(key)
+    if calories is not None:
+        _food_calories_cache.move_to_end(key)
+    return calories
+
+
+def _cache_food_calories(key: str, calories: int) -> None:
+    _food_calories_cache[key] = calories
+    _food_calories_cache.move_to_end(key)
+    if len(_food_calories_cache) > _FOOD_CALORIES_CACHE_SIZE:
+        _food_calories_cache.popitem(last=False)
+
+
 async def eaten(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    if context.user_data is None:
-        context.user_data = {}
     user = context.user_data
     gender = user.get("gender", "זכר")
     
     # Check if this is the first call (asking for food input)
     if not user.get("eaten_prompted", False):
         if update.message:
-            if gender == "נקבה":
-                prompt = "אשמח שתפרטי מה אכלת היום, בצורה הבאה: ביצת עין, 2 פרוסות לחם לבן עם גבינה לבנה 5%, סלט ירקות ממלפפון ועגבנייה"
-            elif gender == "זכר":
-                prompt = "אשמח שתפרט מה אכלת היום, בצורה הבאה: ביצת עין, 2 פרוסות לחם לבן עם גבינה לבנה 5%, סלט ירקות ממלפפון ועגבנייה"
-            else:
-                prompt = "אשמח שתפרט/י מה אכלת היום, בצורה הבאה: ביצת עין, 2 פרוסות לחם לבן עם גבינה לבנה 5%, סלט ירקות ממלפפון ועגבנייה"
-            try:
-                await update.message.reply_text(
-                    prompt, reply_markup=ReplyKeyboardRemove(), parse_mode="HTML"
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
+            await _safe(update.message.reply_text(
+                _prompt(gender, "eaten_prompt"), reply_markup=_REMOVE_KB, parse_mode="HTML"
+            ))
         user["eaten_prompted"] = True
         return EATEN
     
     # Process food input
     if update.message and update.message.text:
-        food_text = update.message.text.strip()
-        
-        try:
-            # Use GPT to process the food input
-            user_id = update.effective_user.id if update.effective_user else None
-            calorie_budget = user.get("calorie_budget", 1800)
-            total_eaten = sum(e["calories"] for e in user.get("eaten_today", []))
-            remaining = calorie_budget - total_eaten
+        await _process_food_report(update, context, update.message.text.strip())
+    
+    return EATEN
+
+
+# מרווח מינימלי (שניות) בין עריכות של הודעה שמתעדכנת בזמן שתשובת GPT מוזרמת.
+# Telegram מגביל צ'אט פרטי לכהודעה אחת בשנייה, וה-rate limiter לא מגביל צ'אטים פרטיים
+_STREAM_EDIT_INTERVAL = 1.0
+# אורך הודעה מקסימלי ב-Telegram; בעדכוני ביניים משאירים מקום לסימן ההמתנה
+_TG_MESSAGE_LIMIT = 4096
+_STREAM_PREVIEW_LIMIT = 4000
+
+
+# אסימוני HTML לפיצול: תגית, ישות ("&amp;"), או רצף טקסט רגיל
+_HTML_TOKEN_RE = re.compile(r"<(/?)(\w+)[^>]*>|&#?\w+;|[^<&]+|[<&]")
+
+
+def _split_message(text: str, limit: int = _TG_MESSAGE_LIMIT) -> list:
+    """מפצל טקסט HTML ארוך לחלקים באורך עד limit.
+
+    לא חותך בתוך תגית או ישות, ומעדיף סוף שורה שאין בו תגית פתוחה. תגיות
+    שפתוחות בנקודת החיתוך (<b>, <i>) נסגרות בסוף החלק ונפתחות מחדש בתחילת
+    החלק הבא, כדי שכל חלק יהיה HTML תקין בפני עצמו.
+    """
+    chunks = []
+    reopen = ""
+    while len(text) > limit:
+        stack = []  # תגיות פתוחות: (שם, תגית הפתיחה המקורית)
+        closing = 0  # אורך תגיות הסגירה שיתווספו לסוף החלק
+        last_cut = line_cut = clean_cut = None  # (מיקום, התגיות הפתוחות בו)
+        for m in _HTML_TOKEN_RE.finditer(text):
+            start, end = m.span()
+            if start + closing > limit:
+                break
+            if start > len(reopen):
+                last_cut = (start, tuple(stack))
+            name = m.group(2)
+            if name:
+                if m.group(1):
+                    if stack and stack[-1][0] == name:
+                        stack.pop()
+                        closing -= len(name) + 3
+                else:
+                    stack.append((name, m.group()))
+                    closing += len(name) + 3
+                continue
+            if m.group()[0] == "&" and end - start > 1:
+                continue
+            # בתוך רצף טקסט אפשר לחתוך בכל מקום
+            stop = min(end, limit - closing)
+            if stop > max(start, len(reopen)):
+                last_cut = (stop, tuple(stack))
+            newline = text.rfind("\n", max(start, len(reopen) + 1), stop)
+            if newline != -1:
+                line_cut = (newline, tuple(stack))
+                if not stack:
+                    clean_cut = line_cut
+        if clean_cut and clean_cut[0] > limit // 2:
+            cut, open_tags = clean_cut
+        elif line_cut:
+            cut, open_tags = line_cut
+        elif last_cut:
+            cut, open_tags = last_cut
+        else:
+            cut, open_tags = limit, ()
+        chunks.append(text[:cut] + "".join(f"</{tag}>" for tag, _ in reversed(open_tags)))
+        reopen = "".join(opening for _, opening in open_tags)
+        text = reopen + text[cut:].lstrip("\n")
+    chunks.append(text)
+    return chunks
+
+
+async def _send_html(send, text: str, what: str):
+    """שולח טקסט כ-HTML, ואם Telegram דוחה אותו (HTML לא תקין) - כטקסט נקי."""
+    try:
+        return await send(text, parse_mode="HTML")
+    except Exception as e:
+        logger.error("Telegram API error in %s: %s", what, e)
+        return await _safe(send(strip_html_tags(text)), what)
+
+
+async def _stream_gpt_reply(update: Update, prompt: str, placeholder: str = "מעבד... ⏳", cache: bool = False, hide_re=None) -> tuple[str, bool]:
+    """שולח הודעת המתנה ומעדכן אותה בזמן ש-GPT מזרים את התשובה.
+
+    תשובה ארוכה ממגבלת ההודעה של Telegram נשלחת בכמה הודעות.
+    שורות שתואמות ל-hide_re (שדות למכונה) לא מוצגות למשתמש.
+    מחזיר (התשובה המלאה, האם התשובה כבר הוצגה למשתמש). אם ה-stream נקטע,
+    השגיאה מוצגת למשתמש ומוחזרת תשובה ריקה, כדי שלא יירשם דבר מטקסט חלקי.
+    """
+    message = await _safe(update.message.reply_text(placeholder))
+    loop = asyncio.get_running_loop()
+    last_edit = loop.time()
+    parts = []
+    # עריכת ביניים רצה ברקע כדי לא לעכב את קריאת ה-stream; בזמן שהיא ממתינה
+    # (למשל ל-retry של ה-rate limiter) מדלגים על עריכות נוספות
+    pending_edit = None
+    try:
+        async for chunk in call_gpt_stream(prompt, cache=cache):
+            parts.append(chunk)
+            if (message and loop.time() - last_edit >= _STREAM_EDIT_INTERVAL
+                    and (pending_edit is None or pending_edit.done())):
+                last_edit = loop.time()
+                # HTML חלקי עלול להיות לא תקין - בעדכוני הביניים מציגים טקסט נקי
+                preview = "".join(parts)
+                if hide_re is not None:
+                    preview = hide_re.sub("", preview)
+                preview = strip_html_tags(preview)[-_STREAM_PREVIEW_LIMIT:]
+                pending_edit = asyncio.create_task(
+                    _safe(message.edit_text(preview + " ⏳"), "edit_text"))
+    except GPTStreamError as e:
+        if pending_edit is not None:
+            await pending_edit
+        # התשובה נקטעה באמצע - מציגים את השגיאה במקום הטקסט החלקי
+        if message is None or await _safe(message.edit_text(str(e)), "edit_text") is None:
+            await _safe(update.message.reply_text(str(e)))
+        return "", True
+    # העריכה הסופית חייבת להגיע אחרי עריכת הביניים האחרונה
+    if pending_edit is not None:
+        await pending_edit
+    response = "".join(parts).strip()
+    if not message or not response:
+        return response, False
+    text = hide_re.sub("", response).strip() if hide_re is not None else response
+    first, *rest = _split_message(text)
+    if await _send_html(message.edit_text, first, "edit_text") is None:
+        return response, False
+    for chunk in rest:
+        await _send_html(update.message.reply_text, chunk, "reply_text")
+    return response, True
+
+
+async def _process_food_report(update: Update, context: ContextTypes.DEFAULT_TYPE, food_text: str, silent: bool = False) -> None:
+    """מעבד דיווח אכילה: הערכת קלוריות (מטמון או GPT), עדכון eaten_today ושמירה.
+
+    משותף ל-eaten ול-handle_food_consumption. עם silent=True לא נשלחות הודעות.
+    """
+    user = context.user_data
+    shown = False
+    try:
+        user_id = _effective_user_id(update)
+        calorie_budget = user.get("calorie_budget", 1800)
+        total_eaten = sum(map(_get_calories, user.get("eaten_today", ())))
+        remaining = calorie_budget - total_eaten
+        cache_key = _food_cache_key(food_text)
+        calories = _get_cached_food_calories(cache_key)
+        if calories is None:
+            # המשתמש ציין בעצמו כמה קלוריות ("תפוח 80 קלוריות") - אין צורך ב-GPT
+            calories = _user_stated_calories(food_text)
+        if calories is not None:
+            # דיווח שכבר הוערך או שצוינו בו קלוריות - מחשבים את הסיכום מקומית
+            response = (
+                f"<b>נוסף:</b> {html.escape(food_text)} – {calories} קלוריות\n"
+                f"<b>סה\"כ היום:</b> {total_eaten + calories} קלוריות\n"
+                f"<b>נשארו:</b> {remaining - calories} קלוריות"
+            )
+        else:
             diet = ", ".join(user.get("diet", []))
             allergies = ", ".join(user.get("allergies", []))
+            # התיאור המנוקה נשמר ברשומה בזמן ההוספה, כדי לא לנקות מחדש את כל היום בכל דיווח
             eaten_today = ", ".join(
-                [clean_desc(e["desc"]) for e in user.get("eaten_today", [])]
+                e.get("desc_clean") or clean_desc(e["desc"])
+                for e in user.get("eaten_today", ())
             )
-            
+
             prompt = f"""המשתמש/ת כתב/ה: "{food_text}"
 
 זה נראה כמו דיווח אכילה. אנא:
@@ -2235,6 +2113,7 @@ async def eaten(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 2. חשב/י קלוריות מדויקות (במיוחד למשקאות - קולה, מיץ וכו')
 3. הוסף/י את זה למה שנאכל היום
 4. הצג/י סיכום: מה נוסף, כמה קלוריות, סה"כ היום, כמה נשארו
+5. בשורה האחרונה כתוב/י רק: CALORIES: <מספר> - הקלוריות של מה שנוסף עכשיו בלבד (לא הסה"כ ולא התקציב)
 
 מידע על המשתמש/ת:
 - תקציב יומי: {calorie_budget} קלוריות
@@ -2245,60 +2124,42 @@ async def eaten(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 
 הצג תשובה בעברית, עם HTML בלבד (<b>, <i>), בלי Markdown. אל תמציא ערכים - אם אינך בטוח, ציין זאת."""
 
-            response = await call_gpt(prompt)
-            
-            if response:
-                try:
-                    await update.message.reply_text(response, parse_mode="HTML")
-                    
-                    # Try to extract calories from GPT response
-                    calorie_match = re.search(r"(\d+)\s*קלוריות?", response)
-                    if calorie_match:
-                        calories = int(calorie_match.group(1))
-                        if "eaten_today" not in user:
-                            user["eaten_today"] = []
-                        user["eaten_today"].append({"desc": food_text, "calories": calories})
-                        user["remaining_calories"] = remaining - calories
-                        
-                        # Save to database
-                        if user_id:
-                            nutrition_db.save_user(user_id, user)
-                except Exception as e:
-                    logger.error("Error processing food input: %s", e)
-                    try:
-                        await update.message.reply_text(
-                            "תודה על הדיווח! עיבדתי את המידע.",
-                            parse_mode="HTML",
-                        )
-                    except Exception as e:
-                        logger.error("Telegram API error in reply_text: %s", e)
+            if silent:
+                response = await call_gpt(prompt)
             else:
-                try:
-                    await update.message.reply_text(
-                        "תודה על הדיווח! עיבדתי את המידע.",
-                        parse_mode="HTML",
-                    )
-                except Exception as e:
-                    logger.error("Telegram API error in reply_text: %s", e)
-                
-        except Exception as e:
-            logger.error("Error processing food input: %s", e)
-            try:
-                await update.message.reply_text(
-                    "תודה על הדיווח! עיבדתי את המידע.",
-                    parse_mode="HTML",
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
-    
-    return EATEN
+                # מזרימים את התשובה להודעה שמתעדכנת, במקום לחכות לתשובה המלאה
+                response, shown = await _stream_gpt_reply(update, prompt, hide_re=_ITEM_CALORIES_RE)
+            # קלוריות הפריט נלקחות רק משורת ה-CALORIES; בלעדיה לא רושמים ולא שומרים במטמון
+            calorie_match = _ITEM_CALORIES_RE.search(response) if response else None
+            if calorie_match:
+                calories = int(calorie_match.group(1))
+                _cache_food_calories(cache_key, calories)
+            if response:
+                response = _ITEM_CALORIES_RE.sub("", response).strip()
+
+        if calories is not None:
+            user.setdefault("eaten_today", []).append(
+                {"desc": food_text, "desc_clean": clean_desc(food_text), "calories": calories}
+            )
+            user["remaining_calories"] = remaining - calories
+            # Save to database
+            if user_id:
+                _mark_dirty(user_id, user)
+    except Exception as e:
+        logger.error("Error processing food input: %s", e)
+        response = None
+
+    if silent or shown:
+        return
+    await _safe(update.message.reply_text(
+        response or "תודה על הדיווח! עיבדתי את המידע.",
+        parse_mode="HTML",
+    ))
 
 
 async def handle_daily_choice(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> int:
-    if context.user_data is None:
-        context.user_data = {}
     if not update.message or not update.message.text:
         return MENU
     choice = update.message.text.strip()
@@ -2347,26 +2208,15 @@ async def handle_daily_choice(
             )
         return MENU
     elif choice == "קבלת דוח":
-        keyboard = [
-            [InlineKeyboardButton("📊 סיכום יומי", callback_data="report_daily")],
-            [InlineKeyboardButton("📅 סיכום שבועי", callback_data="report_weekly")],
-            [InlineKeyboardButton("🗓 סיכום חודשי", callback_data="report_monthly")],
-            [InlineKeyboardButton("🧠 פידבק חכם", callback_data="report_smart_feedback")],
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = _REPORT_TYPES_KB
         if update.message:
             await update.message.reply_text(
                 gendered_text("📊 בחר סוג דוח:", "📊 בחרי סוג דוח:", context),
                 reply_markup=reply_markup,
                 parse_mode="HTML",
             )
-            # הצג תפריט ראשי אחרי הדוח
-            from utils import build_main_keyboard
-            await update.message.reply_text(
-                "התפריט הראשי:",
-                reply_markup=build_main_keyboard(user_data=context.user_data),
-                parse_mode="HTML"
-            )
+            # מקלדת התפריט הראשי נשארת מוצגת מההודעה הקודמת (מקלדת inline
+            # לא מחליפה אותה), כך שאין צורך לשלוח אותה שוב
         return MENU
     elif choice == "עדכון פרטים אישיים":
         await handle_update_personal_details(update, context)
@@ -2388,13 +2238,15 @@ async def show_today_food_summary(update: Update, context: ContextTypes.DEFAULT_
     if not update.message:
         return
         
-    user_id = update.effective_user.id if update.effective_user else None
+    user_id = _effective_user_id(update)
     if not user_id:
         return
         
     try:
         # קבל את יומן האכילה של היום
-        food_log = nutrition_db.get_food_log(user_id, date.today().isoformat())
+        food_log = await asyncio.to_thread(
+            nutrition_db.get_food_log, user_id, today_iso()
+        )
         
         if not food_log:
             # אין נתונים להיום
@@ -2405,7 +2257,9 @@ async def show_today_food_summary(update: Update, context: ContextTypes.DEFAULT_
             return
             
         # קבל סיכום יומי
-        daily_summary = nutrition_db.get_daily_summary(user_id, date.today().isoformat())
+        daily_summary = await asyncio.to_thread(
+            nutrition_db.get_daily_summary, user_id, today_iso()
+        )
         
         # בנה הודעת סיכום
         summary_text = f"📊 <b>סיכום יומי - {date.today().strftime('%d/%m/%Y')}</b>\n\n"
@@ -2472,8 +2326,6 @@ async def handle_meal_building(update: Update, context: ContextTypes.DEFAULT_TYP
     )
     
     # שמור מצב - המשתמש עכשיו מחכה להזנת רכיבים
-    if context.user_data is None:
-        context.user_data = {}
     context.user_data['waiting_for_ingredients'] = True
     # איפוס כפתור התפריט היומי כדי שיופיע מחר
     context.user_data['menu_sent_today'] = False
@@ -2481,8 +2333,6 @@ async def handle_meal_building(update: Update, context: ContextTypes.DEFAULT_TYP
 
 
 async def send_summary(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if context.user_data is None:
-        context.user_data = {}
     user = context.user_data
     # בדוק אם יש טקסט צריכה בהודעה של 'סיימתי'
     if update.message and update.message.text:
@@ -2496,10 +2346,12 @@ async def send_summary(update: Update, context: ContextTypes.DEFAULT_TYPE):
             if extra:
                 await handle_food_consumption(update, context, extra, silent=True)
     food_log = user.get("daily_food_log", [])
+    # דיווחי אכילה בטקסט חופשי (eaten / "סיימתי <מאכל>") נרשמים ב-eaten_today
+    reported = user.get("eaten_today", [])
     calorie_budget = user.get("calorie_budget", 0)
     calories_consumed = user.get("calories_consumed", 0)
     # אם אין צריכה כלל - אל תאפשר סיכום
-    if not food_log and calories_consumed == 0:
+    if not food_log and not reported and calories_consumed == 0:
         if update.message:
             await update.message.reply_text(
                 "לא ניתן לסיים את היום לפני שהוזנה לפחות ארוחה אחת.",
@@ -2507,15 +2359,19 @@ async def send_summary(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
         return
     # פירוט ארוחות עיקריות עם אימוג'י
-    if food_log:
+    if food_log or reported:
         from utils import get_food_emoji
-        eaten_lines = []
-        for item in food_log:
-            # נסה לקבל אימוג'י מהפריט עצמו, אחרת השתמש בפונקציה
-            emoji = item.get('emoji', get_food_emoji(item['name']))
-            eaten_lines.append(f"• {emoji} <b>{item['name']}</b> (<b>{item['calories']}</b> קלוריות)")
-        eaten = "\n".join(eaten_lines)
-        total_eaten = sum(item["calories"] for item in food_log)
+        # אימוג'י מהפריט עצמו אם יש, אחרת לפי שם המאכל
+        lines = [
+            f"• {item.get('emoji') or get_food_emoji(item['name'])} <b>{item['name']}</b> (<b>{item['calories']}</b> קלוריות)"
+            for item in food_log
+        ]
+        lines.extend(
+            f"• {get_food_emoji(entry['desc'])} <b>{html.escape(entry['desc'])}</b> (<b>{entry['calories']}</b> קלוריות)"
+            for entry in reported
+        )
+        eaten = "\n".join(lines)
+        total_eaten = sum(map(_get_calories, food_log)) + sum(map(_get_calories, reported))
     else:
         eaten = "לא דווח"
         total_eaten = 0
@@ -2543,16 +2399,8 @@ async def send_summary(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f'<b>המלצה למחר:</b> {recommendation}'
     )
     if update.message:
-        try:
-            await update.message.reply_text(summary, parse_mode="HTML")
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+        await _safe(update.message.reply_text(summary, parse_mode="HTML"))
     # שלב 2: שאלה על שעת שליחת תפריט יומי
-    hour_buttons = [
-        [KeyboardButton("06:00"), KeyboardButton("07:00")],
-        [KeyboardButton("08:00"), KeyboardButton("09:00")],
-        [KeyboardButton("מעדיפה לבקש לבד")],
-    ]
     gender = user.get("gender", "נקבה")
     ask_time_text = gendered_text(
         "באיזו שעה לשלוח לך את התפריט היומי מחר?",
@@ -2560,14 +2408,11 @@ async def send_summary(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context
     )
     if update.message:
-        try:
-            await update.message.reply_text(
-                ask_time_text,
-                reply_markup=ReplyKeyboardMarkup(hour_buttons, resize_keyboard=True),
-                parse_mode="HTML",
-            )
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+        await _safe(update.message.reply_text(
+            ask_time_text,
+            reply_markup=_MENU_HOUR_KB,
+            parse_mode="HTML",
+        ))
     
     # החזר מצב SCHEDULE כדי שהמשתמש יוכל לבחור שעה
     from config import SCHEDULE
@@ -2579,11 +2424,10 @@ async def send_summary(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # איפוס כפתור התפריט היומי כדי שיופיע מחר
     user["menu_sent_today"] = False
     user["menu_sent_date"] = ""
-    from datetime import date
-    user["last_reset_date"] = date.today().isoformat()
-    user_id = update.effective_user.id if update.effective_user else None
+    user["last_reset_date"] = today_iso()
+    user_id = _effective_user_id(update)
     if user_id:
-        nutrition_db.save_user(user_id, user)
+        _mark_dirty(user_id, user)
     # שלב 4: פידבק חיובי
     feedback = gendered_text(
         "כל הכבוד שסיימת את היום! 💪",
@@ -2591,10 +2435,7 @@ async def send_summary(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context
     )
     if update.message:
-        try:
-            await update.message.reply_text(feedback, parse_mode="HTML", reply_markup=ReplyKeyboardRemove())
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+        await _safe(update.message.reply_text(feedback, parse_mode="HTML", reply_markup=_REMOVE_KB))
     # שלב 5: שלח pin חדש לתקציב
     try:
         chat = update.effective_chat
@@ -2629,12 +2470,10 @@ async def send_summary(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def schedule_menu(
         update: Update,
         context: ContextTypes.DEFAULT_TYPE) -> int:
-    if context.user_data is None:
-        context.user_data = {}
     if not update.message or not update.message.text:
         return SCHEDULE
     time = update.message.text.strip()
-    user_id = update.effective_user.id if update.effective_user else None
+    user_id = _effective_user_id(update)
     if time in ["06:00", "07:00", "08:00", "09:00"]:
         context.user_data["preferred_menu_hour"] = time
         context.user_data["daily_menu_enabled"] = True
@@ -2663,16 +2502,13 @@ async def schedule_menu(
     if user_id:
         from datetime import datetime
         context.user_data["last_menu_schedule_update"] = datetime.now().isoformat()
-        nutrition_db.save_user(user_id, context.user_data)
+        _mark_dirty(user_id, context.user_data)
     if update.message:
-        try:
-            await update.message.reply_text(
-                msg,
-                reply_markup=ReplyKeyboardRemove(),
-                parse_mode="HTML",
-            )
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+        await _safe(update.message.reply_text(
+            msg,
+            reply_markup=_REMOVE_KB,
+            parse_mode="HTML",
+        ))
     
     # איפוס כפתור התפריט היומי כדי שיופיע מחר
     context.user_data["menu_sent_today"] = False
@@ -2697,8 +2533,6 @@ async def schedule_menu(
 async def check_dessert_permission(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> int:
-    if context.user_data is None:
-        context.user_data = {}
     if not update.message or not update.message.text:
         return ConversationHandler.END
     choice = update.message.text.strip()
@@ -2712,8 +2546,6 @@ async def check_dessert_permission(
 async def after_questionnaire(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> int:
-    if context.user_data is None:
-        context.user_data = {}
     # Set flow state to tracking and setup_complete with day count
     context.user_data["flow"] = {
         "stage": "tracking", 
@@ -2725,76 +2557,84 @@ async def after_questionnaire(
     return ConversationHandler.END
 
 
+# מילות שאלה בתחילת טקסט חופשי - tuple עבור str.startswith עם כמה קידומות
+_QUESTION_PREFIXES = ("מה", "האם", "כמה", "איך", "מתי", "איפה", "למה", "מי")
+# מילות מזון מוכרות לזיהוי רשימת מאכלים
+_FOOD_WORDS = frozenset((
+    "לחם",
+    "חלב",
+    "ביצה",
+    "עוף",
+    "בשר",
+    "דג",
+    "אורז",
+    "פסטה",
+    "תפוח",
+    "בננה",
+    "עגבניה",
+    "מלפפון",
+    "גזר",
+    "בטטה",
+    "תות",
+    "ענבים",
+    "אבוקדו",
+    "שקדים",
+    "אגוזים",
+    "יוגורט",
+    "גבינה",
+    "קוטג",
+    "חמאה",
+    "שמן",
+    "מלח",
+    "פלפל",
+    "סוכר",
+    "קפה",
+    "תה",
+    "מים",
+    "מיץ",
+    "שוקו",
+    "גלידה",
+    "עוגה",
+    "ביסקוויט",
+    "קרקר",
+    "חטיף",
+    "שוקולד",
+    "ממתק",
+    "פיצה",
+    "המבורגר",
+    "סושי",
+    "סלט",
+    "מרק",
+    "קציצה",
+    "שניצל",
+    "סטייק",
+    "פאייה",
+))
+
+
 def classify_text_input(text: str) -> str:
-    """מסווג טקסט חופשי לקטגוריות."""
-    text_lower = text.lower().strip()
+    """מסווג טקסט חופשי לקטגוריות. מצפה לטקסט שכבר עבר strip אצל הקורא."""
+    if not text:
+        return "other"
+    text_lower = text.lower()
 
     # בדיקה אם זו שאלה
-    question_words = ["מה", "האם", "כמה", "איך", "מתי", "איפה", "למה", "מי"]
-    if any(
-        text_lower.startswith(word) for word in question_words
-    ) or text_lower.endswith("?"):
+    if text_lower.startswith(_QUESTION_PREFIXES) or text_lower.endswith("?"):
         return "question"
 
     # בדיקה אם זו רשימת מאכלים (פסיקים או ריבוי מילים מוכרות)
-    food_words = [
-        "לחם",
-        "חלב",
-        "ביצה",
-        "עוף",
-        "בשר",
-        "דג",
-        "אורז",
-        "פסטה",
-        "תפוח",
-        "בננה",
-        "עגבניה",
-        "מלפפון",
-        "גזר",
-        "בטטה",
-        "תות",
-        "ענבים",
-        "אבוקדו",
-        "שקדים",
-        "אגוזים",
-        "יוגורט",
-        "גבינה",
-        "קוטג",
-        "חמאה",
-        "שמן",
-        "מלח",
-        "פלפל",
-        "סוכר",
-        "קפה",
-        "תה",
-        "מים",
-        "מיץ",
-        "חלב",
-        "שוקו",
-        "גלידה",
-        "עוגה",
-        "ביסקוויט",
-        "קרקר",
-        "חטיף",
-        "שוקולד",
-        "ממתק",
-        "פיצה",
-        "המבורגר",
-        "סושי",
-        "סלט",
-        "מרק",
-        "קציצה",
-        "שניצל",
-        "סטייק",
-        "פאייה",
-        "פסטה",
-    ]
-
     words = text_lower.split()
-    food_word_count = sum(1 for word in words if word in food_words)
-
-    # אם יש פסיקים או ריבוי מילים מוכרות
-    if "," in text or "ו" in text or food_word_count >= 2:
+    # ספירה במעבר אחד ברמת C (map על בדיקת שייכות לסט) במקום generator בפייתון
+    food_word_count = sum(map(_FOOD_WORDS.__contains__, words))
+
+    # אם יש פסיקים, "ו" החיבור כמילה בפני עצמה או כתחילית של מאכל מוכר
+    # ("ולחם"), או ריבוי מילים מוכרות. בדיקת "ו" בכל מקום בטקסט תפסה כמעט
+    # כל משפט בעברית ושלחה אותו לעיבוד כדיווח אכילה.
+    if (
+        "," in text
+        or food_word_count >= 2
+        or any(w == "ו" or (w[0] == "ו" and w[1:] in _FOOD_WORDS) for w in words)
+    ):
         return "food_list"
 
     # אם יש מילה אחת מוכרת
@@ -2815,6 +2655,8 @@ async def handle_free_text_input(
         return
     
     text = update.message.text.strip()
+    if not text:
+        return
     logger.info(f"[FREE_TEXT] Processing text for user {user_id}: '{text[:50]}...'")
     
     # זיהוי משפטים שמתחילים ב"אכלתי", "שתיתי", "נשנשתי", "טעמתי"
@@ -2831,8 +2673,6 @@ async def handle_free_text_input(
         return
     
     # ודא ש-context.user_data הוא dict
-    if context.user_data is None:
-        context.user_data = {}
     # כל טקסט חופשי אחר – נסה fallback חכם עם GPT
     result = await fallback_via_gpt(text, context.user_data)
     if result.get("action") == "consume":
@@ -2841,21 +2681,17 @@ async def handle_free_text_input(
         amount = result.get("amount", "")
         calories = result.get("calories", 0)
         # עדכון יומן הארוחות
-        if "daily_food_log" not in context.user_data:
-            context.user_data["daily_food_log"] = []
         emoji = result.get("emoji", "🍽️")
-        context.user_data["daily_food_log"].append({
+        context.user_data.setdefault("daily_food_log", []).append({
             "name": f"{item} ({amount})",
             "calories": calories,
             "emoji": emoji,
             "timestamp": datetime.now().isoformat(),
         })
-        if "calories_consumed" not in context.user_data:
-            context.user_data["calories_consumed"] = 0
-        context.user_data["calories_consumed"] += calories
-        user_id = update.effective_user.id if update.effective_user else None
+        context.user_data["calories_consumed"] = context.user_data.get("calories_consumed", 0) + calories
+        user_id = _effective_user_id(update)
         if user_id:
-            nutrition_db.save_user(user_id, context.user_data)
+            _mark_dirty(user_id, context.user_data)
         # שלח אישור
         emoji = result.get("emoji", "🍽️")
         await update.message.reply_text(f"נרשמה צריכה: {emoji} {item} ({amount}) – {calories} קלוריות.")
@@ -2873,20 +2709,8 @@ async def handle_free_text_input(
 
 
 async def handle_food_consumption(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str, silent: bool = False):
-    if context.user_data is None:
-        context.user_data = {}
-    user = context.user_data
-    try:
-        # parsing רגיל (הקוד הקיים שלך)
-        # ... existing code ...
-        pass
-    except Exception:
-        # שלח את הטקסט ל-GPT לניתוח
-        try:
-            response = await call_gpt(f"המשתמש כתב: {text}\nאנא נתח את הקלט, זהה מאכלים וכמויות, חשב קלוריות, והצג סיכום בעברית.")
-            await update.message.reply_text(response, parse_mode="HTML")
-        except Exception as e:
-            logger.error("GPT fallback failed: %s", e)
+    """רושם צריכת מזון מטקסט חופשי ("אכלתי ...") דרך אותו עיבוד של דיווח אכילה."""
+    await _process_food_report(update, context, text, silent=silent)
 
 
 async def handle_nutrition_question(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
@@ -2907,31 +2731,25 @@ async def handle_nutrition_question(update: Update, context: ContextTypes.DEFAUL
         response = await call_gpt(prompt)
         
         if response:
-            try:
-                await update.message.reply_text(
-                    response,
-                    parse_mode=None
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
+            await _safe(update.message.reply_text(
+                response,
+                parse_mode=None
+            ))
         else:
-            try:
-                await update.message.reply_text(
-                    "לא הצלחתי למצוא תשובה לשאלה שלך. נסה לשאול בצורה אחרת.",
-                    parse_mode="HTML"
-                )
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
+            await _safe(update.message.reply_text(
+                "לא הצלחתי למצוא תשובה לשאלה שלך. נסה לשאול בצורה אחרת.",
+                parse_mode="HTML"
+            ))
                 
     except Exception as e:
         logger.error(f"Error handling nutrition question: {e}")
-        try:
-            await update.message.reply_text(
-                "אירעה שגיאה בחיפוש התשובה. נסה שוב.",
-                parse_mode="HTML"
-            )
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+        await _safe(update.message.reply_text(
+            "אירעה שגיאה בחיפוש התשובה. נסה שוב.",
+            parse_mode="HTML"
+        ))
+
+
+_NUMBER_RE = re.compile(r"\d+")
 
 
 async def estimate_food_calories(food_desc: str) -> int:
@@ -2946,10 +2764,9 @@ async def estimate_food_calories(food_desc: str) -> int:
         
         if response:
             # חלץ מספר מהתשובה
-            import re
-            numbers = re.findall(r'\d+', response)
-            if numbers:
-                return int(numbers[0])
+            match = _NUMBER_RE.search(response)
+            if match:
+                return int(match.group())
         
         # אם לא הצליח - החזר ערך ברירת מחדל
         return 200
@@ -2960,81 +2777,40 @@ async def estimate_food_calories(food_desc: str) -> int:
 
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if context.user_data is None:
-        context.user_data = {}
-    help_text = """
-🤖 <b>עזרה - בוט התזונה קלוריקו</b>
-
-<b>פקודות זמינות:</b>
-/start - התחלת הבוט
-/help - הצגת עזרה זו
-
-<b>פונקציות עיקריות:</b>
-• שאלון התאמה אישית
-• תפריטים יומיים מותאמים
-• מעקב אחרי ארוחות
-• תזכורות שתיית מים
-• דוחות תזונתיים
-
-<b>תמיכה:</b>
-אם יש לך שאלות, פשוט כתוב לי!
-    """
     if update.message:
-        try:
-            await update.message.reply_text(help_text, parse_mode="HTML")
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
+        await _safe(update.message.reply_text(_HELP_TEXT, parse_mode="HTML"))
 
 
 async def generate_personalized_menu(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ):
-    user_data = context.user_data or {}
+    user_data = context.user_data
     if not update.message:
         return
     try:
-        # שלח הודעת המתנה מיד
-        try:
-            await update.message.reply_text("מכין לך את התפריט היומי... רגע... ⏳")
-        except Exception as e:
-            logger.error("Telegram API error in reply_text: %s", e)
-        
-        # בניית התפריט היומי
+        # בניית התפריט היומי - הודעת ההמתנה מתעדכנת בזמן ש-GPT כותב את התפריט
         prompt = build_user_prompt_for_gpt(user_data)
-        menu_response = await call_gpt(prompt)
+        menu_response, shown = await _stream_gpt_reply(
+            update, prompt, "מכין לך את התפריט היומי... רגע... ⏳", cache=True
+        )
+        if menu_response and not shown:
+            for chunk in _split_message(menu_response):
+                await _send_html(update.message.reply_text, chunk, "reply_text")
         
+        # אחרי שליחת התפריט - שמור שהתפריט נשלח היום (לא אם ה-stream נקטע)
         if menu_response:
-            try:
-                await update.message.reply_text(menu_response, parse_mode="HTML")
-            except Exception as e:
-                logger.error("Telegram API error in reply_text: %s", e)
-        
-        # אחרי שליחת התפריט - שמור שהתפריט נשלח היום
-        from datetime import date
-        user_data['menu_sent_today'] = True
-        user_data['menu_sent_date'] = date.today().isoformat()
-        # עדכן גם את context.user_data
-        if context.user_data is None:
-            context.user_data = {}
-        context.user_data['menu_sent_today'] = True
-        context.user_data['menu_sent_date'] = date.today().isoformat()
-        user_id = update.effective_user.id if update.effective_user else None
-        if user_id:
-            nutrition_db.save_user(user_id, user_data)
+            user_data['menu_sent_today'] = True
+            user_data['menu_sent_date'] = today_iso()
+            user_id = _effective_user_id(update)
+            if user_id:
+                # השמירה מתבצעת ברקע כדי לא לעכב את התשובה למשתמש
+                _mark_dirty(user_id, user_data)
         # הצג תפריט ראשי ללא כפתור תפריט יומי
-        from utils import build_main_keyboard
         await update.message.reply_text(
             "התפריט הראשי:",
-            reply_markup=build_main_keyboard(user_data=context.user_data),
+            reply_markup=build_main_keyboard(user_data=user_data),
             parse_mode="HTML"
         )
-        
-        # הצג תפריט ראשי ללא כפתור תפריט יומי
-        from utils import build_main_keyboard
-        await update.message.reply_text(
-            "התפריט הראשי:",
-            reply_markup=build_main_keyboard(user_data=user_data)
-        )
     except Exception as e:
         logger.error("Error generating personalized menu: %s", e)
     # שלח הודעת הדרכה מה עכשיו
@@ -3042,26 +2818,37 @@ async def generate_personalized_menu(
     await send_contextual_guidance(update, context)
 
 
-def build_activity_types_keyboard(selected_types: list = None) -> InlineKeyboardMarkup:
-    """בונה inline keyboard לבחירת סוגי פעילות מרובים."""
-    if selected_types is None:
-        selected_types = []
-    
+def _activity_callback_key(activity: str) -> str:
+    """מחזיר את מזהה הפעילות ל-callback_data (ללא רווחים ואימוג'י)."""
+    return activity.translate(_ACTIVITY_KEY_TABLE).strip()
+
+
+# מזהי ה-callback של סוגי הפעילות מחושבים פעם אחת בטעינת המודול
+_ACTIVITY_CLEAN = tuple(map(_activity_callback_key, ACTIVITY_TYPES_MULTI))
+_ACTIVITY_BY_CLEAN = dict(zip(_ACTIVITY_CLEAN, ACTIVITY_TYPES_MULTI))
+# לכל פעילות: (פעילות, טקסט כשנבחרה, callback להוספה, callback להסרה)
+_ACTIVITY_BUTTONS = tuple(
+    (activity, f"{activity} ❌", f"activity_add_{clean}", f"activity_remove_{clean}")
+    for activity, clean in zip(ACTIVITY_TYPES_MULTI, _ACTIVITY_CLEAN)
+)
+
+
+def build_activity_types_keyboard(selected_types=None) -> InlineKeyboardMarkup:
+    """בונה inline keyboard לבחירת סוגי פעילות מרובים (מרשימה או מ-set של הבחירות)."""
+    return _build_activity_types_keyboard(frozenset(selected_types or ()))
+
+
+@lru_cache(maxsize=512)
+def _build_activity_types_keyboard(selected_types: frozenset) -> InlineKeyboardMarkup:
+    # המקלדת תלויה רק בקבוצת הפעילויות שנבחרו, כך שאפשר לשתף אותה בין משתמשים
     keyboard = []
-    for activity in ACTIVITY_TYPES_MULTI:
-        # השתמש בטקסט המלא של הפעילות ב-callback_data
-        activity_clean = activity.replace(" ", "_").replace("🏃", "").replace("🚶", "").replace("🚴", "").replace("🏊", "").replace("🏋️", "").replace("🧘", "").replace("🤸", "").replace("❓", "").strip()
-        
+    for activity, selected_text, add_cb, remove_cb in _ACTIVITY_BUTTONS:
         if activity in selected_types:
             # אם נבחר - הצג עם ❌
-            text = f"{activity} ❌"
-            callback_data = f"activity_remove_{activity_clean}"
+            keyboard.append([InlineKeyboardButton(selected_text, callback_data=remove_cb)])
         else:
             # אם לא נבחר - הצג עם האימוג'י המקורי
-            text = activity
-            callback_data = f"activity_add_{activity_clean}"
-        
-        keyboard.append([InlineKeyboardButton(text, callback_data=callback_data)])
+            keyboard.append([InlineKeyboardButton(activity, callback_data=add_cb)])
     
     # כפתור "סיימתי" - מופיע רק אם יש לפחות בחירה אחת
     if selected_types:
@@ -3078,27 +2865,21 @@ async def handle_activity_types_selection(update: Update, context: ContextTypes.
     query = update.callback_query
     await query.answer()
     
-    if context.user_data is None:
-        context.user_data = {}
-    
-    # אתחל רשימת סוגי פעילות אם לא קיימת
-    if "activity_types" not in context.user_data:
-        context.user_data["activity_types"] = []
     
-    selected_types = context.user_data["activity_types"]
+    # אתחל רשימת סוגי פעילות אם לא קיימת. ב-user_data נשמרת רשימה (לסדר הבחירה
+    # ול-JSON), ובדיקות השייכות ובניית המקלדת נעשות מול frozenset שלה
+    selected_types = context.user_data.setdefault("activity_types", [])
+    selected_set = frozenset(selected_types)
     
     if query.data == "activity_done":
         # המשתמש סיים בחירה - המשך לשלב הבא
         if not selected_types:
             # אם לא נבחר כלום, חזור לתפריט עם הודעת שגיאה
             keyboard = build_activity_types_keyboard(selected_types)
-            try:
-                await query.edit_message_text(
-                    "יש לבחור לפחות סוג פעילות אחד לפני המשך.",
-                    reply_markup=keyboard
-                )
-            except Exception as e:
-                logger.error("Telegram API error in edit_message_text: %s", e)
+            await _safe(query.edit_message_text(
+                "יש לבחור לפחות סוג פעילות אחד לפני המשך.",
+                reply_markup=keyboard
+            ), "edit_message_text")
             return ACTIVITY_TYPES_SELECTION
         # נסה להסתיר את המקלדת אם יש אחת
         try:
@@ -3114,82 +2895,41 @@ async def handle_activity_types_selection(update: Update, context: ContextTypes.
     
     elif query.data.startswith("activity_add_"):
         # הוסף סוג פעילות
-        activity_clean = query.data.replace("activity_add_", "")
-        for activity in ACTIVITY_TYPES_MULTI:
-            activity_clean_check = activity.replace(" ", "_").replace("🏃", "").replace("🚶", "").replace("🚴", "").replace("��", "").replace("🏋️", "").replace("🧘", "").replace("🤸", "").replace("❓", "").strip()
-            if activity_clean_check == activity_clean:
-                if activity not in selected_types:
-                    selected_types.append(activity)
-                    context.user_data["activity_types"] = selected_types
-                    # שלח הודעה מהצד של המשתמש
-                    try:
-                        await query.message.reply_text(f"בחרת: {activity}")
-                    except Exception as e:
-                        logger.error("Telegram API error in reply_text: %s", e)
-                break
+        activity = _ACTIVITY_BY_CLEAN.get(query.data.replace("activity_add_", ""))
+        if activity and activity not in selected_set:
+            selected_types.append(activity)
+            selected_set = selected_set | {activity}
+            context.user_data["activity_types"] = selected_types
+            # שלח הודעה מהצד של המשתמש
+            await _safe(query.message.reply_text(f"בחרת: {activity}"))
     
     elif query.data.startswith("activity_remove_"):
         # הסר סוג פעילות
-        activity_clean = query.data.replace("activity_remove_", "")
-        for activity in ACTIVITY_TYPES_MULTI:
-            activity_clean_check = activity.replace(" ", "_").replace("🏃", "").replace("🚶", "").replace("🚴", "").replace("🏊", "").replace("🏋️", "").replace("🧘", "").replace("🤸", "").replace("❓", "").strip()
-            if activity_clean_check == activity_clean:
-                if activity in selected_types:
-                    selected_types.remove(activity)
-                    context.user_data["activity_types"] = selected_types
-                    # שלח הודעה מהצד של המשתמש
-                    try:
-                        await query.message.reply_text(f"הסרת: {activity}")
-                    except Exception as e:
-                        logger.error("Telegram API error in reply_text: %s", e)
-                break
+        activity = _ACTIVITY_BY_CLEAN.get(query.data.replace("activity_remove_", ""))
+        if activity and activity in selected_set:
+            selected_types.remove(activity)
+            selected_set = selected_set - {activity}
+            context.user_data["activity_types"] = selected_types
+            # שלח הודעה מהצד של המשתמש
+            await _safe(query.message.reply_text(f"הסרת: {activity}"))
     
-    # עדכן את התפריט
-    keyboard = build_activity_types_keyboard(selected_types)
-    try:
-        await query.edit_message_reply_markup(reply_markup=keyboard)
-    except Exception as e:
-        logger.error("Telegram API error in edit_message_reply_markup: %s", e)
+    # עדכן את התפריט - רק אם הוא שונה מהמוצג (לחיצה כפולה או callback ישן
+    # מחזירים את אותה מקלדת, ו-Telegram היה דוחה את העריכה כ-"not modified")
+    keyboard = build_activity_types_keyboard(selected_set)
+    if query.message and query.message.reply_markup == keyboard:
+        return ACTIVITY_TYPES_SELECTION
+    await _safe(query.edit_message_reply_markup(reply_markup=keyboard), "edit_message_reply_markup")
     
     return ACTIVITY_TYPES_SELECTION
 
 
 async def process_activity_types(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """מעבד את סוגי הפעילות שנבחרו ועובר לשאלות הספציפיות."""
-    if context.user_data is None:
-        context.user_data = {}
     
     selected_types = context.user_data.get("activity_types", [])
     if not selected_types:
         # אם אין בחירות, המשך לתזונה
-        keyboard = [[KeyboardButton(opt)] for opt in DIET_OPTIONS]
-        gender = context.user_data.get("gender", "זכר")
-        if gender == "נקבה":
-            diet_text = "מה העדפות התזונה שלך? (בחרי כל מה שמתאים)"
-        elif gender == "זכר":
-            diet_text = "מה העדפות התזונה שלך? (בחר כל מה שמתאים)"
-        else:
-            diet_text = "מה העדפות התזונה שלך? (בחר/י כל מה שמתאים)"
-        try:
-            if update.callback_query:
-                await update.callback_query.message.reply_text(
-                    diet_text,
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-            elif update.message:
-                await update.message.reply_text(
-                    diet_text,
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-        except Exception as e:
-            logger.error("Telegram API error in process_activity_types: %s", e)
-        return DIET
+        return await _ask_diet(update, context)
     
     # שמור את הסוג הראשון לעיבוד
     current_activity = selected_types[0]
@@ -3199,166 +2939,40 @@ async def process_activity_types(update: Update, context: ContextTypes.DEFAULT_T
     return await route_to_activity_questions(update, context, current_activity)
 
 
+# ניתוב שאלות ההמשך לפי סוג פעילות (ללא אימוג'י): (מקלדת, מזהה טקסט ב-_PROMPTS,
+# המצב הבא בשיחה). פעילות שלא מופיעה בטבלה מקבלת את הנתיב של "אחר".
+_ACTIVITY_QUESTION_ROUTES = {
+    "ריצה": (_ACTIVITY_FREQUENCY_KB, "freq_running", ACTIVITY_FREQUENCY),
+    "אימוני כוח": (_ACTIVITY_FREQUENCY_KB, "freq_strength", ACTIVITY_FREQUENCY),
+    "הליכה": (_ACTIVITY_FREQUENCY_KB, "freq_perform", ACTIVITY_FREQUENCY),
+    "אופניים": (_ACTIVITY_FREQUENCY_KB, "freq_perform", ACTIVITY_FREQUENCY),
+    "שחייה": (_ACTIVITY_FREQUENCY_KB, "freq_perform", ACTIVITY_FREQUENCY),
+    "יוגה": (_ACTIVITY_FREQUENCY_KB, "freq_practice", ACTIVITY_FREQUENCY),
+    "פילאטיס": (_ACTIVITY_FREQUENCY_KB, "freq_practice", ACTIVITY_FREQUENCY),
+}
+_OTHER_ACTIVITY_ROUTE = (_ACTIVITY_FREQUENCY_KB, "freq_other", ACTIVITY_FREQUENCY)
+
+
 async def route_to_activity_questions(update: Update, context: ContextTypes.DEFAULT_TYPE, activity_type: str) -> int:
     """מנתב לשאלות הספציפיות לסוג הפעילות."""
     # הסר אימוג'ים מהטקסט לצורך השוואה
-    activity_clean = activity_type.replace("🏃", "").replace("🚶", "").replace("🚴", "").replace("🏊", "").replace("🏋️", "").replace("🧘", "").replace("🤸", "").replace("❓", "").strip()
-    
-    if activity_clean == "ריצה":
-        keyboard = [[KeyboardButton(opt)] for opt in ACTIVITY_FREQUENCY_OPTIONS]
-        gender = context.user_data.get("gender", "זכר")
-        if gender == "נקבה":
-            frequency_text = "כמה פעמים בשבוע את רצה?"
-        elif gender == "זכר":
-            frequency_text = "כמה פעמים בשבוע אתה רץ?"
-        else:
-            frequency_text = "כמה פעמים בשבוע את/ה רץ/ה?"
-        try:
-            if update.callback_query:
-                await update.callback_query.message.reply_text(
-                    frequency_text,
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-            elif update.message:
-                await update.message.reply_text(
-                    frequency_text,
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-        except Exception as e:
-            logger.error("Telegram API error in route_to_activity_questions: %s", e)
-        return ACTIVITY_FREQUENCY
-    
-    elif activity_clean == "אימוני כוח":
-        keyboard = [[KeyboardButton(opt)] for opt in ACTIVITY_FREQUENCY_OPTIONS]
-        gender = context.user_data.get("gender", "זכר")
-        if gender == "נקבה":
-            frequency_text = "כמה פעמים בשבוע את מתאמנת?"
-        elif gender == "זכר":
-            frequency_text = "כמה פעמים בשבוע אתה מתאמן?"
-        else:
-            frequency_text = "כמה פעמים בשבוע את/ה מתאמן/ת?"
-        try:
-            if update.callback_query:
-                await update.callback_query.message.reply_text(
-                    frequency_text,
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-            elif update.message:
-                await update.message.reply_text(
-                    frequency_text,
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-        except Exception as e:
-            logger.error("Telegram API error in route_to_activity_questions: %s", e)
-        return ACTIVITY_FREQUENCY
-    
-    elif activity_clean in ["הליכה", "אופניים", "שחייה"]:
-        keyboard = [[KeyboardButton(opt)] for opt in ACTIVITY_FREQUENCY_OPTIONS]
-        gender = context.user_data.get("gender", "זכר")
-        if gender == "נקבה":
-            frequency_text = f"כמה פעמים בשבוע את מבצעת {activity_clean}?"
-        elif gender == "זכר":
-            frequency_text = f"כמה פעמים בשבוע אתה מבצע {activity_clean}?"
-        else:
-            frequency_text = f"כמה פעמים בשבוע את/ה מבצע/ת {activity_clean}?"
-        try:
-            if update.callback_query:
-                await update.callback_query.message.reply_text(
-                    frequency_text,
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-            elif update.message:
-                await update.message.reply_text(
-                    frequency_text,
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-        except Exception as e:
-            logger.error("Telegram API error in route_to_activity_questions: %s", e)
-        return ACTIVITY_FREQUENCY
-    
-    elif activity_clean in ["יוגה", "פילאטיס"]:
-        keyboard = [[KeyboardButton(opt)] for opt in ACTIVITY_FREQUENCY_OPTIONS]
-        gender = context.user_data.get("gender", "זכר")
-        if gender == "נקבה":
-            frequency_text = f"כמה פעמים בשבוע את מתאמנת {activity_clean}?"
-        elif gender == "זכר":
-            frequency_text = f"כמה פעמים בשבוע אתה מתאמן {activity_clean}?"
-        else:
-            frequency_text = f"כמה פעמים בשבוע את/ה מתאמן/ת {activity_clean}?"
-        try:
-            if update.callback_query:
-                await update.callback_query.message.reply_text(
-                    frequency_text,
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-            elif update.message:
-                await update.message.reply_text(
-                    frequency_text,
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-        except Exception as e:
-            logger.error("Telegram API error in route_to_activity_questions: %s", e)
-        return ACTIVITY_FREQUENCY
-    
-    else:  # "אחר"
-        keyboard = [[KeyboardButton(opt)] for opt in ACTIVITY_FREQUENCY_OPTIONS]
-        gender = context.user_data.get("gender", "זכר")
-        if gender == "נקבה":
-            frequency_text = "כמה פעמים בשבוע את מבצעת פעילות אחרת?"
-        elif gender == "זכר":
-            frequency_text = "כמה פעמים בשבוע אתה מבצע פעילות אחרת?"
-        else:
-            frequency_text = "כמה פעמים בשבוע את/ה מבצע/ת פעילות אחרת?"
-        try:
-            if update.callback_query:
-                await update.callback_query.message.reply_text(
-                    frequency_text,
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-            elif update.message:
-                await update.message.reply_text(
-                    frequency_text,
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-        except Exception as e:
-            logger.error("Telegram API error in route_to_activity_questions: %s", e)
-        return ACTIVITY_FREQUENCY
+    activity_clean = activity_type.translate(_EMOJI_STRIP_TABLE).strip()
+
+    reply_markup, prompt_id, next_state = _ACTIVITY_QUESTION_ROUTES.get(
+        activity_clean, _OTHER_ACTIVITY_ROUTE
+    )
+    text = _prompt(context.user_data.get("gender"), prompt_id).format(activity=activity_clean)
+    message = update.callback_query.message if update.callback_query else update.message
+    if message:
+        await _safe(
+            message.reply_text(text, reply_markup=reply_markup, parse_mode="HTML"),
+            "route_to_activity_questions",
+        )
+    return next_state
 
 
 async def continue_to_next_activity(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """ממשיך לסוג הפעילות הבא או לתזונה אם סיימנו."""
-    if context.user_data is None:
-        context.user_data = {}
     
     selected_types = context.user_data.get("activity_types", [])
     current_index = context.user_data.get("current_activity_index", 0)
@@ -3369,36 +2983,7 @@ async def continue_to_next_activity(update: Update, context: ContextTypes.DEFAUL
     
     if current_index >= len(selected_types):
         # סיימנו את כל סוגי הפעילות - המשך לתזונה
-        keyboard = [[KeyboardButton(opt)] for opt in DIET_OPTIONS]
-        gender = context.user_data.get("gender", "זכר")
-        if gender == "נקבה":
-            diet_text = "מה העדפות התזונה שלך? (בחרי כל מה שמתאים)"
-        elif gender == "זכר":
-            diet_text = "מה העדפות התזונה שלך? (בחר כל מה שמתאים)"
-        else:
-            diet_text = "מה העדפות התזונה שלך? (בחר/י כל מה שמתאים)"
-        
-        try:
-            if update.callback_query:
-                await update.callback_query.edit_message_text(
-                    diet_text,
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-            elif update.message:
-                await update.message.reply_text(
-                    diet_text,
-                    reply_markup=ReplyKeyboardMarkup(
-                        keyboard, one_time_keyboard=True, resize_keyboard=True
-                    ),
-                    parse_mode="HTML",
-                )
-        except Exception as e:
-            logger.error("Telegram API error in continue_to_next_activity: %s", e)
-        
-        return DIET
+        return await _ask_diet(update, context)
     
     # עבור לסוג הפעילות הבא
     next_activity = selected_types[current_index]
@@ -3407,33 +2992,44 @@ async def continue_to_next_activity(update: Update, context: ContextTypes.DEFAUL
     return await route_to_activity_questions(update, context, next_activity)
 
 
+@lru_cache(maxsize=256)
+def _neutral_text(text_male: str) -> str:
+    # הטקסטים קבועים ברובם, כך שההמרה לניטרלי מחושבת פעם אחת לכל טקסט
+    return text_male.replace("אתה", "את/ה").replace("עושה", "עושה/ת").replace("מתאמן", "מתאמן/ת").replace("מבצע", "מבצע/ת").replace("בחר", "בחר/י")
+
+
 def gendered_text(text_male: str, text_female: str, context: ContextTypes.DEFAULT_TYPE) -> str:
     """מחזירה טקסט מגדרי לפי context.user_data['gender']. אם אין מגדר – מחזירה טקסט ניטרלי."""
-    gender = None
-    if hasattr(context, 'user_data') and context.user_data:
-        gender = context.user_data.get('gender')
+    user_data = getattr(context, "user_data", None)
+    gender = user_data.get("gender") if user_data else None
     if gender == "נקבה":
         return text_female
-    elif gender == "זכר":
+    if gender == "זכר":
         return text_male
-    else:
-        # אם אין מגדר, החזר טקסט ניטרלי שמתאים לשני המגדרים
-        return text_male.replace("אתה", "את/ה").replace("עושה", "עושה/ת").replace("מתאמן", "מתאמן/ת").replace("מבצע", "מבצע/ת").replace("בחר", "בחר/י")
+    # אם אין מגדר, החזר טקסט ניטרלי שמתאים לשני המגדרים
+    return _neutral_text(text_male)
 
 
 async def safe_edit_message_text(query, text, reply_markup=None, parse_mode=None):
-    """עורכת טקסט של הודעה ומסירה קודם מקלדת אינליין אם קיימת."""
-    if query.message and query.message.reply_markup and isinstance(query.message.reply_markup, InlineKeyboardMarkup):
-        try:
-            await query.edit_message_reply_markup(reply_markup=InlineKeyboardMarkup([]))
-        except telegram.error.BadRequest as e:
-            logging.warning("Could not edit markup before text edit: %s", e)
+    """עורכת טקסט של הודעה ומחליפה את המקלדת האינליין באותה קריאה.
+
+    editMessageText בלי reply_markup כבר מסיר את המקלדת הקיימת, כך שאין צורך
+    בקריאה נפרדת להסרתה. רק אם הטקסט לא השתנה מעדכנים את המקלדת לבד.
+    """
     kwargs = {"text": text}
     if reply_markup is not None:
         kwargs["reply_markup"] = reply_markup
     if parse_mode is not None:
         kwargs["parse_mode"] = parse_mode
-    await query.edit_message_text(**kwargs)
+    try:
+        await query.edit_message_text(**kwargs)
+    except telegram.error.BadRequest as e:
+        if "not modified" not in str(e):
+            raise
+        try:
+            await query.edit_message_reply_markup(reply_markup=reply_markup)
+        except telegram.error.BadRequest as e:
+            logging.warning("Could not edit markup after unchanged text: %s", e)
 
 
 # יצירת instance של NutritionDB לשימוש בכל הפונקציות
@@ -3457,7 +3053,6 @@ async def pin_single_message(chat, message_id):
 # Stub for personal details update
 async def handle_update_personal_details(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # שלב 1: שאל אם לעדכן הכל
-    keyboard = [[KeyboardButton("כן")], [KeyboardButton("לא")]]
     question = gendered_text(
         "רוצה לעדכן את כל הפרטים האישיים שלך?",
         "רוצה לעדכן את כל הפרטים האישיים שלך?",
@@ -3466,7 +3061,7 @@ async def handle_update_personal_details(update: Update, context: ContextTypes.D
     if update.message:
         await update.message.reply_text(
             question,
-            reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True),
+            reply_markup=_UPDATE_DETAILS_KB,
             parse_mode="HTML",
         )
     # שמור flag לזיהוי
@@ -3480,19 +3075,19 @@ async def handle_update_personal_details_response(update: Update, context: Conte
         return
     if text == "כן":
         # איפוס מלא
-        user_id = update.effective_user.id if update.effective_user else None
+        user_id = _effective_user_id(update)
         context.user_data.clear()
         context.user_data["reset_in_progress"] = True
         if user_id:
             # מחיקת נתונים מה-DB
-            nutrition_db.save_user(user_id, {})
+            await reset_user(user_id)
         # שלח הודעה חמה
         msg = gendered_text(
             "מתחילים הכל מההתחלה! אשאל אותך כמה שאלות קצרות כדי להתאים לך תפריט אישי.",
             "מתחילות הכל מההתחלה! אשאל אותך כמה שאלות קצרות כדי להתאים לך תפריט אישי.",
             context
         )
-        await update.message.reply_text(msg, reply_markup=ReplyKeyboardRemove(), parse_mode="HTML")
+        await update.message.reply_text(msg, reply_markup=_REMOVE_KB, parse_mode="HTML")
         # התחל את השאלון מחדש (כמו start)
         await start(update, context)
         context.user_data.pop("awaiting_reset_confirmation", None)
@@ -3513,21 +3108,26 @@ async def handle_report_request(update: Update, context: ContextTypes.DEFAULT_TY
     query = update.callback_query
     if not query or not query.data:
         return
-    user_id = update.effective_user.id if update.effective_user else None
+    # report_generator מושך את matplotlib - נטען רק כשמבקשים דוח
+    from report_generator import (
+        get_weekly_report,
+        build_weekly_summary_text,
+        get_nutrition_by_date,
+        get_monthly_report,
+        build_monthly_summary_text,
+    )
+    user_id = _effective_user_id(update)
     report_type = query.data.replace('report_', '')
     # שמור בחירה במסד (לניתוח עתידי)
     if user_id:
-        if context.user_data is None:
-            context.user_data = {}
         context.user_data.setdefault('report_requests', []).append({
             'type': report_type,
             'timestamp': datetime.now().isoformat()
         })
-        nutrition_db.save_user(user_id, context.user_data)
+        await _save_user_now(user_id, context.user_data)
     # דוח יומי
     if report_type == 'daily':
-        from datetime import date
-        today = date.today().isoformat()
+        today = today_iso()
         day_data = get_nutrition_by_date(user_id, today)
         if not day_data or not day_data.get('meals'):
             await query.answer()
@@ -3570,7 +3170,7 @@ async def handle_report_request(update: Update, context: ContextTypes.DEFAULT_TY
         summary = build_weekly_summary_text(data)
         # המלצה מ-GPT
         try:
-            prompt = f"המשתמש/ת צרך/ה בממוצע {sum(d['calories'] for d in data)//len(data)} קלוריות ביום בשבוע האחרון. תן המלצה קצרה לשבוע הבא (ב-1-2 משפטים, בעברית, ללא פתיח אישי)."
+            prompt = f"המשתמש/ת צרך/ה בממוצע {sum(map(_get_calories, data))//len(data)} קלוריות ביום בשבוע האחרון. תן המלצה קצרה לשבוע הבא (ב-1-2 משפטים, בעברית, ללא פתיח אישי)."
             from utils import call_gpt
             recommendation = await call_gpt(prompt)
         except Exception as e:
@@ -3594,7 +3194,7 @@ async def handle_report_request(update: Update, context: ContextTypes.DEFAULT_TY
         summary = build_monthly_summary_text(data)
         # המלצה מ-GPT
         try:
-            prompt = f"המשתמש/ת צרך/ה בממוצע {sum(d['calories'] for d in data)//len(data)} קלוריות ביום בחודש האחרון. תן המלצה קצרה לחודש הבא (ב-1-2 משפטים, בעברית, ללא פתיח אישי)."
+            prompt = f"המשתמש/ת צרך/ה בממוצע {sum(map(_get_calories, data))//len(data)} קלוריות ביום בחודש האחרון. תן המלצה קצרה לחודש הבא (ב-1-2 משפטים, בעברית, ללא פתיח אישי)."
             from utils import call_gpt
             recommendation = await call_gpt(prompt)
         except Exception as e:
@@ -3686,7 +3286,7 @@ async def handle_help_action(update: Update, context: ContextTypes.DEFAULT_TYPE)
         # החזר למצב free text (הסר מקלדת)
         await update.message.reply_text(
             gendered_text("אפשר לשאול כל שאלה חופשית!", "אפשר לשאול כל שאלה חופשית!", context),
-            reply_markup=ReplyKeyboardRemove(),
+            reply_markup=_REMOVE_KB,
         )
         return
     elif text == questionnaire_text:
@@ -3722,7 +3322,7 @@ async def handle_ingredients_input(update: Update, context: ContextTypes.DEFAULT
             await update.message.reply_text(response, parse_mode=None)
             
             # שמור את הארוחה במסד
-            user_id = update.effective_user.id if update.effective_user else None
+            user_id = _effective_user_id(update)
             if user_id:
                 # ניתוח הארוחה עם GPT לקבלת ערכים תזונתיים
                 meal_data = await analyze_meal_with_gpt(response)
@@ -3738,7 +3338,7 @@ async def handle_ingredients_input(update: Update, context: ContextTypes.DEFAULT
                         'fat': sum(item.get('fat', 0) for item in meal_data.get('items', [])),
                         'carbs': sum(item.get('carbs', 0) for item in meal_data.get('items', [])),
                         'emoji': meal_emoji,
-                        'meal_date': date.today().isoformat(),
+                        'meal_date': today_iso(),
                         'meal_time': datetime.now().strftime('%H:%M')
                     })
         else:
@@ -3761,8 +3361,6 @@ async def handle_ingredients_input(update: Update, context: ContextTypes.DEFAULT
 
 async def send_main_menu(update, context):
     from utils import build_main_keyboard
-    if context.user_data is None:
-        context.user_data = {}
     if not context.user_data.get("main_menu_sent", False):
         context.user_data["main_menu_sent"] = True
         await update.message.reply_text(
@@ -6,10 +6,13 @@ and conversation flows for nutrition management.
 """
 
 import asyncio
+import atexit
 import json
 import logging
+import logging.handlers
 import os
 import datetime
+import queue
 import requests
 
 # Load environment variables from .env file (if available)
@@ -20,10 +23,20 @@ except ImportError:
     # dotenv not available, continue without it
     pass
 
+# uvloop (if available) as a faster drop-in replacement for the asyncio event loop
+try:
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:
+    # uvloop not available (e.g. on Windows), use the default event loop
+    pass
+
 from telegram import Update
 from telegram.ext import CallbackQueryHandler
 from telegram.ext import (
+    AIORateLimiter,
     Application,
+    BaseUpdateProcessor,
     CommandHandler,
     ConversationHandler,
     MessageHandler,
@@ -92,9 +105,9 @@ from handlers import (
     get_allergies,
     ask_water_reminder_opt_in,
     set_water_reminder_opt_in,
-    start_water_reminder_loop_with_buttons,
     send_water_reminder,
     cancel_water_reminders,
+    flush_pending_saves,
     daily_menu,
     eaten,
     handle_daily_choice,
@@ -116,14 +129,35 @@ from handlers import (
     reset_command,
     handle_reset_confirmation,
 )
-from utils import build_main_keyboard
+from utils import build_main_keyboard, close_async_openai_client
 from db import NutritionDB
 
+def configure_logging():
+    """מגדיר לוגים כך שהכתיבה בפועל מתבצעת ב-thread נפרד דרך תור.
+
+    ה-handlers מקבלים רק enqueue מהיר, כך שכתיבת לוגים לא חוסמת את ה-event loop.
+    """
+    logging.basicConfig(
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        level=logging.INFO,
+    )
+    root = logging.getLogger()
+    if any(isinstance(h, logging.handlers.QueueHandler) for h in root.handlers):
+        return
+    log_queue = queue.SimpleQueue()
+    handlers = root.handlers[:]
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)
+
+
 # Configure logging
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    level=logging.INFO,
-)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Initialize database
@@ -219,7 +253,7 @@ async def daily_menu_scheduler(context):
                 # איפוס כפתור התפריט היומי כדי שיופיע מחר
                 user_data["menu_sent_today"] = True
                 user_data["menu_sent_date"] = now.date().isoformat()
-                nutrition_db.save_user(user_id, user_data)
+                await asyncio.to_thread(nutrition_db.save_user, user_id, user_data)
                 
                 logger.info(f"Sent daily menu to user {user_id}")
                 
@@ -255,6 +289,48 @@ def delete_webhook():
     print(f"[WEBHOOK DELETE] {response.status_code} - {response.text}")
 
 
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """מעבד עדכונים במקביל בין צ'אטים שונים, ולפי סדר ההגעה בתוך כל צ'אט.
+
+    כך יצירת תפריט ארוכה בצ'אט אחד לא עוצרת לחיצות כפתור בצ'אטים אחרים,
+    וה-ConversationHandler עדיין רואה את עדכוני כל צ'אט בזה אחר זה.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        # chat_id -> [lock, מספר עדכונים שממתינים או רצים]; נמחק כשהצ'אט מתפנה
+        self._chats = {}
+
+    async def do_process_update(self, update, coroutine) -> None:
+        chat = getattr(update, "effective_chat", None)
+        if chat is None:
+            await coroutine
+            return
+        entry = self._chats.get(chat.id)
+        if entry is None:
+            entry = self._chats[chat.id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._chats[chat.id]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+
+async def on_shutdown(application) -> None:
+    """כותב שמירות משתמשים שעדיין ממתינות ב-write-back וסוגר את לקוח OpenAI."""
+    await flush_pending_saves(application)
+    await close_async_openai_client()
+
+
 def main():
     delete_webhook()  # שלב 1: מחיקת webhook
     logger.info("[MAIN] Bot main() started")
@@ -275,7 +351,27 @@ def main():
 
     # Create application
     try:
-        application = Application.builder().token(bot_token).build()
+        # כל הקריאות ל-Bot API עוברות דרך rate limiter (token bucket משותף לכל
+        # ה-handlers) עם המתנה וניסיון חוזר אוטומטי על RetryAfter (429).
+        # 28 הודעות בשנייה משאירות מרווח מתחת למגבלה של 30 של Telegram
+        application = (
+            Application.builder()
+            .token(bot_token)
+            .rate_limiter(
+                AIORateLimiter(
+                    overall_max_rate=28,
+                    overall_time_period=1,
+                    group_max_rate=20,
+                    group_time_period=60,
+                    max_retries=3,
+                )
+            )
+            # עדכונים מצ'אטים שונים מטופלים במקביל, בתוך צ'אט - לפי הסדר
+            .concurrent_updates(PerChatUpdateProcessor(256))
+            # כתיבת שמירות ממתינות וסגירת חיבורי OpenAI לפני יציאה
+            .post_shutdown(on_shutdown)
+            .build()
+        )
     except Exception as e:
         logger.error(f"Failed to create application: {e}")
         raise
@@ -6,12 +6,18 @@ OpenAI integration, and various utility operations.
 """
 
 import re
+import asyncio
 import datetime
+import functools
+import hashlib
 import logging
+import time
+from collections import OrderedDict
 from typing import List, Optional
 from telegram import KeyboardButton, ReplyKeyboardMarkup, Update
 from telegram.ext import ContextTypes
 import os
+import httpx
 import openai
 import json
 
@@ -98,16 +104,36 @@ def set_openai_client(client):
     OPENAI_CLIENT = client
 
 
+# התבנית ליניארית באורך הקלט (אין כמתים מקוננים, ולכן אין backtracking),
+# והיא מקומפלת פעם אחת - strip_html_tags רצה על כל עדכון ביניים בזמן stream
+_HTML_TAG_RE = re.compile(r"<[^>]+>")
+
+
 def strip_html_tags(text: str) -> str:
     """מסיר תגיות HTML מהטקסט."""
     if not text:
         return ""
-    return re.sub(r"<[^>]+>", "", text)
+    return _HTML_TAG_RE.sub("", text)
+
+
+# מקדמי פעילות לחישוב BMR
+_ACTIVITY_FACTORS = {
+    "לא מתאמן": 1.2,
+    "לא מתאמנת": 1.2,
+    "מעט (2-3 אימונים בשבוע)": 1.375,
+    "הרבה (4-5 אימונים בשבוע)": 1.55,
+    "כל יום": 1.725,
+    "1-2 פעמים בשבוע": 1.375,
+    "3-4 פעמים בשבוע": 1.55,
+    "5-6 פעמים בשבוע": 1.725,
+    "בינונית": 1.375,  # ברירת מחדל
+}
 
 
+@functools.lru_cache(maxsize=4096)
 def calculate_bmr(gender: str, age: int, height: float, weight: float,
                   activity: str, goal: str) -> int:
-    """מחשב BMR לפי נוסחת Mifflin-St Jeor."""
+    """מחשב BMR לפי נוסחת Mifflin-St Jeor (פונקציה טהורה, התוצאה נשמרת במטמון)."""
     try:
         # Mifflin-St Jeor Formula
         if gender == "נקבה":
@@ -115,18 +141,8 @@ def calculate_bmr(gender: str, age: int, height: float, weight: float,
         else:
             bmr = (10 * weight) + (6.25 * height) - (5 * age) + 5
 
-        # התאמת פעילות - שיפור המפתחות
-        activity_factor = {
-            "לא מתאמן": 1.2,
-            "לא מתאמנת": 1.2,
-            "מעט (2-3 אימונים בשבוע)": 1.375,
-            "הרבה (4-5 אימונים בשבוע)": 1.55,
-            "כל יום": 1.725,
-            "1-2 פעמים בשבוע": 1.375,
-            "3-4 פעמים בשבוע": 1.55,
-            "5-6 פעמים בשבוע": 1.725,
-            "בינונית": 1.375,  # ברירת מחדל
-        }.get(activity, 1.2)
+        # התאמת פעילות
+        activity_factor = _ACTIVITY_FACTORS.get(activity, 1.2)
 
         bmr *= activity_factor
 
@@ -161,6 +177,23 @@ def get_gendered_text(
     return male_text
 
 
+# התאריך של היום כמחרוזת ISO, מחושב מחדש לכל היותר פעם ב-30 שניות
+_TODAY_TTL = 30.0
+_today_cache = {"ts": float("-inf"), "value": ""}
+
+
+def today_iso() -> str:
+    """מחזיר את התאריך של היום בפורמט ISO (YYYY-MM-DD)."""
+    now = time.monotonic()
+    if now - _today_cache["ts"] > _TODAY_TTL:
+        _today_cache["value"] = datetime.date.today().isoformat()
+        _today_cache["ts"] = now
+    return _today_cache["value"]
+
+
+_DATE_RE = re.compile(r"(\d{1,2})[./-](\d{1,2})[./-](\d{2,4})")
+
+
 def parse_date_from_text(text: str) -> Optional[str]:
     """מנסה לחלץ תאריך מטקסט בעברית (אתמול, שלשום, תאריך מפורש וכו')."""
     if not text:
@@ -178,7 +211,7 @@ def parse_date_from_text(text: str) -> Optional[str]:
             return today.isoformat()
 
         # דוגמה: "01/06/2024"
-        match = re.search(r"(\d{1,2})[./-](\d{1,2})[./-](\d{2,4})", text)
+        match = _DATE_RE.search(text)
         if match:
             day, month, year = map(int, match.groups())
             if year < 100:
@@ -192,17 +225,24 @@ def parse_date_from_text(text: str) -> Optional[str]:
         return None
 
 
+# ביטויים רגולריים מקומפלים פעם אחת בטעינת המודול
+_MD_BOLD2_RE = re.compile(r"\*\*(.*?)\*\*")
+_MD_BOLD_RE = re.compile(r"\*(.*?)\*")
+_MD_ITALIC2_RE = re.compile(r"__(.*?)__")
+_MD_ITALIC_RE = re.compile(r"_(.*?)_")
+
+
 def markdown_to_html(text: str) -> str:
     """ממיר סימוני Markdown ל-HTML."""
     if not text:
         return ""
 
     # בולד: **טקסט** או *טקסט* => <b>טקסט</b>
-    text = re.sub(r"\*\*(.*?)\*\*", r"<b>\1</b>", text)
-    text = re.sub(r"\*(.*?)\*", r"<b>\1</b>", text)
+    text = _MD_BOLD2_RE.sub(r"<b>\1</b>", text)
+    text = _MD_BOLD_RE.sub(r"<b>\1</b>", text)
     # נטוי: __טקסט__ או _טקסט_ => <i>טקסט</i>
-    text = re.sub(r"__(.*?)__", r"<i>\1</i>", text)
-    text = re.sub(r"_(.*?)_", r"<i>\1</i>", text)
+    text = _MD_ITALIC2_RE.sub(r"<i>\1</i>", text)
+    text = _MD_ITALIC_RE.sub(r"<i>\1</i>", text)
     return text
 
 
@@ -213,13 +253,10 @@ def clean_desc(desc: str) -> str:
     return desc.strip()
 
 
-def clean_meal_text(text: str) -> str:
-    """מסיר ביטויים כמו 'בצהריים אכלתי', 'בערב אכלתי', 'בבוקר אכלתי', 'ושתיתי', 'ואכלתי' וכו'."""
-    if not text:
-        return ""
-
-    # הסרת ביטויי זמן
-    time_patterns = [
+# ביטויי זמן להסרה מתיאור ארוחה (הסדר חשוב - מוחלים בזה אחר זה)
+_TIME_PHRASE_RES = tuple(
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in (
         r"בצהריים\s+אכלתי\s*",
         r"בערב\s+אכלתי\s*",
         r"בבוקר\s+אכלתי\s*",
@@ -228,9 +265,18 @@ def clean_meal_text(text: str) -> str:
         r"אכלתי\s*",
         r"אכלתי\s+היום\s*",
         r"אכלתי\s+אתמול\s*",
-    ]
-    for pattern in time_patterns:
-        text = re.sub(pattern, "", text, flags=re.IGNORECASE)
+    )
+)
+
+
+def clean_meal_text(text: str) -> str:
+    """מסיר ביטויים כמו 'בצהריים אכלתי', 'בערב אכלתי', 'בבוקר אכלתי', 'ושתיתי', 'ואכלתי' וכו'."""
+    if not text:
+        return ""
+
+    # הסרת ביטויי זמן
+    for pattern in _TIME_PHRASE_RES:
+        text = pattern.sub("", text)
     return text.strip()
 
 
@@ -306,13 +352,27 @@ def learning_logic(context) -> str:
     return f"💡 <b>טיפ מותאם אישית:</b> {tip_text}"
 
 
+@functools.lru_cache(maxsize=None)
+def _main_keyboard(show_menu_button: bool, show_end_button: bool) -> ReplyKeyboardMarkup:
+    """בונה את המקלדת הראשית; יש רק ארבעה צירופים, וכל אחד נבנה פעם אחת."""
+    keyboard = []
+    if show_menu_button:
+        keyboard.append([KeyboardButton("לקבלת תפריט יומי מותאם אישית")])
+    keyboard.append([KeyboardButton("מה אכלתי היום")])
+    keyboard.append([KeyboardButton("בניית ארוחה לפי מה שיש לי בבית")])
+    if show_end_button:
+        keyboard.append([KeyboardButton("✅ סיימתי להיום")])
+    keyboard.append([KeyboardButton("קבלת דוח")])
+    keyboard.append([KeyboardButton("עדכון פרטים אישיים")])
+    keyboard.append([KeyboardButton("עזרה")])
+    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+
+
 def build_main_keyboard(hide_menu_button: bool = False, user_data: Optional[dict] = None) -> ReplyKeyboardMarkup:
     """בונה מקלדת ראשית עם כל האפשרויות, עם אפשרות להסתיר כפתורים מסוימים.
     כפתור 'סיימתי' יופיע רק אם המשתמש צרך משהו היום."""
-    from datetime import date
     show_end_button = False
     show_menu_button = True
-    today = date.today().isoformat()
     if user_data:
         food_log = user_data.get('daily_food_log', [])
         if food_log:
@@ -320,21 +380,10 @@ def build_main_keyboard(hide_menu_button: bool = False, user_data: Optional[dict
         # הסתר כפתור תפריט יומי אם כבר נשלח היום
         menu_sent_today = user_data.get('menu_sent_today', False)
         menu_sent_date = user_data.get('menu_sent_date', '')
-        if menu_sent_today and menu_sent_date == today:
+        if menu_sent_today and menu_sent_date == today_iso():
             show_menu_button = False
-    keyboard = []
-    if not hide_menu_button and show_menu_button:
-        keyboard.append([KeyboardButton("לקבלת תפריט יומי מותאם אישית")])
-    keyboard.append([KeyboardButton("מה אכלתי היום")])
-    keyboard.append([KeyboardButton("בניית ארוחה לפי מה שיש לי בבית")])
-    if show_end_button:
-        keyboard.append([KeyboardButton("✅ סיימתי להיום")])
-    keyboard.append([KeyboardButton("קבלת דוח")])
-    keyboard.append([KeyboardButton("עדכון פרטים אישיים")])
-    keyboard.append([KeyboardButton("עזרה")])
-    # הסר שורות ריקות (אם כפתור הוסתר)
-    keyboard = [row for row in keyboard if row]
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    # המקלדת עצמה תלויה רק בשני הדגלים, ולכן משותפת לכל המשתמשים (Markup אינו ניתן לשינוי)
+    return _main_keyboard(show_menu_button and not hide_menu_button, show_end_button)
 
 
 def extract_allergens_from_text(text: str) -> List[str]:
@@ -446,8 +495,85 @@ def build_user_prompt_for_gpt(user_data: dict) -> str:
     return prompt
 
 
-async def call_gpt(prompt: str) -> str:
-    """קורא ל-GPT API ומחזיר תשובה."""
+GPT_MODEL = "gpt-4-0125-preview"  # או "gpt-4o"
+
+# לקוח AsyncOpenAI יחיד לכל התהליך: ה-httpx.AsyncClient שבתוכו שומר חיבורי
+# keep-alive פתוחים, כך שקריאות חוזרות לא משלמות שוב על TCP ו-TLS handshake
+_async_openai_client = None
+# משימות סגירה של לקוחות שהוחלפו - מוחזקות כאן כדי שלא ייאספו לפני שיסתיימו
+_closing_clients = set()
+
+# גודל מאגר החיבורים ל-OpenAI: מספיק לתפריטים שנוצרים במקביל, וחיבורים פנויים
+# נשמרים דקה לפני שנסגרים
+_GPT_HTTP_LIMITS = httpx.Limits(
+    max_connections=100, max_keepalive_connections=30, keepalive_expiry=60
+)
+
+
+def get_async_openai_client(api_key: str):
+    """מחזיר את לקוח ה-AsyncOpenAI המשותף (נוצר בקריאה הראשונה או כשהמפתח משתנה)."""
+    global _async_openai_client
+    if _async_openai_client is None or _async_openai_client.api_key != api_key:
+        if _async_openai_client is not None:
+            # המפתח השתנה - סוגרים את הלקוח הישן כדי לא להשאיר את מאגר החיבורים שלו פתוח
+            old_client = _async_openai_client
+            try:
+                task = asyncio.get_running_loop().create_task(old_client.close())
+            except RuntimeError:
+                asyncio.run(old_client.close())
+            else:
+                _closing_clients.add(task)
+                task.add_done_callback(_closing_clients.discard)
+        _async_openai_client = openai.AsyncOpenAI(
+            api_key=api_key,
+            http_client=httpx.AsyncClient(limits=_GPT_HTTP_LIMITS),
+        )
+    return _async_openai_client
+
+
+async def close_async_openai_client() -> None:
+    """סוגר את לקוח ה-AsyncOpenAI המשותף ואת החיבורים הפתוחים שלו (בכיבוי הבוט)."""
+    global _async_openai_client
+    if _async_openai_client is not None:
+        await _async_openai_client.close()
+        _async_openai_client = None
+
+
+# מטמון תשובות GPT לפי תוכן הפרומפט, לקריאות שמבקשות זאת (למשל תפריט יומי:
+# פרופיל זהה באותו יום מקבל את אותו תפריט בלי קריאה נוספת ל-API).
+# התאריך הוא חלק מהמפתח, כך שרשומות מתיישנות מעצמן בחצות.
+_GPT_CACHE_SIZE = 1000
+_gpt_cache = OrderedDict()
+
+
+def _gpt_cache_key(prompt: str) -> tuple:
+    digest = hashlib.blake2b(prompt.encode("utf-8"), digest_size=16).digest()
+    return today_iso(), digest
+
+
+def _get_cached_gpt(key: tuple) -> Optional[str]:
+    cached = _gpt_cache.get(key)
+    if cached is not None:
+        _gpt_cache.move_to_end(key)
+    return cached
+
+
+def _store_gpt_cache(key: tuple, text: str) -> None:
+    _gpt_cache[key] = text
+    if len(_gpt_cache) > _GPT_CACHE_SIZE:
+        _gpt_cache.popitem(last=False)
+
+
+async def call_gpt(prompt: str, cache: bool = False) -> str:
+    """קורא ל-GPT API ומחזיר תשובה.
+
+    עם cache=True תשובה תקינה נשמרת במטמון ומוחזרת לפרומפט זהה באותו יום.
+    """
+    if cache:
+        key = _gpt_cache_key(prompt)
+        cached = _get_cached_gpt(key)
+        if cached is not None:
+            return cached
     try:
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
@@ -455,15 +581,17 @@ async def call_gpt(prompt: str) -> str:
             return get_gendered_text(None, 
                 "לא הצלחתי ליצור קשר עם שירות ה-AI. אנא נסה שוב מאוחר יותר.",
                 "לא הצלחתי ליצור קשר עם שירות ה-AI. אנא נסי שוב מאוחר יותר.")
-        client = openai.AsyncOpenAI(api_key=api_key)
+        client = get_async_openai_client(api_key)
         response = await client.chat.completions.create(
-            model="gpt-4-0125-preview",  # או "gpt-4o"
+            model=GPT_MODEL,
             messages=[{"role": "user", "content": prompt}],
             temperature=0.7,
             max_tokens=1000
         )
         if response and response.choices and response.choices[0].message:
             content = response.choices[0].message.content
+            if content and cache:
+                _store_gpt_cache(key, content.strip())
             return content.strip() if content else get_gendered_text(None, 
                 "לא קיבלתי תשובה מ-AI. אנא נסה שוב.",
                 "לא קיבלתי תשובה מ-AI. אנא נסי שוב.")
@@ -492,6 +620,70 @@ async def call_gpt(prompt: str) -> str:
             "אירעה שגיאה לא צפויה. אנא נסי שוב.")
 
 
+class GPTStreamError(Exception):
+    """ה-stream של GPT נקטע אחרי שכבר הוחזרו חלקים מהתשובה.
+
+    str(e) היא הודעת השגיאה למשתמש; החלקים שכבר הוחזרו אינם תשובה שלמה.
+    """
+
+
+async def call_gpt_stream(prompt: str, cache: bool = False):
+    """קורא ל-GPT במצב stream ומחזיר את התשובה בחלקים (async generator).
+
+    עם cache=True משתמש באותו מטמון של call_gpt: פגיעה מוחזרת כחלק אחד, ותשובה
+    שהוזרמה עד הסוף נשמרת בו. שגיאה לפני החלק הראשון מוחזרת כטקסט השגיאה;
+    שגיאה אחרי שכבר הוחזרו חלקים זורקת GPTStreamError.
+    """
+    if cache:
+        key = _gpt_cache_key(prompt)
+        cached = _get_cached_gpt(key)
+        if cached is not None:
+            yield cached
+            return
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        logger.error("OpenAI API key not found")
+        yield get_gendered_text(None,
+            "לא הצלחתי ליצור קשר עם שירות ה-AI. אנא נסה שוב מאוחר יותר.",
+            "לא הצלחתי ליצור קשר עם שירות ה-AI. אנא נסי שוב מאוחר יותר.")
+        return
+    parts = []
+    try:
+        client = get_async_openai_client(api_key)
+        stream = await client.chat.completions.create(
+            model=GPT_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.7,
+            max_tokens=1000,
+            stream=True,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+        content = "".join(parts).strip()
+        if content and cache:
+            _store_gpt_cache(key, content)
+        return
+    except openai.AuthenticationError:
+        logger.error("OpenAI authentication failed")
+        error_text = "שגיאה באימות עם שירות ה-AI. אנא פנה למנהל המערכת."
+    except openai.RateLimitError:
+        logger.error("OpenAI rate limit exceeded")
+        error_text = get_gendered_text(None,
+            "שירות ה-AI עמוס כרגע. אנא נסה שוב בעוד כמה דקות.",
+            "שירות ה-AI עמוס כרגע. אנא נסי שוב בעוד כמה דקות.")
+    except Exception as e:
+        logger.error(f"Unexpected error in call_gpt_stream: {e}")
+        error_text = get_gendered_text(None,
+            "אירעה שגיאה לא צפויה. אנא נסה שוב.",
+            "אירעה שגיאה לא צפויה. אנא נסי שוב.")
+    # אם כבר הוחזר חלק מהתשובה, טקסט השגיאה לא יכול להיות המשך שלה
+    if parts:
+        raise GPTStreamError(error_text)
+    yield error_text
+
+
 async def analyze_meal_with_gpt(text: str) -> dict:
     """
     שולח ל-GPT תיאור ארוחה חופשי ומקבל רשימת פריטים עם קלוריות לכל פריט וסך הכל.